@@ -0,0 +1,383 @@
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+# کیبوردها و handler های sync (مسیرهای ادمین و مراحل چندمرحله‌ای) از main می‌آیند
+import main as sync_app
+from config import BOT_TOKEN
+from database import aio
+from database.connection import DB_POOL_SIZE
+from database.instrumentation import update_scope
+import metrics
+from logging_setup import sampled
+from router import CallbackRouter
+from sender import install_async_sender
+from startup import handle_sigterm
+from worker_pool import count_update, update_label
+
+#  CONFIGURATION
+
+logger = logging.getLogger(__name__)
+
+# تعداد thread برای handler هایی که هنوز sync هستند
+ASYNC_SYNC_WORKERS = int(os.getenv("ASYNC_SYNC_WORKERS", str(DB_POOL_SIZE)))
+
+bot = AsyncTeleBot(BOT_TOKEN, parse_mode='Markdown')
+
+# AsyncTeleBot از CUSTOM_REQUEST_SENDER عبور نمی‌کند؛ همان محدودیت‌های ارسال نسخه sync
+install_async_sender(sync_app.sender_scheduler)
+
+# فقط مسیرهای پرتکرار کاربران async هستند؛ بقیه به handler sync سپرده می‌شوند
+router = CallbackRouter()
+
+#  HELPER FUNCTIONS
+
+def back_markup(*buttons):
+    """کیبورد ساده از (متن، callback_data)"""
+    return InlineKeyboardMarkup().add(
+        *[InlineKeyboardButton(text, callback_data=data) for text, data in buttons]
+    )
+
+async def send_or_edit_message(user_id, message_id, content_type, text, reply_markup=None):
+    """ارسال یا ویرایش پیام بر اساس نوع (نسخه async)"""
+    try:
+        if content_type == 'photo':
+            await bot.send_message(user_id, text, reply_markup=reply_markup, parse_mode='Markdown')
+        else:
+            await bot.edit_message_text(
+                text,
+                chat_id=user_id,
+                message_id=message_id,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+    except Exception as e:
+        logger.warning("خطا در ویرایش پیام: %s", e)
+        await bot.send_message(user_id, text, reply_markup=reply_markup, parse_mode='Markdown')
+
+async def reply(call, text, reply_markup=None):
+    """ویرایش پیامی که دکمه‌اش زده شده"""
+    await send_or_edit_message(
+        call.message.chat.id, call.message.message_id, call.message.content_type,
+        text, reply_markup
+    )
+
+async def check_admin(user_id):
+    """بررسی ادمین با fallback به لیست ثابت"""
+    if user_id in sync_app.FALLBACK_ADMINS:
+        return True
+    return await aio.is_admin(user_id)
+
+async def load_books_page(page=1, cursor=None, per_page=sync_app.BOOKS_PER_PAGE):
+    """دریافت کتاب‌های یک صفحه؛ مثل load_books_page در main"""
+    after_id = before_id = None
+    if cursor and cursor[0] == "n":
+        after_id = int(cursor[1:])
+    elif cursor and cursor[0] == "p":
+        before_id = int(cursor[1:])
+    return await aio.get_books_page(
+        per_page,
+        after_id=after_id,
+        before_id=before_id,
+        offset=(page - 1) * per_page
+    )
+
+async def run_sync(func, *args):
+    """اجرای handler sync در thread pool بدون بستن event loop"""
+    return await asyncio.to_thread(func, *args)
+
+#  COMMAND HANDLERS
+
+@bot.message_handler(commands=['start', 'admin'])
+async def start_handler(message):
+    """مدیریت دستورات start و admin"""
+    user_id = message.chat.id
+    command = message.text.split()[0] if message.text else ''
+
+    logger.info("📩 دستور دریافت شده: %s از کاربر %s", command, user_id, extra=sampled("command"))
+    count_update(message)
+
+    with update_scope(update_label(message)):
+        await aio.save_user(user_id)
+        is_user_admin = await check_admin(user_id)
+
+    if command == '/admin' or (command == '/start' and is_user_admin):
+        if is_user_admin:
+            await bot.send_message(
+                user_id,
+                "👨‍💼 به پنل مدیریت خوش آمدید!\n\n"
+                "از منوی زیر استفاده کنید:",
+                reply_markup=sync_app.admin_menu_markup()
+            )
+        else:
+            await bot.send_message(user_id, "⛔ شما دسترسی ادمین ندارید!")
+    else:
+        await bot.send_message(
+            user_id,
+            "📚 به کتابفروشی آنلاین خوش آمدید!\n\n"
+            "لطفاً یکی از گزینه‌های زیر را انتخاب کنید:",
+            reply_markup=sync_app.main_menu_markup()
+        )
+
+#  CALLBACK HANDLER
+
+@bot.callback_query_handler(func=lambda call: True)
+async def callback_handler(call):
+    """مدیریت کلیک روی دکمه‌ها"""
+    user_id = call.message.chat.id
+    data = call.data or ""
+
+    logger.info("🖱️ Callback دریافت شده - کاربر: %s, دیتا: %s", user_id, data, extra=sampled("callback"))
+    count_update(call)
+
+    try:
+        # to_thread context را کپی می‌کند، پس کوئری‌های handler sync هم به همین update می‌رسند
+        with update_scope(update_label(call)):
+            if router.resolve(data) is None:
+                # مسیرهای ادمین و بقیه: handler sync (با بررسی دسترسی خودش)
+                await run_sync(sync_app.callback_handler, call)
+                return
+
+            await router.dispatch_async(call, user_id)
+
+    except Exception as e:
+        logger.error("Error in callback handler: %s", e, exc_info=True)
+        try:
+            await bot.answer_callback_query(call.id, "❌ خطایی رخ داد")
+        except Exception:
+            pass
+
+#  CALLBACK ROUTES
+
+# بازگشت به خانه
+@router.route("home")
+async def cb_home(call, user_id):
+    if await check_admin(user_id):
+        markup = sync_app.admin_menu_markup()
+    else:
+        markup = sync_app.main_menu_markup()
+    await reply(call, "🏠 منوی اصلی\n\nاز گزینه‌های زیر استفاده کنید:", markup)
+
+
+# نمایش دسته‌بندی‌ها
+@router.route("categories")
+async def cb_categories(call, user_id):
+    categories = await aio.get_all_categories()
+
+    if not categories:
+        await reply(call, "📭 در حال حاضر هیچ دسته‌بندی موجود نیست.", back_markup(("🔙 بازگشت", "home")))
+        return
+
+    text = "📚 دسته‌بندی‌های موجود:\n\n"
+    for cat in categories:
+        text += f"• {cat['name']}\n"
+
+    await reply(call, text, sync_app.categories_markup(categories))
+
+
+# لیست کتاب‌ها و صفحه‌بندی آن
+@router.route("list_books")
+@router.route("books_page_", prefix=True)
+async def cb_books_page(call, user_id, page=1, cursor=None):
+    books, total = await asyncio.gather(
+        load_books_page(page, cursor),
+        aio.count_active_books(),
+    )
+
+    if not books:
+        await reply(call, "📭 در حال حاضر هیچ کتابی موجود نیست.", back_markup(("🔙 بازگشت", "home")))
+        return
+
+    text = f"📚 لیست کتاب‌ها (صفحه {page} از {sync_app.page_count(total, sync_app.BOOKS_PER_PAGE)}):\n\n"
+    await reply(call, text, sync_app.books_list_markup(books, page, total))
+
+
+# انتخاب دسته‌بندی
+@router.route("category_", prefix=True)
+async def cb_category(call, user_id, category_id):
+    books = await aio.get_books_by_category(category_id)
+
+    if not books:
+        await reply(
+            call,
+            "📭 در این دسته‌بندی کتابی موجود نیست.",
+            back_markup(("🔙 بازگشت", "categories"), ("🏠 خانه", "home"))
+        )
+        return
+
+    await reply(call, "📚 کتاب‌های این دسته‌بندی:\n\n", sync_app.books_markup(books, category_id))
+
+
+# نمایش کتاب
+@router.route("book_", prefix=True)
+async def cb_book(call, user_id, book_id):
+    book = await aio.get_book(book_id)
+
+    if not book:
+        await bot.answer_callback_query(call.id, "کتاب یافت نشد!")
+        return
+
+    text = (
+        f"📖 **{book['title']}**\n\n"
+        f"✍️ نویسنده: {book['author']}\n"
+        f"🏷️ دسته: {book.get('category_name', 'بدون دسته')}\n"
+        f"💰 قیمت: {book['price']:,} تومان\n"
+        f"📝 موجودی: {book.get('stock', 1)} عدد\n\n"
+        f"📄 توضیحات:\n{book.get('description', 'بدون توضیحات')}"
+    )
+    markup = sync_app.book_detail_markup(book_id, book.get('category_id'))
+
+    # اگر عکس دارد
+    if book.get('file_id'):
+        try:
+            await bot.delete_message(user_id, call.message.message_id)
+            await bot.send_photo(
+                user_id,
+                book['file_id'],
+                caption=text,
+                reply_markup=markup,
+                parse_mode='Markdown'
+            )
+            return
+        except Exception:
+            pass
+
+    await reply(call, text, markup)
+
+
+# اضافه به سبد خرید
+@router.route("add_", prefix=True)
+async def cb_add(call, user_id, book_id):
+    if await aio.add_to_cart(user_id, book_id):
+        await bot.answer_callback_query(call.id, "✅ به سبد خرید اضافه شد")
+    else:
+        await bot.answer_callback_query(call.id, "❌ موجودی کافی نیست یا خطا در اضافه کردن به سبد")
+
+
+# سبد خرید
+@router.route("cart")
+async def cb_cart(call, user_id, snapshot=None):
+    if snapshot is None:
+        snapshot = await aio.get_cart_snapshot(user_id)
+    text, markup = sync_app.cart_view(snapshot)
+    await reply(call, text, markup)
+
+
+# کنترل‌های سبد خرید
+@router.route("inc_", prefix=True)
+async def cb_inc(call, user_id, book_id):
+    updated, snapshot = await aio.change_cart_quantity(user_id, book_id, 1)
+    if snapshot is None:
+        await bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    if updated:
+        await bot.answer_callback_query(call.id, "✅ افزایش یافت")
+    else:
+        await bot.answer_callback_query(call.id, "⚠️ موجودی کافی نیست")
+    await cb_cart(call, user_id, snapshot)
+
+
+@router.route("dec_", prefix=True)
+async def cb_dec(call, user_id, book_id):
+    updated, snapshot = await aio.change_cart_quantity(user_id, book_id, -1)
+    if snapshot is None:
+        await bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    await bot.answer_callback_query(call.id, "✅ کاهش یافت")
+    await cb_cart(call, user_id, snapshot)
+
+
+@router.route("remove_", prefix=True)
+async def cb_remove(call, user_id, book_id):
+    updated, snapshot = await aio.change_cart_quantity(user_id, book_id, 0)
+    if snapshot is None:
+        await bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    await bot.answer_callback_query(call.id, "✅ حذف شد")
+    await cb_cart(call, user_id, snapshot)
+
+
+@router.route("clear_cart")
+async def cb_clear_cart(call, user_id):
+    if not await aio.clear_user_cart(user_id):
+        await bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    await bot.answer_callback_query(call.id, "✅ سبد خرید خالی شد")
+    await cb_cart(call, user_id, {"items": [], "total": 0, "count": 0})
+
+
+# سفارشات من
+@router.route("my_orders")
+async def cb_my_orders(call, user_id):
+    orders = await aio.get_user_orders(user_id)
+
+    if not orders:
+        await reply(call, "📭 شما هنوز سفارشی ثبت نکرده‌اید.", back_markup(("🔙 بازگشت", "home")))
+        return
+
+    text = "📦 سفارشات شما:\n\n"
+    for order in orders:
+        status_text = {
+            'pending': '⏳ در انتظار',
+            'approved': '✅ تایید شده',
+            'rejected': '❌ رد شده'
+        }.get(order['status'], order['status'])
+
+        text += f"🆔 کد سفارش: {order['order_id']}\n"
+        text += f"💰 مبلغ: {order['total_price']:,} تومان\n"
+        text += f"📊 وضعیت: {status_text}\n"
+        text += f"📅 تاریخ: {order['created_at'].strftime('%Y/%m/%d')}\n"
+        text += "─" * 20 + "\n"
+
+    await reply(call, text, back_markup(("🔙 بازگشت", "home")))
+
+#  MESSAGE HANDLER
+
+@bot.message_handler(func=lambda message: True, content_types=['text', 'photo'])
+async def handle_message(message):
+    """مراحل چندمرحله‌ای (ثبت سفارش، جستجو، پنل ادمین) در handler sync اجرا می‌شوند"""
+    count_update(message)
+    with update_scope(update_label(message)):
+        await run_sync(sync_app.handle_message, message)
+
+#  STARTUP
+
+async def run():
+    """راه‌اندازی pool ها و polling روی یک event loop"""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=ASYNC_SYNC_WORKERS, thread_name_prefix="sync-handler")
+    )
+
+    metrics.start_metrics_server()
+    # pool async و بررسی‌های شروع main (دیتابیس، تلگرام، ادمین‌ها) هم‌زمان آماده می‌شوند
+    await asyncio.gather(aio.init_pool(), asyncio.to_thread(sync_app.startup, "polling"))
+    try:
+        await bot.infinity_polling(
+            timeout=60,
+            skip_pending=True,
+            allowed_updates=["message", "callback_query"]
+        )
+    finally:
+        await asyncio.to_thread(sync_app.shutdown)
+        await aio.close_pool()
+        await bot.close_session()
+
+
+if __name__ == "__main__":
+    if not BOT_TOKEN:
+        print("❌ BOT_TOKEN پیدا نشد!")
+        sys.exit(1)
+
+    print("🚀 شروع ربات تلگرام (asyncio)...")
+    handle_sigterm()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🛑 ربات توسط کاربر متوقف شد")
+    print("👋 ربات خاموش شد")
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegramServer:
+    """سرور محلی جایگزین Bot API تلگرام برای بنچمارک
+
+    درخواست‌های /bot<token>/<method> را ثبت می‌کند و پاسخی شبیه تلگرام
+    برمی‌گرداند: پیام‌ها شناسه دارند، ویرایش پیام ناموجود یا بدون تغییر
+    مثل تلگرام خطای 400 می‌دهد. latency تاخیر مصنوعی شبکه (ثانیه) است.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._messages = defaultdict(dict)  # chat_id -> message_id -> (text, reply_markup)
+        self._last_message = {}  # chat_id -> آخرین message_id ارسال شده
+        self._next_id = defaultdict(int)
+        self._calls = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._httpd = None
+
+    @property
+    def api_url(self):
+        """قالب apihelper.API_URL برای این سرور"""
+        return f"http://{self.host}:{self.port}/bot{{0}}/{{1}}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if body and self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                    params.update(parse_qsl(body.decode("utf-8")))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.call(method, params)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    #  API METHODS
+    def call(self, method, params):
+        """پاسخ یک متد Bot API: (کد HTTP، بدنه JSON)"""
+        with self._lock:
+            self._calls[method] += 1
+            handler = getattr(self, "_" + method, None)
+            status, payload = handler(params) if handler else (200, {"ok": True, "result": True})
+            if status != 200:
+                self._errors[method] += 1
+            return status, payload
+
+    @staticmethod
+    def _error(description, code=400):
+        return code, {"ok": False, "error_code": code, "description": description}
+
+    def _message(self, chat_id, message_id, **fields):
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **fields,
+        }
+
+    def _send(self, params, **fields):
+        if "chat_id" not in params or params["chat_id"] in ("", "None"):
+            return self._error("Bad Request: chat not found")
+        chat_id = int(params["chat_id"])
+        self._next_id[chat_id] += 1
+        message_id = self._next_id[chat_id]
+        self._messages[chat_id][message_id] = (
+            params.get("text") or params.get("caption"), params.get("reply_markup")
+        )
+        self._last_message[chat_id] = message_id
+        return 200, {"ok": True, "result": self._message(chat_id, message_id, **fields)}
+
+    def _getMe(self, params):
+        return 200, {"ok": True, "result": BOT_USER}
+
+    def _getWebhookInfo(self, params):
+        return 200, {"ok": True, "result": {"url": "", "has_custom_certificate": False,
+                                            "pending_update_count": 0}}
+
+    def _sendMessage(self, params):
+        return self._send(params, text=params.get("text", ""))
+
+    def _sendPhoto(self, params):
+        photo = [{"file_id": params.get("photo") or "bench-photo", "file_unique_id": "bench",
+                  "width": 320, "height": 480}]
+        return self._send(params, photo=photo, caption=params.get("caption", ""))
+
+    def _editMessageText(self, params):
+        chat_id = int(params.get("chat_id", 0))
+        message_id = int(params.get("message_id", 0))
+        messages = self._messages[chat_id]
+        if message_id not in messages:
+            return self._error("Bad Request: message to edit not found")
+        content = (params.get("text"), params.get("reply_markup"))
+        if messages[message_id] == content:
+            return self._error(
+                "Bad Request: message is not modified: specified new message content and "
+                "reply markup are exactly the same as a current content and reply markup of the message"
+            )
+        messages[message_id] = content
+        return 200, {"ok": True, "result": self._message(chat_id, message_id, text=content[0])}
+
+    def _deleteMessage(self, params):
+        chat_id = int(params.get("chat_id", 0))
+        if self._messages[chat_id].pop(int(params.get("message_id", 0)), None) is None:
+            return self._error("Bad Request: message to delete not found")
+        return 200, {"ok": True, "result": True}
+
+    #  CONTROL
+    def last_message_id(self, chat_id):
+        """آخرین پیامی که ربات به این چت فرستاده (برای ساختن callback ها)"""
+        with self._lock:
+            return self._last_message.get(chat_id)
+
+    def stats(self):
+        """تعداد فراخوانی و خطای هر متد"""
+        with self._lock:
+            return {"calls": dict(self._calls), "errors": dict(self._errors)}
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._errors.clear()
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
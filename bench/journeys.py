@@ -0,0 +1,96 @@
+import itertools
+import random
+import threading
+import time
+
+_update_ids = itertools.count(1)
+_callback_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+def _next(counter):
+    with _lock:
+        return next(counter)
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"bench{user_id}"}
+
+
+def message_update(user_id, text=None, photo=None, message_id=0):
+    """update پیام کاربر (متن یا عکس) به شکل JSON تلگرام"""
+    message = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+    }
+    if photo:
+        message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 800, "height": 600}]
+    else:
+        message["text"] = text
+    return {"update_id": _next(_update_ids), "message": message}
+
+
+def callback_update(user_id, data, message_id):
+    """update کلیک روی دکمه شیشه‌ای پیام message_id"""
+    return {
+        "update_id": _next(_update_ids),
+        "callback_query": {
+            "id": str(_next(_callback_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id or 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "Bench"},
+                "text": "bench",
+            },
+        },
+    }
+
+
+def purchase_journey(user_id, book_ids, last_message_id, rng=random):
+    """مسیر خرید: شروع ← لیست ← کتاب ← افزودن ← سبد ← ثبت سفارش با رسید
+
+    generator ای از (نام مرحله، update)؛ update هر مرحله بعد از اجرای مرحله
+    قبل ساخته می‌شود تا callback روی آخرین پیام ربات زده شود.
+    """
+    book_id = rng.choice(book_ids)
+
+    yield "start", message_update(user_id, "/start")
+    for step, data in (
+        ("list_books", "list_books"),
+        ("book", f"book_{book_id}"),
+        ("add", f"add_{book_id}"),
+        ("cart", "cart"),
+        ("inc", f"inc_{book_id}"),
+        ("checkout", "checkout"),
+    ):
+        yield step, callback_update(user_id, data, last_message_id(user_id))
+
+    yield "phone", message_update(user_id, "09120000000")
+    yield "address", message_update(user_id, "تهران، خیابان بنچمارک")
+    yield "postal", message_update(user_id, "1234567890")
+    yield "receipt", message_update(user_id, photo=f"bench-receipt-{user_id}")
+
+
+def browse_journey(user_id, book_ids, last_message_id, rng=random):
+    """مسیر بدون خرید: شروع ← لیست و صفحه بعد ← دسته‌ها ← چند کتاب"""
+    yield "start", message_update(user_id, "/start")
+    for step, data in (
+        ("list_books", "list_books"),
+        ("books_page", "books_page_2"),
+        ("categories", "categories"),
+    ):
+        yield step, callback_update(user_id, data, last_message_id(user_id))
+    for book_id in rng.sample(book_ids, min(3, len(book_ids))):
+        yield "book", callback_update(user_id, f"book_{book_id}", last_message_id(user_id))
+
+
+JOURNEYS = {
+    "purchase": purchase_journey,
+    "browse": browse_journey,
+}
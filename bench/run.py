@@ -0,0 +1,235 @@
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from .fake_telegram import FakeTelegramServer
+from .journeys import JOURNEYS
+
+# اجرای بنچمارک (از ریشه پروژه، با یک دیتابیس MySQL مخصوص تست در تنظیمات config):
+#   python -m bench.run --users 200 --concurrency 20 --journey purchase
+# handler های واقعی main روی یک Bot API محلی (bench.fake_telegram) اجرا می‌شوند.
+# تعداد کوئری از تفاضل Questions سراسری MySQL حساب می‌شود، پس دیتابیس
+# در طول اجرا نباید کلاینت دیگری داشته باشد.
+
+BENCH_USER_BASE = 900000000
+
+
+def percentile(values, p):
+    """صدک p (nearest-rank) از لیست مرتب"""
+    if not values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+def questions():
+    """شمارنده Questions سراسری MySQL"""
+    from database import pooled_connection
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(cursor.fetchone()[1])
+        cursor.close()
+        return value
+
+
+def seed_books(count, stock):
+    """اطمینان از وجود حداقل count کتاب فعال با موجودی کافی؛ خروجی شناسه کتاب‌ها"""
+    from database import add_book_full, add_category, count_active_books, get_books_page
+
+    missing = count - count_active_books()
+    if missing > 0:
+        category_id = add_category("بنچمارک")
+        for i in range(missing):
+            add_book_full(
+                f"کتاب بنچمارک {i}", f"نویسنده {i % 50}", "توضیحات کتاب بنچمارک",
+                10000 + i, category_id, stock=stock
+            )
+        print(f"🌱 {missing} کتاب برای بنچمارک اضافه شد")
+
+    return [book["book_id"] for book in get_books_page(count)]
+
+
+class Bench:
+    """اجرای مسیرهای کاربر روی handler های main و جمع‌آوری زمان‌ها"""
+
+    def __init__(self, app, api, journey, book_ids, seed=None):
+        self.app = app
+        self.api = api
+        self.journey = JOURNEYS[journey]
+        self.book_ids = book_ids
+        self.seed = seed
+        self.latencies = defaultdict(list)  # نام مرحله -> زمان‌ها (ثانیه)
+        self.queries = defaultdict(list)  # نام مرحله -> تعداد کوئری هر update (instrumentation)
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def process(self, step, payload):
+        """اجرای handler های یک update در همین thread؛ خروجی (زمان اجرا، تعداد کوئری)"""
+        from telebot.types import Update
+        from database import update_scope
+
+        update = Update.de_json(payload)
+        with update_scope(f"bench {step}") as scope:
+            started = time.perf_counter()
+            self.app.bot.process_new_updates([update])
+            elapsed = time.perf_counter() - started
+        return elapsed, scope.queries if scope is not None else None
+
+    def run_user(self, user_id):
+        rng = random.Random(None if self.seed is None else self.seed + user_id)
+        for step, payload in self.journey(user_id, self.book_ids, self.api.last_message_id, rng):
+            try:
+                elapsed, queries = self.process(step, payload)
+            except Exception as e:
+                logging.getLogger(__name__).warning("خطا در مرحله %s کاربر %s: %s", step, user_id, e)
+                with self._lock:
+                    self.failures += 1
+                continue
+            with self._lock:
+                self.latencies[step].append(elapsed)
+                if queries is not None:
+                    self.queries[step].append(queries)
+
+    def run(self, users, concurrency):
+        pending = queue.Queue()
+        for i in range(users):
+            pending.put(BENCH_USER_BASE + i)
+
+        def worker():
+            while True:
+                try:
+                    user_id = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self.run_user(user_id)
+
+        threads = [threading.Thread(target=worker, name=f"bench-{i}") for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def report(bench, wall_time, queries, api_stats):
+    all_latencies = [t for values in bench.latencies.values() for t in values]
+    updates = len(all_latencies)
+    result = {
+        "updates": updates,
+        "failures": bench.failures,
+        "wall_time_s": wall_time,
+        "throughput_updates_per_s": updates / wall_time if wall_time else 0.0,
+        "db_queries": queries,
+        "db_queries_per_update": queries / updates if updates else 0.0,
+        "latency": summarize(all_latencies),
+        "steps": {step: summarize(values) for step, values in bench.latencies.items()},
+        "step_queries": {
+            step: sum(values) / len(values) for step, values in bench.queries.items() if values
+        },
+        "telegram_api": api_stats,
+    }
+    return result
+
+
+def print_report(result):
+    latency = result["latency"]
+    print("=" * 60)
+    print(f"update ها: {result['updates']}  (خطا: {result['failures']})")
+    print(f"زمان کل: {result['wall_time_s']:.2f}s  |  throughput: {result['throughput_updates_per_s']:.1f} update/s")
+    print(f"کوئری دیتابیس: {result['db_queries']}  |  به ازای هر update: {result['db_queries_per_update']:.2f}")
+    print(f"latency handler: p50={latency['p50_ms']:.1f}ms  p95={latency['p95_ms']:.1f}ms  "
+          f"p99={latency['p99_ms']:.1f}ms  max={latency['max_ms']:.1f}ms")
+    print("-" * 60)
+    print(f"{'مرحله':14} {'تعداد':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'کوئری':>7}")
+    for step, s in result["steps"].items():
+        queries = result["step_queries"].get(step)
+        print(f"{step:14} {s['count']:>7} {s['p50_ms']:>8.1f}ms {s['p95_ms']:>8.1f}ms {s['p99_ms']:>8.1f}ms "
+              f"{queries if queries is None else round(queries, 1):>7}")
+    print("-" * 60)
+    calls = result["telegram_api"]["calls"]
+    errors = result["telegram_api"]["errors"]
+    for method in sorted(calls):
+        print(f"{method:24} {calls[method]:>7}  خطا: {errors.get(method, 0)}")
+    print("=" * 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="بنچمارک handler های ربات با Bot API محلی")
+    parser.add_argument("--users", type=int, default=50, help="تعداد کاربر مجازی")
+    parser.add_argument("--concurrency", type=int, default=10, help="کاربرهای هم‌زمان")
+    parser.add_argument("--journey", choices=sorted(JOURNEYS), default="purchase")
+    parser.add_argument("--books", type=int, default=50, help="حداقل تعداد کتاب فعال")
+    parser.add_argument("--stock", type=int, default=1000000, help="موجودی کتاب‌های ساخته‌شده")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="تاخیر مصنوعی Bot API")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="ارسال از طریق زمان‌بندی sender (محدودیت تلگرام) مثل حالت واقعی")
+    parser.add_argument("--seed", type=int, default=None, help="seed انتخاب تصادفی کتاب‌ها")
+    parser.add_argument("--json", help="ذخیره نتیجه در فایل JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    api = FakeTelegramServer(latency=args.api_latency_ms / 1000).start()
+
+    # config توکن و ادمین را از محیط می‌خواند؛ مقدار ساختگی اگر تنظیم نشده باشد
+    os.environ.setdefault("BOT_TOKEN", "123456789:bench-token")
+    os.environ.setdefault("ADMIN_ID", "1")
+
+    from telebot import apihelper
+
+    import main as app
+
+    apihelper.API_URL = api.api_url
+    logging.getLogger().setLevel(args.log_level)
+    # جداول، کش ادمین‌ها و ایندکس جستجو مثل شروع واقعی ربات آماده می‌شوند
+    app.startup()
+    if not args.rate_limit:
+        apihelper.CUSTOM_REQUEST_SENDER = None
+    # handler ها در thread کاربر مجازی اجرا می‌شوند تا زمان هر update دقیق اندازه‌گیری شود
+    app.bot.threaded = False
+
+    book_ids = seed_books(args.books, args.stock)
+    if not book_ids:
+        print("❌ کتابی برای بنچمارک پیدا نشد (اتصال دیتابیس را بررسی کنید)")
+        return 1
+
+    bench = Bench(app, api, args.journey, book_ids, args.seed)
+    api.reset_stats()
+    before = questions()
+    wall_time = bench.run(args.users, args.concurrency)
+    # خود کوئری شمارنده هم یک Question است
+    queries = questions() - before - 1
+
+    result = report(bench, wall_time, queries, api.stats())
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    api.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .fake_telegram import FakeTelegramServer
+from .run import percentile
+
+# اندازه‌گیری زمان شروع ربات (import تا ready) با Bot API محلی:
+#   python -m bench.startup --runs 5 --budget-ms 1000
+# هر اجرا در یک پروسس جدید انجام می‌شود تا import ها و اتصال‌ها سرد باشند.
+# بار اول روی دیتابیس خالی جداول ساخته می‌شوند؛ اجراهای بعدی با نشانگر نسخه
+# ساختار از create_tables رد می‌شوند. اگر میانه زمان آماده شدن از budget بیشتر
+# باشد کد خروج 1 است.
+
+RESULT_PREFIX = "BENCH_STARTUP "
+
+
+def measure_once(api_latency=0.0):
+    """یک شروع کامل در همین پروسس: import ماژول main و اجرای startup()"""
+    api = FakeTelegramServer(latency=api_latency).start()
+
+    os.environ.setdefault("BOT_TOKEN", "123456789:bench-token")
+    os.environ.setdefault("ADMIN_ID", "1")
+
+    from telebot import apihelper
+
+    started = time.perf_counter()
+    import main as app
+    imported = time.perf_counter()
+
+    apihelper.API_URL = api.api_url
+    ok = app.startup("polling")
+    ready = time.perf_counter()
+
+    from startup import readiness
+
+    result = {
+        "ok": ok,
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "time_to_ready_ms": (ready - started) * 1000,
+        "checks": readiness.stats()["checks"],
+    }
+    api.stop()
+    return result
+
+
+def run_child(api_latency_ms):
+    """اجرای measure_once در پروسس جدید؛ خروجی نتیجه به همراه زمان کل پروسس"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--once", "--api-latency-ms", str(api_latency_ms)],
+        capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+            result["process_ms"] = elapsed * 1000
+            return result
+
+    sys.stderr.write(completed.stdout[-2000:] + completed.stderr[-2000:])
+    raise RuntimeError(f"اجرای بنچمارک شروع ناموفق بود (کد {completed.returncode})")
+
+
+def summarize(results, key):
+    values = sorted(result[key] for result in results)
+    return {"p50": percentile(values, 50), "max": values[-1]}
+
+
+def print_report(results):
+    print("=" * 60)
+    for i, result in enumerate(results, 1):
+        checks = "  ".join(
+            f"{name}={check['duration_ms']:.0f}ms{'' if check['ok'] else '❌'}"
+            for name, check in result["checks"].items()
+        )
+        print(f"#{i}: import={result['import_ms']:.0f}ms  startup={result['startup_ms']:.0f}ms  "
+              f"ready={result['time_to_ready_ms']:.0f}ms  پروسس={result['process_ms']:.0f}ms  {checks}")
+    print("-" * 60)
+    for key in ("import_ms", "startup_ms", "time_to_ready_ms", "process_ms"):
+        s = summarize(results, key)
+        print(f"{key:18} p50={s['p50']:.0f}ms  max={s['max']:.0f}ms")
+    print("=" * 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="بنچمارک زمان شروع ربات")
+    parser.add_argument("--runs", type=int, default=5, help="تعداد شروع (هر کدام یک پروسس)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="تاخیر مصنوعی Bot API")
+    parser.add_argument("--budget-ms", type=float, default=1000.0,
+                        help="حداکثر میانه زمان آماده شدن (import تا ready)")
+    parser.add_argument("--json", help="ذخیره نتیجه در فایل JSON")
+    parser.add_argument("--once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.once:
+        result = measure_once(args.api_latency_ms / 1000)
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return 0
+
+    results = [run_child(args.api_latency_ms) for _ in range(args.runs)]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    p50 = summarize(results, "time_to_ready_ms")["p50"]
+    if p50 > args.budget_ms:
+        print(f"❌ میانه زمان آماده شدن ({p50:.0f}ms) از budget ({args.budget_ms:.0f}ms) بیشتر است")
+        return 1
+    print(f"✅ میانه زمان آماده شدن {p50:.0f}ms (budget {args.budget_ms:.0f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,78 @@
-from .connection import get_db_connection
+import mysql.connector
+from mysql.connector import errorcode
+
+from .connection import get_db_connection, pooled_connection
+
+# نسخه ساختار دیتابیس؛ با هر تغییر در جداول یا ایندکس‌های این فایل یک واحد زیاد شود
+# تا در شروع بعدی create_tables دوباره اجرا شود
+SCHEMA_VERSION = 1
+
+
+def create_search_index(cursor):
+    """ایجاد ایندکس FULLTEXT با parser ngram برای جستجوی فارسی در کتاب‌ها"""
+    cursor.execute(
+        """
+        SELECT COUNT(*)
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        AND TABLE_NAME = 'books'
+        AND INDEX_NAME = 'ft_books_search'
+    """
+    )
+    if cursor.fetchone()[0]:
+        return True
+
+    try:
+        cursor.execute(
+            """
+            ALTER TABLE books
+            ADD FULLTEXT INDEX ft_books_search (title, author, description)
+            WITH PARSER ngram
+        """
+        )
+        print("✅ ایندکس جستجوی FULLTEXT ساخته شد")
+        return True
+
+    except Exception as e:
+        # جستجو در این حالت به LIKE برمی‌گردد
+        print(f"⚠️ ایندکس FULLTEXT ساخته نشد: {e}")
+        return False
+
+
+# ایندکس‌های ترکیبی برای کوئری‌های database/DQL.py: (جدول، نام ایندکس، ستون‌ها)
+SECONDARY_INDEXES = [
+    # لیست و صفحه‌بندی کتاب‌های فعال (get_all_books، get_books_page، count_active_books)
+    ("books", "idx_books_active_created", "is_active, created_at, book_id"),
+    # کتاب‌های یک دسته به ترتیب عنوان (get_books_by_category)
+    ("books", "idx_books_category_active_title", "category_id, is_active, title"),
+    # صف سفارش‌های در انتظار (get_pending_orders، count_pending_orders)
+    ("orders", "idx_orders_status_created", "status, created_at, order_id"),
+    # سفارش‌های یک کاربر (get_user_orders)
+    ("orders", "idx_orders_user_created", "user_id, created_at"),
+    # آیتم‌های سفارش (get_order_items، get_pending_orders_with_items)
+    ("order_items", "idx_order_items_order", "order_id, item_id"),
+]
+
+
+def create_indexes(cursor):
+    """ساخت ایندکس‌های ترکیبی که هنوز وجود ندارند"""
+    cursor.execute(
+        """
+        SELECT DISTINCT TABLE_NAME, INDEX_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """
+    )
+    existing = set(cursor.fetchall())
+
+    for table, name, columns in SECONDARY_INDEXES:
+        if (table, name) in existing:
+            continue
+        try:
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+            print(f"✅ ایندکس {name} روی {table} ساخته شد")
+        except Exception as e:
+            print(f"⚠️ ایندکس {name} ساخته نشد: {e}")
 
 
 def create_tables():
@@ -55,6 +129,8 @@ def create_tables():
         """
         )
 
+        create_search_index(cursor)
+
         # جدول cart_items
         cursor.execute(
             """
@@ -116,6 +192,38 @@ def create_tables():
         """
         )
 
+        # جدول conversation_states (state گفتگوها برای STATE_BACKEND=mysql)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_states (
+                user_id BIGINT NOT NULL PRIMARY KEY,
+                state TEXT NOT NULL,
+                expires_at DOUBLE NOT NULL,
+                INDEX idx_expires_at (expires_at)
+            )
+        """
+        )
+
+        create_indexes(cursor)
+
+        # نشانگر نسخه: شروع‌های بعدی تا وقتی نسخه عوض نشده بررسی جداول را رد می‌کنند
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id TINYINT NOT NULL PRIMARY KEY,
+                version INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """
+        )
+        cursor.execute(
+            """
+            INSERT INTO schema_version (id, version) VALUES (1, %s)
+            ON DUPLICATE KEY UPDATE version = GREATEST(version, VALUES(version))
+        """,
+            (SCHEMA_VERSION,),
+        )
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -124,4 +232,40 @@ def create_tables():
 
     except Exception as e:
         print(f"❌ خطا در ایجاد جداول: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def get_schema_version():
+    """نسخه ثبت‌شده ساختار دیتابیس؛ 0 اگر نشانگر هنوز ساخته نشده باشد"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except mysql.connector.Error as e:
+            if e.errno == errorcode.ER_NO_SUCH_TABLE:
+                return 0
+            raise
+        finally:
+            cursor.close()
+
+
+def ensure_schema():
+    """اجرای create_tables فقط اگر نسخه ساختار دیتابیس قدیمی یا ناموجود باشد"""
+    try:
+        version = get_schema_version()
+    except Exception as e:
+        print(f"❌ خطا در خواندن نسخه ساختار دیتابیس: {e}")
+        return False
+
+    if version is not None and version >= SCHEMA_VERSION:
+        if version > SCHEMA_VERSION:
+            # مثلاً بعد از برگشت به نسخه قدیمی‌تر کد؛ نشانگر پایین آورده نمی‌شود
+            print(f"⚠️ نسخه ساختار دیتابیس ({version}) از نسخه کد ({SCHEMA_VERSION}) جدیدتر است")
+        else:
+            print(f"✅ ساختار دیتابیس به‌روز است (نسخه {version})")
+        return True
+
+    print(f"🔄 به‌روزرسانی ساختار دیتابیس (نسخه {version} ← {SCHEMA_VERSION})...")
+    return create_tables()
@@ -1,29 +1,41 @@
-from .connection import get_db_connection
+from .connection import pooled_connection, transaction
+from .cache import invalidate_book, invalidate_book_details, invalidate_categories
+from .search_index import refresh_indexed_book, refresh_indexed_books, remove_indexed_book
+from .DQL import _fetch_cart_items, cart_snapshot
+from .cart_buffer import cart_buffer, use_cart_buffer
+from .admin_cache import admin_cache
+
+
+class OutOfStockError(Exception):
+    """موجودی یک یا چند کتاب سبد برای ثبت سفارش کافی نیست"""
+
+    def __init__(self, titles):
+        super().__init__("موجودی کافی نیست: " + "، ".join(titles))
+        self.titles = titles
 
 
 #  USER OPERATIONS 
 def save_user(user_id, phone=None, address=None, postal_code=None):
     """ذخیره کاربر - مطابق جدول users"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO users (user_id, phone, address, postal_code)
-            VALUES (%s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            phone = VALUES(phone),
-            address = VALUES(address),
-            postal_code = VALUES(postal_code)
-        """,
-            (user_id, phone, address, postal_code),
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO users (user_id, phone, address, postal_code)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                phone = VALUES(phone),
+                address = VALUES(address),
+                postal_code = VALUES(postal_code)
+            """,
+                (user_id, phone, address, postal_code),
+            )
+
+            conn.commit()
+            cursor.close()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در ذخیره کاربر: {e}")
@@ -34,23 +46,23 @@ def save_user(user_id, phone=None, address=None, postal_code=None):
 def add_category(name):
     """اضافه کردن دسته‌بندی جدید"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO categories (name)
-            VALUES (%s)
-            ON DUPLICATE KEY UPDATE name = VALUES(name)
-        """,
-            (name,),
-        )
-
-        conn.commit()
-        category_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
-        return category_id
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO categories (name)
+                VALUES (%s)
+                ON DUPLICATE KEY UPDATE name = VALUES(name)
+            """,
+                (name,),
+            )
+
+            conn.commit()
+            category_id = cursor.lastrowid
+            cursor.close()
+            invalidate_categories()
+            return category_id
 
     except Exception as e:
         print(f"❌ خطا در اضافه کردن دسته‌بندی: {e}")
@@ -60,18 +72,18 @@ def add_category(name):
 def delete_category(category_id):
     """حذف دسته‌بندی"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "DELETE FROM categories WHERE category_id = %s",
-            (category_id,),
-        )
+            cursor.execute(
+                "DELETE FROM categories WHERE category_id = %s",
+                (category_id,),
+            )
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+            conn.commit()
+            cursor.close()
+            invalidate_categories()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در حذف دسته‌بندی: {e}")
@@ -91,38 +103,38 @@ def save_book(
 ):
     """ذخیره کتاب - مطابق جدول books"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO books (book_key, title, author, cover_url, price, category_id, description, file_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            title = VALUES(title),
-            author = VALUES(author),
-            cover_url = VALUES(cover_url),
-            price = VALUES(price),
-            category_id = VALUES(category_id),
-            description = VALUES(description),
-            file_id = VALUES(file_id)
-        """,
-            (
-                book_key,
-                title,
-                author,
-                cover_url,
-                price,
-                category_id,
-                description,
-                file_id,
-            ),
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO books (book_key, title, author, cover_url, price, category_id, description, file_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                title = VALUES(title),
+                author = VALUES(author),
+                cover_url = VALUES(cover_url),
+                price = VALUES(price),
+                category_id = VALUES(category_id),
+                description = VALUES(description),
+                file_id = VALUES(file_id)
+            """,
+                (
+                    book_key,
+                    title,
+                    author,
+                    cover_url,
+                    price,
+                    category_id,
+                    description,
+                    file_id,
+                ),
+            )
+
+            conn.commit()
+            cursor.close()
+            invalidate_book()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در ذخیره کتاب: {e}")
@@ -141,22 +153,23 @@ def add_book_full(
 ):
     """اضافه کردن کتاب با جزئیات کامل """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO books (title, author, description, price, category_id, file_id, cover_url, stock)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-            (title, author, description, price, category_id, file_id, cover_url, stock),
-        )
-
-        book_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return book_id
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO books (title, author, description, price, category_id, file_id, cover_url, stock)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+                (title, author, description, price, category_id, file_id, cover_url, stock),
+            )
+
+            book_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
+            invalidate_book(book_id)
+            refresh_indexed_book(book_id)
+            return book_id
 
     except Exception as e:
         print(f"❌ خطا در اضافه کردن کتاب: {e}")
@@ -166,29 +179,30 @@ def add_book_full(
 def update_book(book_id, **kwargs):
     """آپدیت اطلاعات کتاب"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        if not kwargs:
-            return False
-
-        set_clause = ", ".join([f"{k} = %s" for k in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(book_id)
-
-        cursor.execute(
-            f"""
-            UPDATE books 
-            SET {set_clause}
-            WHERE book_id = %s
-        """,
-            values,
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            if not kwargs:
+                return False
+
+            set_clause = ", ".join([f"{k} = %s" for k in kwargs.keys()])
+            values = list(kwargs.values())
+            values.append(book_id)
+
+            cursor.execute(
+                f"""
+                UPDATE books 
+                SET {set_clause}
+                WHERE book_id = %s
+            """,
+                values,
+            )
+
+            conn.commit()
+            cursor.close()
+            invalidate_book(book_id)
+            refresh_indexed_book(book_id)
+            return True
 
     except Exception as e:
         print(f"❌ خطا در آپدیت کتاب: {e}")
@@ -198,18 +212,21 @@ def update_book(book_id, **kwargs):
 def delete_book(book_id):
     """حذف کتاب"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "DELETE FROM books WHERE book_id = %s",
-            (book_id,),
-        )
+            cursor.execute(
+                "DELETE FROM books WHERE book_id = %s",
+                (book_id,),
+            )
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+            conn.commit()
+            cursor.close()
+            invalidate_book(book_id)
+            remove_indexed_book(book_id)
+            if use_cart_buffer():
+                cart_buffer.drop_book(book_id)
+            return True
 
     except Exception as e:
         print(f"❌ خطا در حذف کتاب: {e}")
@@ -220,24 +237,24 @@ def delete_book(book_id):
 def add_admin(user_id, username=None, is_super_admin=False):
     """اضافه کردن ادمین"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO admins (user_id, username, is_super_admin)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-            username = VALUES(username),
-            is_super_admin = VALUES(is_super_admin)
-        """,
-            (user_id, username, is_super_admin),
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO admins (user_id, username, is_super_admin)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE 
+                username = VALUES(username),
+                is_super_admin = VALUES(is_super_admin)
+            """,
+                (user_id, username, is_super_admin),
+            )
+
+            conn.commit()
+            cursor.close()
+            admin_cache.invalidate()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در اضافه کردن ادمین: {e}")
@@ -247,18 +264,18 @@ def add_admin(user_id, username=None, is_super_admin=False):
 def remove_admin(user_id):
     """حذف ادمین"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            "DELETE FROM admins WHERE user_id = %s",
-            (user_id,),
-        )
+            cursor.execute(
+                "DELETE FROM admins WHERE user_id = %s",
+                (user_id,),
+            )
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+            conn.commit()
+            cursor.close()
+            admin_cache.invalidate()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در حذف ادمین: {e}")
@@ -269,82 +286,169 @@ def remove_admin(user_id):
 def add_to_cart(user_id, book_id, quantity=1):
     """افزودن کتاب به سبد خرید """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # اول اطلاعات کتاب رو بگیریم
-        cursor.execute(
-            "SELECT title, author, price FROM books WHERE book_id = %s",
-            (book_id,),
-        )
-        book = cursor.fetchone()
-
-        if not book:
-            return False
-
-        cursor.execute(
-            """
-            INSERT INTO cart_items (user_id, book_id, quantity)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            quantity = quantity + VALUES(quantity)
-        """,
-            (user_id, book_id, quantity),
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        if use_cart_buffer():
+            return cart_buffer.add(user_id, book_id, quantity)
 
-    except Exception as e:
-        print(f"❌ خطا در افزودن به سبد: {e}")
-        return False
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-
-def update_cart_quantity(user_id, book_id, change):
-    """آپدیت تعداد کتاب در سبد """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        if change == 0:  # حذف
+            # اول موجودی کتاب و تعداد فعلی در سبد رو بگیریم
             cursor.execute(
-                "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s",
+                """
+                SELECT b.stock, COALESCE(ci.quantity, 0)
+                FROM books b
+                LEFT JOIN cart_items ci ON ci.book_id = b.book_id AND ci.user_id = %s
+                WHERE b.book_id = %s AND b.is_active = TRUE
+            """,
                 (user_id, book_id),
             )
-        else:
+            book = cursor.fetchone()
+
+            if not book:
+                return False
+
+            # رزرو واقعی موجودی هنگام ثبت سفارش انجام می‌شود؛ اینجا فقط جلوی سبد غیرممکن گرفته می‌شود
+            stock, in_cart = book
+            if stock is not None and in_cart + quantity > stock:
+                return False
+
             cursor.execute(
                 """
-                UPDATE cart_items 
-                SET quantity = quantity + %s 
-                WHERE user_id = %s AND book_id = %s
+                INSERT INTO cart_items (user_id, book_id, quantity)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                quantity = quantity + VALUES(quantity)
             """,
-                (change, user_id, book_id),
+                (user_id, book_id, quantity),
             )
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+            conn.commit()
+            cursor.close()
+            return True
+
+    except Exception as e:
+        print(f"❌ خطا در افزودن به سبد: {e}")
+        return False
+
+
+def update_cart_quantity(user_id, book_id, change):
+    """آپدیت تعداد کتاب در سبد """
+    try:
+        if use_cart_buffer():
+            return cart_buffer.change(user_id, book_id, change)[0]
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            if change == 0:  # حذف
+                cursor.execute(
+                    "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s",
+                    (user_id, book_id),
+                )
+            elif change > 0:
+                # افزایش فقط تا سقف موجودی کتاب
+                cursor.execute(
+                    """
+                    UPDATE cart_items ci
+                    JOIN books b ON ci.book_id = b.book_id
+                    SET ci.quantity = ci.quantity + %s
+                    WHERE ci.user_id = %s AND ci.book_id = %s
+                    AND (b.stock IS NULL OR ci.quantity + %s <= b.stock)
+                """,
+                    (change, user_id, book_id, change),
+                )
+                if cursor.rowcount == 0:
+                    cursor.close()
+                    return False
+            else:
+                cursor.execute(
+                    """
+                    UPDATE cart_items 
+                    SET quantity = quantity + %s 
+                    WHERE user_id = %s AND book_id = %s
+                """,
+                    (change, user_id, book_id),
+                )
+
+            conn.commit()
+            cursor.close()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در آپدیت سبد: {e}")
         return False
 
 
+def change_cart_quantity(user_id, book_id, change):
+    """تغییر تعداد کتاب در سبد و برگرداندن سبد جدید روی همان اتصال
+
+    change=0 حذف می‌کند؛ ردیف‌هایی که تعدادشان به صفر یا کمتر برسد در همان
+    اتصال حذف می‌شوند. خروجی (انجام شد؟، snapshot سبد) و در صورت خطا (False, None).
+    """
+    try:
+        if use_cart_buffer():
+            return cart_buffer.change(user_id, book_id, change)
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            updated = True
+
+            if change == 0:
+                cursor.execute(
+                    "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s",
+                    (user_id, book_id),
+                )
+            elif change > 0:
+                # افزایش فقط تا سقف موجودی کتاب
+                cursor.execute(
+                    """
+                    UPDATE cart_items ci
+                    JOIN books b ON ci.book_id = b.book_id
+                    SET ci.quantity = ci.quantity + %s
+                    WHERE ci.user_id = %s AND ci.book_id = %s
+                    AND (b.stock IS NULL OR ci.quantity + %s <= b.stock)
+                """,
+                    (change, user_id, book_id, change),
+                )
+                updated = cursor.rowcount > 0
+            else:
+                cursor.execute(
+                    """
+                    UPDATE cart_items
+                    SET quantity = quantity + %s
+                    WHERE user_id = %s AND book_id = %s
+                """,
+                    (change, user_id, book_id),
+                )
+                cursor.execute(
+                    "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s AND quantity <= 0",
+                    (user_id, book_id),
+                )
+
+            conn.commit()
+            snapshot = cart_snapshot(_fetch_cart_items(cursor, user_id))
+            cursor.close()
+            return updated, snapshot
+
+    except Exception as e:
+        print(f"❌ خطا در آپدیت سبد: {e}")
+        return False, None
+
+
 def clear_user_cart(user_id):
     """پاک کردن سبد خرید کاربر"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if use_cart_buffer():
+            return cart_buffer.clear(user_id)
 
-        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+            cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+
+            conn.commit()
+            cursor.close()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در پاک کردن سبد: {e}")
@@ -355,23 +459,22 @@ def clear_user_cart(user_id):
 def create_order(user_id, total_price, receipt_photo, phone, address, postal_code):
     """ایجاد سفارش کامل"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            INSERT INTO orders (user_id, total_price, receipt_photo, phone, address, postal_code)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-            (user_id, total_price, receipt_photo, phone, address, postal_code),
-        )
+            cursor.execute(
+                """
+                INSERT INTO orders (user_id, total_price, receipt_photo, phone, address, postal_code)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+                (user_id, total_price, receipt_photo, phone, address, postal_code),
+            )
 
-        order_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
+            order_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
 
-        return order_id
+            return order_id
 
     except Exception as e:
         print(f"❌ خطا در ایجاد سفارش: {e}")
@@ -381,21 +484,20 @@ def create_order(user_id, total_price, receipt_photo, phone, address, postal_cod
 def add_order_item(order_id, book_id, title, author, price, count):
     """افزودن آیتم سفارش"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO order_items (order_id, book_id, title, author, price, count)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-            (order_id, book_id, title, author, price, count),
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO order_items (order_id, book_id, title, author, price, count)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+                (order_id, book_id, title, author, price, count),
+            )
+
+            conn.commit()
+            cursor.close()
+            return True
 
     except Exception as e:
         print(f"❌ خطا در افزودن آیتم سفارش: {e}")
@@ -403,21 +505,170 @@ def add_order_item(order_id, book_id, title, author, price, count):
 
 
 def update_order_status(order_id, status):
-    """آپدیت وضعیت سفارش"""
+    """آپدیت وضعیت سفارش؛ با رد سفارش موجودی رزرو شده آزاد می‌شود"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with transaction() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT status FROM orders WHERE order_id = %s FOR UPDATE",
+                (order_id,),
+            )
+            row = cursor.fetchone()
+            if not row:
+                cursor.close()
+                return False
+
+            current_status = row[0]
+            if current_status == status:
+                cursor.close()
+                return True
+
+            # موجودی سفارش رد شده قبلاً آزاد شده؛ تغییر دوباره وضعیت مجاز نیست
+            if current_status == "rejected":
+                cursor.close()
+                return False
+
+            released_books = []
+            if status == "rejected":
+                cursor.execute(
+                    "SELECT DISTINCT book_id FROM order_items WHERE order_id = %s",
+                    (order_id,),
+                )
+                released_books = [r[0] for r in cursor.fetchall()]
+                cursor.execute(
+                    """
+                    UPDATE books b
+                    JOIN (
+                        SELECT book_id, SUM(count) AS quantity
+                        FROM order_items
+                        WHERE order_id = %s
+                        GROUP BY book_id
+                    ) oi ON b.book_id = oi.book_id
+                    SET b.stock = b.stock + oi.quantity
+                """,
+                    (order_id,),
+                )
 
-        cursor.execute(
-            "UPDATE orders SET status = %s WHERE order_id = %s",
-            (status, order_id),
-        )
+            cursor.execute(
+                "UPDATE orders SET status = %s WHERE order_id = %s",
+                (status, order_id),
+            )
+            cursor.close()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        invalidate_book_details(released_books)
+        refresh_indexed_books(released_books)
         return True
 
     except Exception as e:
         print(f"❌ خطا در آپدیت وضعیت سفارش: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+#  CHECKOUT 
+def checkout_order(user_id, receipt_photo, phone, address, postal_code):
+    """ثبت کامل سفارش از روی سبد خرید در یک تراکنش
+
+    سفارش، آیتم‌ها، کسر موجودی، اطلاعات کاربر و خالی کردن سبد همه با هم commit می‌شوند.
+    خروجی: (order_id, total) یا (None, 0) اگر سبد خالی باشد یا خطا رخ دهد
+    اگر موجودی کافی نباشد OutOfStockError با عنوان کتاب‌ها ایجاد می‌شود.
+    """
+    try:
+        # تغییرات بافر شده سبد باید قبل از قفل کردن ردیف‌ها در دیتابیس باشند
+        if use_cart_buffer() and not cart_buffer.flush(user_id):
+            return None, 0
+
+        with transaction() as conn:
+            cursor = conn.cursor()
+
+            # قفل کردن ردیف‌های سبد تا تغییر هم‌زمان سبد وارد سفارش نشود
+            # قفل ردیف‌های سبد و کتاب‌های همان سبد (نه کل جدول books)؛
+            # ترتیب book_id جلوی deadlock بین خریدهای هم‌زمان را می‌گیرد
+            cursor.execute(
+                """
+                SELECT ci.book_id, ci.quantity, b.price, b.stock, b.title
+                FROM cart_items ci
+                JOIN books b ON ci.book_id = b.book_id
+                WHERE ci.user_id = %s
+                ORDER BY ci.book_id
+                FOR UPDATE
+            """,
+                (user_id,),
+            )
+            lines = cursor.fetchall()
+
+            if not lines:
+                cursor.close()
+                return None, 0
+
+            short = [
+                title
+                for _, quantity, _, stock, title in lines
+                if stock is not None and stock < quantity
+            ]
+            if short:
+                cursor.close()
+                raise OutOfStockError(short)
+
+            total = sum(price * quantity for _, quantity, price, _, _ in lines)
+
+            # کسر موجودی؛ ردیف‌ها قفل شده‌اند پس موجودی منفی نمی‌شود
+            cursor.execute(
+                """
+                UPDATE books b
+                JOIN cart_items ci ON ci.book_id = b.book_id
+                SET b.stock = b.stock - ci.quantity
+                WHERE ci.user_id = %s
+            """,
+                (user_id,),
+            )
+
+            cursor.execute(
+                """
+                INSERT INTO orders (user_id, total_price, receipt_photo, phone, address, postal_code)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+                (user_id, total, receipt_photo, phone, address, postal_code),
+            )
+            order_id = cursor.lastrowid
+
+            cursor.execute(
+                """
+                INSERT INTO order_items (order_id, book_id, title, author, price, count)
+                SELECT %s, b.book_id, b.title, b.author, b.price, ci.quantity
+                FROM cart_items ci
+                JOIN books b ON ci.book_id = b.book_id
+                WHERE ci.user_id = %s
+            """,
+                (order_id, user_id),
+            )
+
+            cursor.execute(
+                """
+                INSERT INTO users (user_id, phone, address, postal_code)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                phone = VALUES(phone),
+                address = VALUES(address),
+                postal_code = VALUES(postal_code)
+            """,
+                (user_id, phone, address, postal_code),
+            )
+
+            cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+
+            cursor.close()
+
+        ordered_books = [book_id for book_id, *_ in lines]
+        invalidate_book_details(ordered_books)
+        refresh_indexed_books(ordered_books)
+        if use_cart_buffer():
+            cart_buffer.forget(user_id)
+        return order_id, total
+
+    except OutOfStockError:
+        raise
+
+    except Exception as e:
+        print(f"❌ خطا در ثبت سفارش: {e}")
+        return None, 0
@@ -1,18 +1,128 @@
-from .connection import get_db_connection
+import os
+
+from .connection import pooled_connection
+from .cache import catalog_cache
+from .search_index import search_index, use_memory_search
+from .cart_buffer import cart_buffer, use_cart_buffer
+from .admin_cache import admin_cache
+
+# حداقل طول توکن parser ngram در MySQL (ngram_token_size)
+NGRAM_TOKEN_SIZE = int(os.getenv("NGRAM_TOKEN_SIZE", "2"))
+
+# خطاهای MySQL وقتی ایندکس FULLTEXT وجود ندارد
+# 1191: ER_FT_MATCHING_KEY_NOT_FOUND, 1214: ER_TABLE_CANT_HANDLE_FT
+FULLTEXT_MISSING_ERRORS = (1191, 1214)
+
+# بعد از اولین خطای نبود ایندکس، مستقیم از LIKE استفاده می‌شود
+_fulltext_state = {"available": True}
+
+#  SQL
+# متن کوئری‌های پرتکرار؛ نسخه async (aio.py) و بررسی پلن (query_plans.py) همین‌ها را استفاده می‌کنند
+BOOKS_SELECT_SQL = """
+    SELECT b.*, c.name as category_name
+    FROM books b
+    LEFT JOIN categories c ON b.category_id = c.category_id
+"""
+
+BOOK_BY_ID_SQL = BOOKS_SELECT_SQL + "WHERE b.book_id = %s"
+
+BOOKS_BY_CATEGORY_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.category_id = %s AND b.is_active = TRUE
+    ORDER BY b.title
+    LIMIT %s
+"""
+
+ALL_BOOKS_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.is_active = TRUE
+    ORDER BY b.created_at DESC
+    LIMIT %s
+"""
+
+COUNT_ACTIVE_BOOKS_SQL = "SELECT COUNT(*) FROM books WHERE is_active = TRUE"
+
+BOOK_ANCHOR_SQL = "SELECT created_at, book_id FROM books WHERE book_id = %s"
+
+# صفحه‌بندی keyset روی (created_at, book_id) و offset وقتی کتاب مرجع نیست
+BOOKS_PAGE_AFTER_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.is_active = TRUE
+    AND (b.created_at < %s OR (b.created_at = %s AND b.book_id < %s))
+    ORDER BY b.created_at DESC, b.book_id DESC
+    LIMIT %s
+"""
+
+BOOKS_PAGE_BEFORE_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.is_active = TRUE
+    AND (b.created_at > %s OR (b.created_at = %s AND b.book_id > %s))
+    ORDER BY b.created_at ASC, b.book_id ASC
+    LIMIT %s
+"""
+
+BOOKS_PAGE_OFFSET_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.is_active = TRUE
+    ORDER BY b.created_at DESC, b.book_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+SEARCH_FULLTEXT_SQL = """
+    SELECT b.*, c.name as category_name,
+    MATCH(b.title, b.author, b.description)
+        AGAINST (%s IN NATURAL LANGUAGE MODE) AS relevance
+    FROM books b
+    LEFT JOIN categories c ON b.category_id = c.category_id
+    WHERE b.is_active = TRUE
+    AND MATCH(b.title, b.author, b.description) AGAINST (%s IN BOOLEAN MODE)
+    ORDER BY relevance DESC, b.title
+    LIMIT %s
+"""
+
+SEARCH_LIKE_SQL = BOOKS_SELECT_SQL + """
+    WHERE b.is_active = TRUE
+    AND (b.title LIKE %s OR b.author LIKE %s OR b.description LIKE %s)
+    ORDER BY b.title
+    LIMIT %s
+"""
+
+CART_ITEMS_SQL = """
+    SELECT ci.*, b.title, b.author, b.price, b.file_id, b.cover_url
+    FROM cart_items ci
+    JOIN books b ON ci.book_id = b.book_id
+    WHERE ci.user_id = %s
+"""
+
+PENDING_ORDERS_PAGE_SQL = """
+    SELECT o.*, u.phone, u.address, u.postal_code
+    FROM orders o
+    LEFT JOIN users u ON o.user_id = u.user_id
+    WHERE o.status = 'pending'
+    ORDER BY o.created_at DESC, o.order_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+COUNT_PENDING_ORDERS_SQL = "SELECT COUNT(*) FROM orders WHERE status = 'pending'"
+
+# {placeholders}: یک %s برای هر سفارش
+ORDER_ITEMS_FOR_ORDERS_SQL = (
+    "SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY order_id, item_id"
+)
+
+USER_ORDERS_SQL = """
+    SELECT * FROM orders
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+"""
 
 
 def get_user(user_id):
     """دریافت اطلاعات کاربر"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
+            cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+            user = cursor.fetchone()
 
-        cursor.close()
-        conn.close()
-        return user
+            cursor.close()
+            return user
 
     except Exception as e:
         print(f"❌ خطا در دریافت کاربر: {e}")
@@ -22,22 +132,28 @@ def get_user(user_id):
 #  CATEGORY QUERIES  
 def get_all_categories():
     """دریافت همه دسته‌بندی‌ها"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+    cache_key = "categories"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
 
-        cursor.execute(
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(
+                """
+                SELECT category_id, name 
+                FROM categories 
+                ORDER BY name
             """
-            SELECT category_id, name 
-            FROM categories 
-            ORDER BY name
-        """
-        )
+            )
 
-        categories = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return categories
+            categories = cursor.fetchall()
+            cursor.close()
+            catalog_cache.set(cache_key, categories, generation=generation)
+            return categories
 
     except Exception as e:
         print(f"❌ خطا در دریافت دسته‌بندی‌ها: {e}")
@@ -47,18 +163,17 @@ def get_all_categories():
 def get_category_by_id(category_id):
     """دریافت اطلاعات یک دسته‌بندی"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            "SELECT * FROM categories WHERE category_id = %s",
-            (category_id,),
-        )
+            cursor.execute(
+                "SELECT * FROM categories WHERE category_id = %s",
+                (category_id,),
+            )
 
-        category = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return category
+            category = cursor.fetchone()
+            cursor.close()
+            return category
 
     except Exception as e:
         print(f"❌ خطا در دریافت دسته‌بندی: {e}")
@@ -68,24 +183,23 @@ def get_category_by_id(category_id):
 #  BOOK QUERIES  
 def get_book(book_id):
     """دریافت اطلاعات کتاب با ID"""
+    cache_key = f"book:{book_id}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            """
-            SELECT b.*, c.name as category_name
-            FROM books b
-            LEFT JOIN categories c ON b.category_id = c.category_id
-            WHERE b.book_id = %s
-        """,
-            (book_id,),
-        )
+            cursor.execute(BOOK_BY_ID_SQL, (book_id,))
 
-        book = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return book
+            book = cursor.fetchone()
+            cursor.close()
+            if book:
+                catalog_cache.set(cache_key, book, generation=generation)
+            return book
 
     except Exception as e:
         print(f"❌ خطا در دریافت کتاب: {e}")
@@ -94,26 +208,22 @@ def get_book(book_id):
 
 def get_books_by_category(category_id, limit=10):
     """دریافت کتاب‌های یک دسته‌بندی"""
+    cache_key = f"books:category:{category_id}:{limit}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            """
-            SELECT b.*, c.name as category_name
-            FROM books b
-            LEFT JOIN categories c ON b.category_id = c.category_id
-            WHERE b.category_id = %s AND b.is_active = TRUE
-            ORDER BY b.title
-            LIMIT %s
-        """,
-            (category_id, limit),
-        )
+            cursor.execute(BOOKS_BY_CATEGORY_SQL, (category_id, limit))
 
-        books = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return books
+            books = cursor.fetchall()
+            cursor.close()
+            catalog_cache.set(cache_key, books, generation=generation)
+            return books
 
     except Exception as e:
         print(f"❌ خطا در دریافت کتاب‌های دسته‌بندی: {e}")
@@ -122,103 +232,186 @@ def get_books_by_category(category_id, limit=10):
 
 def get_all_books(limit=20):
     """دریافت همه کتاب‌ها"""
+    cache_key = f"books:all:{limit}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            """
-            SELECT b.*, c.name as category_name
-            FROM books b
-            LEFT JOIN categories c ON b.category_id = c.category_id
-            WHERE b.is_active = TRUE
-            ORDER BY b.created_at DESC
-            LIMIT %s
-        """,
-            (limit,),
-        )
+            cursor.execute(ALL_BOOKS_SQL, (limit,))
 
-        books = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return books
+            books = cursor.fetchall()
+            cursor.close()
+            catalog_cache.set(cache_key, books, generation=generation)
+            return books
 
     except Exception as e:
         print(f"❌ خطا در دریافت همه کتاب‌ها: {e}")
         return []
 
 
+def count_active_books():
+    """تعداد کتاب‌های فعال (کش شده تا تغییر بعدی کتاب‌ها)"""
+    cache_key = "books:count"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(COUNT_ACTIVE_BOOKS_SQL)
+
+            total = cursor.fetchone()[0]
+            cursor.close()
+            catalog_cache.set(cache_key, total, generation=generation)
+            return total
+
+    except Exception as e:
+        print(f"❌ خطا در شمارش کتاب‌ها: {e}")
+        return 0
+
+
+def get_books_page(limit=5, after_id=None, before_id=None, offset=0):
+    """دریافت یک صفحه از کتاب‌ها با صفحه‌بندی keyset روی (created_at, book_id)
+
+    after_id: کتاب‌های بعد از این کتاب (صفحه بعد)
+    before_id: کتاب‌های قبل از این کتاب (صفحه قبل)
+    اگر هیچ‌کدام داده نشود یا کتاب مرجع حذف شده باشد، از offset استفاده می‌شود.
+    """
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            anchor_id = after_id if after_id is not None else before_id
+            anchor = None
+            if anchor_id is not None:
+                cursor.execute(BOOK_ANCHOR_SQL, (anchor_id,))
+                anchor = cursor.fetchone()
+
+            if anchor and after_id is not None:
+                cursor.execute(
+                    BOOKS_PAGE_AFTER_SQL,
+                    (anchor["created_at"], anchor["created_at"], anchor["book_id"], limit),
+                )
+                books = cursor.fetchall()
+            elif anchor:
+                cursor.execute(
+                    BOOKS_PAGE_BEFORE_SQL,
+                    (anchor["created_at"], anchor["created_at"], anchor["book_id"], limit),
+                )
+                books = list(reversed(cursor.fetchall()))
+            else:
+                cursor.execute(BOOKS_PAGE_OFFSET_SQL, (limit, max(offset, 0)))
+                books = cursor.fetchall()
+
+            cursor.close()
+            return books
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت صفحه کتاب‌ها: {e}")
+        return []
+
+
 def search_books(query, limit=10):
     """جستجوی کتاب در دیتابیس داخلی"""
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    # ایندکس داخل حافظه بدون رفتن به دیتابیس پاسخ می‌دهد
+    if use_memory_search():
+        return search_index.search(query, limit)
+
+    if _fulltext_state["available"]:
+        books = _search_books_fulltext(query, limit)
+        if books is not None:
+            return books
+
+    return _search_books_like(query, limit)
+
+
+def _fulltext_terms(query):
+    """ساخت عبارت BOOLEAN MODE: هر کلمه باید به صورت عبارت کامل در متن باشد"""
+    words = query.replace('"', " ").split()
+    # کلمه‌های کوتاه‌تر از ngram_token_size در ایندکس نیستند
+    words = [w for w in words if len(w) >= NGRAM_TOKEN_SIZE]
+    return " ".join(f'+"{w}"' for w in words)
+
+
+def _search_books_fulltext(query, limit=10):
+    """جستجوی رتبه‌بندی شده با ایندکس FULLTEXT؛ None یعنی باید از LIKE استفاده شود"""
+    terms = _fulltext_terms(query)
+    if not terms:
+        return None
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        search_query = f"%{query}%"
-        cursor.execute(
-            """
-            SELECT b.*, c.name as category_name
-            FROM books b
-            LEFT JOIN categories c ON b.category_id = c.category_id
-            WHERE b.is_active = TRUE 
-            AND (b.title LIKE %s OR b.author LIKE %s OR b.description LIKE %s)
-            ORDER BY b.title
-            LIMIT %s
-        """,
-            (search_query, search_query, search_query, limit),
-        )
+            cursor.execute(SEARCH_FULLTEXT_SQL, (query, terms, limit))
 
-        books = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return books
+            books = cursor.fetchall()
+            cursor.close()
+            return books
 
     except Exception as e:
-        print(f"❌ خطا در جستجوی کتاب: {e}")
-        return []
+        if getattr(e, "errno", None) in FULLTEXT_MISSING_ERRORS:
+            _fulltext_state["available"] = False
+            print(f"⚠️ ایندکس FULLTEXT در دسترس نیست، جستجو با LIKE انجام می‌شود: {e}")
+        else:
+            print(f"❌ خطا در جستجوی FULLTEXT: {e}")
+        return None
 
 
-#  ADMIN QUERIES  
-def is_admin(user_id):
-    """بررسی اینکه آیا کاربر ادمین است"""
+def _search_books_like(query, limit=10):
+    """جستجوی کتاب با LIKE (مسیر جایگزین وقتی ایندکس FULLTEXT در دسترس نیست)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            "SELECT 1 FROM admins WHERE user_id = %s",
-            (user_id,),
-        )
+            search_query = f"%{query}%"
+            cursor.execute(SEARCH_LIKE_SQL, (search_query, search_query, search_query, limit))
 
-        result = cursor.fetchone() is not None
-        cursor.close()
-        conn.close()
-        return result
+            books = cursor.fetchall()
+            cursor.close()
+            return books
 
     except Exception as e:
-        print(f"❌ خطا در بررسی ادمین: {e}")
-        return False
+        print(f"❌ خطا در جستجوی کتاب: {e}")
+        return []
+
+
+#  ADMIN QUERIES  
+def is_admin(user_id):
+    """بررسی اینکه آیا کاربر ادمین است (از کش ادمین‌ها)"""
+    return admin_cache.contains(user_id)
 
 
 def get_all_admins():
     """دریافت لیست همه ادمین‌ها"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(
+                """
+                SELECT a.*, u.phone
+                FROM admins a
+                LEFT JOIN users u ON a.user_id = u.user_id
+                ORDER BY a.added_at DESC
             """
-            SELECT a.*, u.phone
-            FROM admins a
-            LEFT JOIN users u ON a.user_id = u.user_id
-            ORDER BY a.added_at DESC
-        """
-        )
+            )
 
-        admins = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return admins
+            admins = cursor.fetchall()
+            cursor.close()
+            return admins
 
     except Exception as e:
         print(f"❌ خطا در دریافت ادمین‌ها: {e}")
@@ -226,65 +419,91 @@ def get_all_admins():
 
 
 #  CART QUERIES  
+def _fetch_cart_items(cursor, user_id):
+    """خواندن آیتم‌های سبد با cursor دیکشنری"""
+    cursor.execute(CART_ITEMS_SQL, (user_id,))
+
+    cart_items = []
+    for row in cursor.fetchall():
+        cart_items.append(
+            {
+                "book_id": row["book_id"],
+                "title": row["title"],
+                "author": row["author"],
+                "price": row["price"],
+                "count": row["quantity"],
+                "file_id": row["file_id"],
+                "cover_url": row["cover_url"],
+            }
+        )
+    return cart_items
+
+
+def cart_snapshot(cart_items):
+    """ساخت خروجی get_cart_snapshot از آیتم‌های سبد"""
+    return {
+        "items": cart_items,
+        "total": sum(item["price"] * item["count"] for item in cart_items),
+        "count": sum(item["count"] for item in cart_items),
+    }
+
+
 def get_user_cart(user_id):
     """دریافت سبد خرید کاربر"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        if use_cart_buffer():
+            return cart_buffer.snapshot(user_id)["items"]
 
-        cursor.execute(
-            """
-            SELECT ci.*, b.title, b.author, b.price, b.file_id, b.cover_url
-            FROM cart_items ci
-            JOIN books b ON ci.book_id = b.book_id
-            WHERE ci.user_id = %s
-        """,
-            (user_id,),
-        )
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cart_items = _fetch_cart_items(cursor, user_id)
+            cursor.close()
+            return cart_items
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت سبد خرید: {e}")
+        return []
 
-        cart_items = []
-        for row in cursor.fetchall():
-            cart_items.append(
-                {
-                    "book_id": row["book_id"],
-                    "title": row["title"],
-                    "author": row["author"],
-                    "price": row["price"],
-                    "count": row["quantity"],
-                    "file_id": row["file_id"],
-                    "cover_url": row["cover_url"],
-                }
-            )
 
-        cursor.close()
-        conn.close()
-        return cart_items
+def get_cart_snapshot(user_id):
+    """سبد خرید با یک کوئری: {"items": [...], "total": جمع کل, "count": تعداد کتاب‌ها}"""
+    try:
+        if use_cart_buffer():
+            return cart_buffer.snapshot(user_id)
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cart_items = _fetch_cart_items(cursor, user_id)
+            cursor.close()
+            return cart_snapshot(cart_items)
 
     except Exception as e:
         print(f"❌ خطا در دریافت سبد خرید: {e}")
-        return []
+        return cart_snapshot([])
 
 
 def get_cart_total(user_id):
     """محاسبه جمع کل سبد خرید"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT SUM(b.price * ci.quantity)
-            FROM cart_items ci
-            JOIN books b ON ci.book_id = b.book_id
-            WHERE ci.user_id = %s
-        """,
-            (user_id,),
-        )
+        if use_cart_buffer():
+            return cart_buffer.snapshot(user_id)["total"]
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT SUM(b.price * ci.quantity)
+                FROM cart_items ci
+                JOIN books b ON ci.book_id = b.book_id
+                WHERE ci.user_id = %s
+            """,
+                (user_id,),
+            )
 
-        total = cursor.fetchone()[0] or 0
-        cursor.close()
-        conn.close()
-        return total
+            total = cursor.fetchone()[0] or 0
+            cursor.close()
+            return total
 
     except Exception as e:
         print(f"❌ خطا در محاسبه جمع کل: {e}")
@@ -295,23 +514,67 @@ def get_cart_total(user_id):
 def get_pending_orders():
     """دریافت سفارشات در انتظار تایید"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(
+                """
+                SELECT o.*, u.phone, u.address, u.postal_code
+                FROM orders o
+                LEFT JOIN users u ON o.user_id = u.user_id
+                WHERE o.status = 'pending'
+                ORDER BY o.created_at DESC
             """
-            SELECT o.*, u.phone, u.address, u.postal_code
-            FROM orders o
-            LEFT JOIN users u ON o.user_id = u.user_id
-            WHERE o.status = 'pending'
-            ORDER BY o.created_at DESC
-        """
-        )
+            )
 
-        orders = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return orders
+            orders = cursor.fetchall()
+            cursor.close()
+            return orders
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت سفارشات: {e}")
+        return []
+
+
+def count_pending_orders():
+    """تعداد سفارشات در انتظار تایید"""
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(COUNT_PENDING_ORDERS_SQL)
+
+            total = cursor.fetchone()[0]
+            cursor.close()
+            return total
+
+    except Exception as e:
+        print(f"❌ خطا در شمارش سفارشات: {e}")
+        return 0
+
+
+def get_pending_orders_with_items(limit=10, offset=0):
+    """یک صفحه از سفارشات در انتظار همراه با آیتم‌هایشان (order["items"]) با دو کوئری"""
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(PENDING_ORDERS_PAGE_SQL, (limit, max(offset, 0)))
+            orders = cursor.fetchall()
+
+            if orders:
+                order_ids = [order["order_id"] for order in orders]
+                placeholders = ", ".join(["%s"] * len(order_ids))
+                cursor.execute(ORDER_ITEMS_FOR_ORDERS_SQL.format(placeholders=placeholders), order_ids)
+
+                items_by_order = {order_id: [] for order_id in order_ids}
+                for item in cursor.fetchall():
+                    items_by_order[item["order_id"]].append(item)
+                for order in orders:
+                    order["items"] = items_by_order[order["order_id"]]
+
+            cursor.close()
+            return orders
 
     except Exception as e:
         print(f"❌ خطا در دریافت سفارشات: {e}")
@@ -321,15 +584,14 @@ def get_pending_orders():
 def get_order_items(order_id):
     """دریافت آیتم‌های یک سفارش"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order_id,))
-        items = cursor.fetchall()
+            cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order_id,))
+            items = cursor.fetchall()
 
-        cursor.close()
-        conn.close()
-        return items
+            cursor.close()
+            return items
 
     except Exception as e:
         print(f"❌ خطا در دریافت آیتم‌های سفارش: {e}")
@@ -339,22 +601,14 @@ def get_order_items(order_id):
 def get_user_orders(user_id):
     """دریافت سفارشات کاربر"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor.execute(
-            """
-            SELECT * FROM orders 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC
-        """,
-            (user_id,),
-        )
+            cursor.execute(USER_ORDERS_SQL, (user_id,))
 
-        orders = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return orders
+            orders = cursor.fetchall()
+            cursor.close()
+            return orders
 
     except Exception as e:
         print(f"❌ خطا در دریافت سفارشات کاربر: {e}")
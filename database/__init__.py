@@ -1,5 +1,7 @@
-from .connection import get_db_connection
-from .DDL import create_tables
+from .connection import get_db_connection, pooled_connection, transaction, get_pool_stats
+from .cache import get_cache_stats
+from .DDL import create_tables, ensure_schema, SCHEMA_VERSION
+from .search_index import SEARCH_ENGINE, build_search_index
 from .DML import (
     save_user,
     save_book,
@@ -15,7 +17,10 @@ from .DML import (
     update_order_status,
     add_to_cart,
     update_cart_quantity,
+    change_cart_quantity,
     clear_user_cart,
+    checkout_order,
+    OutOfStockError,
 )
 from .DQL import (
     get_user,
@@ -24,19 +29,43 @@ from .DQL import (
     get_category_by_id,     
     get_books_by_category,  
     get_all_books,          
+    count_active_books,
+    get_books_page,
     search_books,           
     is_admin,               
     get_all_admins,         
     get_pending_orders,
+    count_pending_orders,
+    get_pending_orders_with_items,
     get_order_items,
     get_user_orders,
     get_user_cart,
     get_cart_total,
+    get_cart_snapshot,
 )
 
+from .cart_buffer import CART_WRITE_BEHIND, close_cart_buffer, get_cart_buffer_stats
+from .admin_cache import load_admins, get_admin_cache_stats
+from .instrumentation import update_scope, get_query_stats
+
 __all__ = [
     "get_db_connection",
+    "pooled_connection",
+    "transaction",
+    "get_pool_stats",
+    "get_cache_stats",
+    "CART_WRITE_BEHIND",
+    "close_cart_buffer",
+    "get_cart_buffer_stats",
+    "load_admins",
+    "get_admin_cache_stats",
+    "update_scope",
+    "get_query_stats",
     "create_tables",
+    "ensure_schema",
+    "SCHEMA_VERSION",
+    "SEARCH_ENGINE",
+    "build_search_index",
     "save_user",
     "save_book",
     "add_book_full",     
@@ -51,19 +80,27 @@ __all__ = [
     "update_order_status",
     "add_to_cart",
     "update_cart_quantity",
+    "change_cart_quantity",
     "clear_user_cart",
+    "checkout_order",
+    "OutOfStockError",
     "get_user",
     "get_book",
     "get_all_categories",    
     "get_category_by_id",    
     "get_books_by_category", 
     "get_all_books",         
+    "count_active_books",
+    "get_books_page",
     "search_books",         
     "is_admin",              
     "get_all_admins",       
     "get_pending_orders",
+    "count_pending_orders",
+    "get_pending_orders_with_items",
     "get_order_items",
     "get_user_orders",
     "get_user_cart",
     "get_cart_total",
+    "get_cart_snapshot",
 ]
\ No newline at end of file
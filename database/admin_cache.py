@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+from .connection import pooled_connection
+
+# مدت اعتبار لیست ادمین‌ها در حافظه (ثانیه)
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "60"))
+# فاصله تلاش دوباره بعد از خطای دیتابیس
+ADMIN_CACHE_RETRY = 5.0
+
+ADMIN_IDS_SQL = "SELECT user_id FROM admins"
+
+
+class AdminCache:
+    """لیست شناسه ادمین‌ها در حافظه با TTL
+
+    کل جدول admins (چند ردیف) یک‌جا خوانده می‌شود و بررسی دسترسی بدون
+    دیتابیس انجام می‌شود. add_admin و remove_admin کش را باطل می‌کنند.
+    اگر خواندن دوباره ناموفق باشد، لیست قبلی تا بارگذاری بعدی استفاده می‌شود.
+    هر invalidate شماره نسل را بالا می‌برد و نتیجه خواندنی که قبل از آن شروع
+    شده (و ممکن است تغییر را نبیند) دور ریخته می‌شود.
+    """
+
+    def __init__(self, ttl=ADMIN_CACHE_TTL):
+        self.ttl = ttl
+        self._admins = None  # frozenset شناسه‌ها؛ None یعنی هنوز خوانده نشده
+        self._expires_at = 0.0
+        self._generation = 0
+        self._loaded_generation = 0  # نسلی که لیست فعلی در آن خوانده شده
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stats = {
+            "checks": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "discarded_loads": 0,
+            "invalidations": 0,
+        }
+
+    def expired(self):
+        """آیا وقت خواندن دوباره لیست رسیده است"""
+        return time.monotonic() >= self._expires_at
+
+    def generation(self):
+        """شماره نسل فعلی؛ قبل از شروع خواندن جدول گرفته و به set داده می‌شود"""
+        with self._lock:
+            return self._generation
+
+    def set(self, user_ids, generation=None):
+        """جایگزینی لیست ادمین‌ها (مثلاً بعد از خواندن از نسخه async)
+
+        اگر generation داده شود و از آن زمان invalidate شده باشد، لیست کنار
+        گذاشته می‌شود و False برمی‌گردد (کش منقضی می‌ماند تا دوباره خوانده شود).
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["discarded_loads"] += 1
+                return False
+            self._admins = frozenset(user_ids)
+            self._loaded_generation = self._generation
+            self._expires_at = time.monotonic() + self.ttl
+            self._stats["loads"] += 1
+            return True
+
+    def load(self):
+        """خواندن جدول admins؛ False اگر دیتابیس در دسترس نباشد"""
+        generation = self.generation()
+        try:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(ADMIN_IDS_SQL)
+                user_ids = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+
+        except Exception as e:
+            print(f"❌ خطا در بارگذاری ادمین‌ها: {e}")
+            self.load_failed()
+            return False
+
+        self.set(user_ids, generation)
+        return True
+
+    def load_failed(self):
+        """بعد از خطای دیتابیس لیست قبلی نگه داشته می‌شود، مگر اینکه بعد از آن invalidate شده باشد
+
+        لیستی که از تغییر جدول admins (مثلاً remove_admin) قدیمی‌تر است کنار
+        گذاشته می‌شود تا قطعی دیتابیس دسترسی حذف‌شده را برنگرداند.
+        """
+        with self._lock:
+            self._stats["load_errors"] += 1
+            if self._generation != self._loaded_generation:
+                self._admins = None
+            # تا چند ثانیه دوباره تلاش نشود تا هر کلیک منتظر دیتابیس قطع نماند
+            self._expires_at = time.monotonic() + min(self.ttl, ADMIN_CACHE_RETRY)
+
+    def contains(self, user_id, reload=True):
+        """بررسی ادمین بودن از حافظه؛ در صورت انقضا لیست دوباره خوانده می‌شود"""
+        if reload and self.expired():
+            with self._load_lock:
+                # ممکن است thread دیگری همین الان لیست را خوانده باشد
+                if self.expired():
+                    self.load()
+
+        with self._lock:
+            self._stats["checks"] += 1
+            return self._admins is not None and user_id in self._admins
+
+    def invalidate(self):
+        """باطل کردن لیست بعد از تغییر جدول admins"""
+        with self._lock:
+            self._generation += 1
+            self._expires_at = 0.0
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        """آمار کش ادمین‌ها"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["admins"] = len(self._admins) if self._admins is not None else None
+        stats["ttl"] = self.ttl
+        return stats
+
+
+admin_cache = AdminCache()
+
+
+def load_admins():
+    """بارگذاری لیست ادمین‌ها هنگام شروع ربات"""
+    return admin_cache.load()
+
+
+def get_admin_cache_stats():
+    """آمار کش ادمین‌ها"""
+    return admin_cache.stats()
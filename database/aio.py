@@ -0,0 +1,541 @@
+# لایه async دیتابیس برای async_main.py (روی aiomysql)
+# فقط مسیرهای پرتکرار (مرور کاتالوگ، سبد خرید، سفارشات کاربر) نسخه async دارند؛
+# کش کاتالوگ با نسخه sync مشترک است، پس invalidation نوشتن‌های پنل ادمین اینجا هم اثر دارد
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+
+from config import DB_CONFIG
+from .connection import DB_POOL_SIZE, DB_POOL_TIMEOUT
+from .cache import catalog_cache
+from .DQL import (
+    FULLTEXT_MISSING_ERRORS, _fulltext_state, _fulltext_terms, cart_snapshot,
+    BOOK_BY_ID_SQL, BOOKS_BY_CATEGORY_SQL, COUNT_ACTIVE_BOOKS_SQL, BOOK_ANCHOR_SQL,
+    BOOKS_PAGE_AFTER_SQL, BOOKS_PAGE_BEFORE_SQL, BOOKS_PAGE_OFFSET_SQL,
+    SEARCH_FULLTEXT_SQL, SEARCH_LIKE_SQL, CART_ITEMS_SQL, USER_ORDERS_SQL,
+)
+from .search_index import search_index, use_memory_search
+from .cart_buffer import cart_buffer, use_cart_buffer
+from .admin_cache import ADMIN_IDS_SQL, admin_cache
+from .instrumentation import DB_INSTRUMENTATION, record_checkout, record_query
+
+# کلیدهای DB_CONFIG که aiomysql می‌شناسد
+_CONFIG_KEYS = ("host", "port", "user", "password", "charset")
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def init_pool(minsize=1, maxsize=DB_POOL_SIZE):
+    """ساخت pool اتصال‌های async (یک بار هنگام راه‌اندازی)"""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await _create_pool(minsize, maxsize)
+    return _pool
+
+
+async def _create_pool(minsize, maxsize):
+    config = {key: DB_CONFIG[key] for key in _CONFIG_KEYS if key in DB_CONFIG}
+    if "port" in config:
+        config["port"] = int(config["port"])
+    config.setdefault("charset", "utf8mb4")
+
+    pool = await aiomysql.create_pool(
+        minsize=minsize,
+        maxsize=maxsize,
+        db=DB_CONFIG.get("database"),
+        autocommit=True,
+        connect_timeout=10,
+        pool_recycle=3600,
+        **config,
+    )
+    print(f"✅ pool اتصال async دیتابیس ساخته شد (حداکثر {maxsize} اتصال)")
+    return pool
+
+
+async def close_pool():
+    """بستن pool هنگام خاموش شدن"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+class _InstrumentedCursor:
+    """cursor async با ثبت زمان هر دستور (cursor های aiomysql بافر شده‌اند)"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.execute(sql, params)
+        finally:
+            record_query(sql, time.perf_counter() - started, self._cursor.rowcount)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _InstrumentedCursorContext:
+    def __init__(self, context):
+        self._context = context
+
+    async def __aenter__(self):
+        return _InstrumentedCursor(await self._context.__aenter__())
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+
+class _InstrumentedConnection:
+    """اتصال aiomysql با cursor های ثبت‌کننده (مثل instrument در نسخه sync)"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _InstrumentedCursorContext(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@asynccontextmanager
+async def acquire():
+    """گرفتن اتصال از pool؛ مثل pooled_connection با محدودیت زمان انتظار"""
+    if _pool is None:
+        await init_pool()
+    started = time.monotonic()
+    conn = await asyncio.wait_for(_pool.acquire(), timeout=DB_POOL_TIMEOUT)
+    record_checkout(time.monotonic() - started)
+    try:
+        yield _InstrumentedConnection(conn) if DB_INSTRUMENTATION else conn
+    finally:
+        _pool.release(conn)
+
+
+async def _fetchall(sql, params=(), dictionary=True):
+    async with acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cursor:
+            await cursor.execute(sql, params)
+            return list(await cursor.fetchall())
+
+
+async def _fetchone(sql, params=(), dictionary=True):
+    async with acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchone()
+
+
+async def _execute(sql, params=()):
+    async with acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+#  USER
+async def save_user(user_id, phone=None, address=None, postal_code=None):
+    """ذخیره کاربر - مطابق جدول users"""
+    try:
+        await _execute(
+            """
+            INSERT INTO users (user_id, phone, address, postal_code)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            phone = VALUES(phone),
+            address = VALUES(address),
+            postal_code = VALUES(postal_code)
+        """,
+            (user_id, phone, address, postal_code),
+        )
+        return True
+
+    except Exception as e:
+        print(f"❌ خطا در ذخیره کاربر: {e}")
+        return False
+
+
+async def is_admin(user_id):
+    """بررسی اینکه آیا کاربر ادمین است (از کش ادمین‌ها، مشترک با نسخه sync)"""
+    if admin_cache.expired():
+        generation = admin_cache.generation()
+        try:
+            rows = await _fetchall(ADMIN_IDS_SQL, dictionary=False)
+            admin_cache.set((row[0] for row in rows), generation)
+
+        except Exception as e:
+            print(f"❌ خطا در بارگذاری ادمین‌ها: {e}")
+            admin_cache.load_failed()
+
+    return admin_cache.contains(user_id, reload=False)
+
+
+#  CATALOG
+async def get_all_categories():
+    """دریافت همه دسته‌بندی‌ها"""
+    cache_key = "categories"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
+    try:
+        categories = await _fetchall(
+            """
+            SELECT category_id, name
+            FROM categories
+            ORDER BY name
+        """
+        )
+        catalog_cache.set(cache_key, categories, generation=generation)
+        return categories
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت دسته‌بندی‌ها: {e}")
+        return []
+
+
+async def get_book(book_id):
+    """دریافت اطلاعات کتاب با ID"""
+    cache_key = f"book:{book_id}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
+    try:
+        book = await _fetchone(BOOK_BY_ID_SQL, (book_id,))
+        if book:
+            catalog_cache.set(cache_key, book, generation=generation)
+        return book
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت کتاب: {e}")
+        return None
+
+
+async def get_books_by_category(category_id, limit=10):
+    """دریافت کتاب‌های یک دسته‌بندی"""
+    cache_key = f"books:category:{category_id}:{limit}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
+    try:
+        books = await _fetchall(BOOKS_BY_CATEGORY_SQL, (category_id, limit))
+        catalog_cache.set(cache_key, books, generation=generation)
+        return books
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت کتاب‌های دسته‌بندی: {e}")
+        return []
+
+
+async def count_active_books():
+    """تعداد کتاب‌های فعال (کش شده تا تغییر بعدی کتاب‌ها)"""
+    cache_key = "books:count"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = catalog_cache.generation()
+
+    try:
+        row = await _fetchone(COUNT_ACTIVE_BOOKS_SQL, dictionary=False)
+        total = row[0]
+        catalog_cache.set(cache_key, total, generation=generation)
+        return total
+
+    except Exception as e:
+        print(f"❌ خطا در شمارش کتاب‌ها: {e}")
+        return 0
+
+
+async def get_books_page(limit=5, after_id=None, before_id=None, offset=0):
+    """دریافت یک صفحه از کتاب‌ها با صفحه‌بندی keyset (مثل DQL.get_books_page)"""
+    try:
+        async with acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                anchor_id = after_id if after_id is not None else before_id
+                anchor = None
+                if anchor_id is not None:
+                    await cursor.execute(BOOK_ANCHOR_SQL, (anchor_id,))
+                    anchor = await cursor.fetchone()
+
+                if anchor and after_id is not None:
+                    await cursor.execute(
+                        BOOKS_PAGE_AFTER_SQL,
+                        (anchor["created_at"], anchor["created_at"], anchor["book_id"], limit),
+                    )
+                    return list(await cursor.fetchall())
+
+                if anchor:
+                    await cursor.execute(
+                        BOOKS_PAGE_BEFORE_SQL,
+                        (anchor["created_at"], anchor["created_at"], anchor["book_id"], limit),
+                    )
+                    return list(reversed(await cursor.fetchall()))
+
+                await cursor.execute(BOOKS_PAGE_OFFSET_SQL, (limit, max(offset, 0)))
+                return list(await cursor.fetchall())
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت صفحه کتاب‌ها: {e}")
+        return []
+
+
+async def search_books(query, limit=10):
+    """جستجوی کتاب (ایندکس حافظه، FULLTEXT یا LIKE مثل نسخه sync)"""
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    if use_memory_search():
+        return search_index.search(query, limit)
+
+    terms = _fulltext_terms(query)
+    if terms and _fulltext_state["available"]:
+        try:
+            return await _fetchall(SEARCH_FULLTEXT_SQL, (query, terms, limit))
+        except Exception as e:
+            errno = e.args[0] if e.args and isinstance(e.args[0], int) else None
+            if errno in FULLTEXT_MISSING_ERRORS:
+                _fulltext_state["available"] = False
+                print(f"⚠️ ایندکس FULLTEXT در دسترس نیست، جستجو با LIKE انجام می‌شود: {e}")
+            else:
+                print(f"❌ خطا در جستجوی FULLTEXT: {e}")
+
+    try:
+        search_query = f"%{query}%"
+        return await _fetchall(SEARCH_LIKE_SQL, (search_query, search_query, search_query, limit))
+
+    except Exception as e:
+        print(f"❌ خطا در جستجوی کتاب: {e}")
+        return []
+
+
+#  CART
+async def _fetch_cart_items(cursor, user_id):
+    """خواندن آیتم‌های سبد با DictCursor"""
+    await cursor.execute(CART_ITEMS_SQL, (user_id,))
+    return [
+        {
+            "book_id": row["book_id"],
+            "title": row["title"],
+            "author": row["author"],
+            "price": row["price"],
+            "count": row["quantity"],
+            "file_id": row["file_id"],
+            "cover_url": row["cover_url"],
+        }
+        for row in await cursor.fetchall()
+    ]
+
+
+async def get_user_cart(user_id):
+    """دریافت سبد خرید کاربر"""
+    try:
+        if use_cart_buffer():
+            # بافر سبد بین نسخه sync و async مشترک است
+            return (await asyncio.to_thread(cart_buffer.snapshot, user_id))["items"]
+
+        async with acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                return await _fetch_cart_items(cursor, user_id)
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت سبد خرید: {e}")
+        return []
+
+
+async def get_cart_snapshot(user_id):
+    """سبد خرید با یک کوئری: {"items": [...], "total": جمع کل, "count": تعداد کتاب‌ها}"""
+    return cart_snapshot(await get_user_cart(user_id))
+
+
+async def get_cart_total(user_id):
+    """محاسبه جمع کل سبد خرید"""
+    try:
+        if use_cart_buffer():
+            return (await asyncio.to_thread(cart_buffer.snapshot, user_id))["total"]
+
+        row = await _fetchone(
+            """
+            SELECT SUM(b.price * ci.quantity)
+            FROM cart_items ci
+            JOIN books b ON ci.book_id = b.book_id
+            WHERE ci.user_id = %s
+        """,
+            (user_id,),
+            dictionary=False,
+        )
+        return row[0] or 0
+
+    except Exception as e:
+        print(f"❌ خطا در محاسبه جمع کل: {e}")
+        return 0
+
+
+async def add_to_cart(user_id, book_id, quantity=1):
+    """افزودن کتاب به سبد خرید"""
+    try:
+        if use_cart_buffer():
+            return await asyncio.to_thread(cart_buffer.add, user_id, book_id, quantity)
+
+        async with acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT b.stock, COALESCE(ci.quantity, 0)
+                    FROM books b
+                    LEFT JOIN cart_items ci ON ci.book_id = b.book_id AND ci.user_id = %s
+                    WHERE b.book_id = %s AND b.is_active = TRUE
+                """,
+                    (user_id, book_id),
+                )
+                book = await cursor.fetchone()
+                if not book:
+                    return False
+
+                stock, in_cart = book
+                if stock is not None and in_cart + quantity > stock:
+                    return False
+
+                await cursor.execute(
+                    """
+                    INSERT INTO cart_items (user_id, book_id, quantity)
+                    VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                    quantity = quantity + VALUES(quantity)
+                """,
+                    (user_id, book_id, quantity),
+                )
+                return True
+
+    except Exception as e:
+        print(f"❌ خطا در افزودن به سبد: {e}")
+        return False
+
+
+async def update_cart_quantity(user_id, book_id, change):
+    """آپدیت تعداد کتاب در سبد"""
+    try:
+        if use_cart_buffer():
+            return (await asyncio.to_thread(cart_buffer.change, user_id, book_id, change))[0]
+
+        if change == 0:
+            await _execute(
+                "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s",
+                (user_id, book_id),
+            )
+        elif change > 0:
+            # افزایش فقط تا سقف موجودی کتاب
+            rowcount = await _execute(
+                """
+                UPDATE cart_items ci
+                JOIN books b ON ci.book_id = b.book_id
+                SET ci.quantity = ci.quantity + %s
+                WHERE ci.user_id = %s AND ci.book_id = %s
+                AND (b.stock IS NULL OR ci.quantity + %s <= b.stock)
+            """,
+                (change, user_id, book_id, change),
+            )
+            if rowcount == 0:
+                return False
+        else:
+            await _execute(
+                """
+                UPDATE cart_items
+                SET quantity = quantity + %s
+                WHERE user_id = %s AND book_id = %s
+            """,
+                (change, user_id, book_id),
+            )
+        return True
+
+    except Exception as e:
+        print(f"❌ خطا در آپدیت سبد: {e}")
+        return False
+
+
+async def change_cart_quantity(user_id, book_id, change):
+    """تغییر تعداد کتاب در سبد و برگرداندن سبد جدید روی همان اتصال (مثل نسخه sync)"""
+    try:
+        if use_cart_buffer():
+            return await asyncio.to_thread(cart_buffer.change, user_id, book_id, change)
+
+        async with acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                updated = True
+
+                if change == 0:
+                    await cursor.execute(
+                        "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s",
+                        (user_id, book_id),
+                    )
+                elif change > 0:
+                    # افزایش فقط تا سقف موجودی کتاب
+                    await cursor.execute(
+                        """
+                        UPDATE cart_items ci
+                        JOIN books b ON ci.book_id = b.book_id
+                        SET ci.quantity = ci.quantity + %s
+                        WHERE ci.user_id = %s AND ci.book_id = %s
+                        AND (b.stock IS NULL OR ci.quantity + %s <= b.stock)
+                    """,
+                        (change, user_id, book_id, change),
+                    )
+                    updated = cursor.rowcount > 0
+                else:
+                    await cursor.execute(
+                        """
+                        UPDATE cart_items
+                        SET quantity = quantity + %s
+                        WHERE user_id = %s AND book_id = %s
+                    """,
+                        (change, user_id, book_id),
+                    )
+                    await cursor.execute(
+                        "DELETE FROM cart_items WHERE user_id = %s AND book_id = %s AND quantity <= 0",
+                        (user_id, book_id),
+                    )
+
+                return updated, cart_snapshot(await _fetch_cart_items(cursor, user_id))
+
+    except Exception as e:
+        print(f"❌ خطا در آپدیت سبد: {e}")
+        return False, None
+
+
+async def clear_user_cart(user_id):
+    """پاک کردن سبد خرید کاربر"""
+    try:
+        if use_cart_buffer():
+            return await asyncio.to_thread(cart_buffer.clear, user_id)
+
+        await _execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+        return True
+
+    except Exception as e:
+        print(f"❌ خطا در پاک کردن سبد: {e}")
+        return False
+
+
+#  ORDERS
+async def get_user_orders(user_id):
+    """دریافت سفارشات کاربر"""
+    try:
+        return await _fetchall(USER_ORDERS_SQL, (user_id,))
+
+    except Exception as e:
+        print(f"❌ خطا در دریافت سفارشات کاربر: {e}")
+        return []
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# تنظیمات کش کاتالوگ
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1000"))
+
+
+def _copy(value):
+    """کپی سطحی dict یا لیست ردیف‌ها تا تغییر خروجی روی مقدار کش‌شده اثر نگذارد"""
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class TTLCache:
+    """کش LRU با اندازه محدود و TTL برای هر کلید
+
+    get و set کپی ردیف‌ها را برمی‌گردانند/نگه می‌دارند، پس caller می‌تواند
+    خروجی را تغییر دهد بدون اینکه کش یا caller های دیگر ببینند.
+    هر invalidate شماره نسل را بالا می‌برد؛ مقداری که خواندنش از دیتابیس قبل
+    از آن شروع شده (generation قدیمی) ذخیره نمی‌شود تا ردیف کهنه تا پایان TTL نماند.
+    """
+
+    def __init__(self, max_size=CATALOG_CACHE_SIZE, default_ttl=CATALOG_CACHE_TTL):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "discarded_sets": 0,
+        }
+
+    def generation(self):
+        """شماره نسل فعلی؛ قبل از کوئری گرفته و به set داده می‌شود"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """خواندن از کش؛ در صورت نبود یا انقضا None برمی‌گرداند"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+        return _copy(value)
+
+    def set(self, key, value, ttl=None, generation=None):
+        """نوشتن در کش با TTL دلخواه؛ False اگر از generation داده‌شده invalidate شده باشد"""
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        value = _copy(value)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["discarded_sets"] += 1
+                return False
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+        return True
+
+    def invalidate(self, key):
+        """حذف یک کلید"""
+        with self._lock:
+            # حتی اگر کلید نباشد: ممکن است خواندنی در حال انجام باشد
+            self._generation += 1
+            if self._data.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def invalidate_prefix(self, prefix):
+        """حذف همه کلیدهایی که با prefix شروع می‌شوند"""
+        with self._lock:
+            self._generation += 1
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                del self._data[k]
+            self._stats["invalidations"] += len(keys)
+
+    def clear(self):
+        """خالی کردن کامل کش"""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        """آمار کش برای تنظیم TTL و اندازه"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+        stats["max_size"] = self.max_size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+catalog_cache = TTLCache()
+
+
+#  INVALIDATION HOOKS
+def invalidate_book(book_id=None):
+    """بعد از تغییر کتاب‌ها: جزئیات کتاب و همه لیست‌های کتاب"""
+    if book_id is None:
+        catalog_cache.invalidate_prefix("book:")
+    else:
+        catalog_cache.invalidate(f"book:{book_id}")
+    catalog_cache.invalidate_prefix("books:")
+
+
+def invalidate_book_details(book_ids):
+    """فقط جزئیات کتاب‌ها (مثلاً بعد از تغییر موجودی)؛ لیست‌ها موجودی نشان نمی‌دهند"""
+    for book_id in book_ids:
+        catalog_cache.invalidate(f"book:{book_id}")
+
+
+def invalidate_categories():
+    """بعد از تغییر دسته‌بندی‌ها: نام دسته در جزئیات کتاب هم کش شده است"""
+    catalog_cache.invalidate_prefix("categories")
+    invalidate_book()
+
+
+def get_cache_stats():
+    """آمار کش کاتالوگ"""
+    return catalog_cache.stats()
@@ -0,0 +1,318 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import mysql.connector
+
+from .connection import pooled_connection, transaction
+from . import DQL
+
+# سبد خرید write-behind: تغییرات سبد در حافظه جمع و دسته‌ای در cart_items نوشته می‌شوند
+CART_WRITE_BEHIND = os.getenv("CART_WRITE_BEHIND", "0") == "1"
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "2"))
+CART_FLUSH_BATCH = int(os.getenv("CART_FLUSH_BATCH", "500"))
+CART_BUFFER_MAX_USERS = int(os.getenv("CART_BUFFER_MAX_USERS", "5000"))
+CART_BUFFER_IDLE = float(os.getenv("CART_BUFFER_IDLE", "600"))
+
+
+class CartBuffer:
+    """سبد کاربران فعال در حافظه با نوشتن دسته‌ای در دیتابیس
+
+    سبد هر کاربر بار اول کامل از cart_items خوانده می‌شود و بعد از آن
+    خواندن و تغییرش بدون دیتابیس انجام می‌شود. در حافظه فقط تعداد هر کتاب
+    نگه داشته می‌شود و عنوان و قیمت هنگام ساخت snapshot از get_book (کش
+    کاتالوگ) خوانده می‌شوند تا بعد از update_book کهنه نمانند. برای هر
+    (کاربر، کتاب) فقط آخرین تعداد نگه داشته می‌شود (۰ یعنی حذف)، پس چند
+    کلیک پشت سر هم یک نوشتن می‌شوند. flush با یک INSERT ... ON DUPLICATE KEY UPDATE چندردیفی
+    و یک DELETE انجام می‌شود: هر چند ثانیه، قبل از ثبت سفارش و هنگام خروج.
+    """
+
+    def __init__(self, interval=CART_FLUSH_INTERVAL, batch_size=CART_FLUSH_BATCH,
+                 max_users=CART_BUFFER_MAX_USERS, idle_after=CART_BUFFER_IDLE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_users = max_users
+        self.idle_after = idle_after
+        self._carts = OrderedDict()  # user_id -> {"items": OrderedDict(book_id -> تعداد), "touched": زمان}
+        self._dirty = {}  # (user_id, book_id) -> آخرین تعداد؛ ۰ یعنی حذف
+        self._flushing = {}  # تغییراتی که در حال نوشتن هستند
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {
+            "hits": 0,
+            "loads": 0,
+            "changes": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_dropped": 0,
+            "flush_errors": 0,
+            "evictions": 0,
+        }
+        # تغییرات باقی‌مانده هنگام خروج نوشته می‌شوند (thread flush از نوع daemon است)
+        atexit.register(self.close)
+
+    #  READ / WRITE
+    def _load(self, user_id):
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            items = DQL._fetch_cart_items(cursor, user_id)
+            cursor.close()
+
+        with self._lock:
+            if user_id not in self._carts:
+                self._carts[user_id] = {
+                    "items": OrderedDict((item["book_id"], item["count"]) for item in items),
+                    "touched": time.monotonic(),
+                }
+                self._stats["loads"] += 1
+                self._evict()
+
+    def _apply(self, user_id, func):
+        """اجرای func روی سبد حافظه‌ای کاربر زیر قفل؛ در صورت نبود، سبد از دیتابیس خوانده می‌شود"""
+        while True:
+            with self._lock:
+                entry = self._carts.get(user_id)
+                if entry is not None:
+                    self._carts.move_to_end(user_id)
+                    entry["touched"] = time.monotonic()
+                    self._stats["hits"] += 1
+                    return func(entry["items"])
+            self._load(user_id)
+
+    def _mark(self, user_id, book_id, quantity):
+        key = (user_id, book_id)
+        if key in self._dirty:
+            self._stats["coalesced"] += 1
+        self._dirty[key] = quantity
+        self._stats["changes"] += 1
+        self._start()
+
+    @staticmethod
+    def _counts(items):
+        return list(items.items())
+
+    @staticmethod
+    def _snapshot(counts):
+        """ساخت snapshot از (book_id، تعداد) با اطلاعات فعلی کتاب‌ها؛ بیرون از قفل صدا زده می‌شود"""
+        cart_items = []
+        for book_id, count in counts:
+            book = DQL.get_book(book_id)
+            if not book:
+                continue
+            cart_items.append(
+                {
+                    "book_id": book_id,
+                    "title": book["title"],
+                    "author": book["author"],
+                    "price": book["price"],
+                    "count": count,
+                    "file_id": book.get("file_id"),
+                    "cover_url": book.get("cover_url"),
+                }
+            )
+        return DQL.cart_snapshot(cart_items)
+
+    def snapshot(self, user_id):
+        """سبد کاربر به شکل خروجی get_cart_snapshot"""
+        return self._snapshot(self._apply(user_id, self._counts))
+
+    def add(self, user_id, book_id, quantity=1):
+        """مثل add_to_cart؛ موجودی از کش کاتالوگ خوانده می‌شود"""
+        book = DQL.get_book(book_id)
+        if not book or not book.get("is_active", True):
+            return False
+
+        def apply(items):
+            in_cart = items.get(book_id, 0)
+            # رزرو واقعی موجودی هنگام ثبت سفارش انجام می‌شود
+            if book.get("stock") is not None and in_cart + quantity > book["stock"]:
+                return False
+            items[book_id] = in_cart + quantity
+            self._mark(user_id, book_id, items[book_id])
+            return True
+
+        return self._apply(user_id, apply)
+
+    def change(self, user_id, book_id, change):
+        """مثل change_cart_quantity: خروجی (انجام شد؟، snapshot سبد)"""
+        book = DQL.get_book(book_id) if change > 0 else None
+
+        def apply(items):
+            count = items.get(book_id)
+            updated = True
+            if count is None:
+                updated = change <= 0
+            elif change > 0 and book and book.get("stock") is not None \
+                    and count + change > book["stock"]:
+                updated = False
+            elif change == 0 or count + change <= 0:
+                del items[book_id]
+                self._mark(user_id, book_id, 0)
+            else:
+                items[book_id] = count + change
+                self._mark(user_id, book_id, items[book_id])
+            return updated, self._counts(items)
+
+        updated, counts = self._apply(user_id, apply)
+        return updated, self._snapshot(counts)
+
+    def clear(self, user_id):
+        """خالی کردن سبد کاربر"""
+        def apply(items):
+            for book_id in items:
+                self._mark(user_id, book_id, 0)
+            items.clear()
+            return True
+
+        return self._apply(user_id, apply)
+
+    def forget(self, user_id):
+        """کنار گذاشتن سبد حافظه‌ای کاربر (مثلاً بعد از ثبت سفارش که سبد در دیتابیس خالی شده)"""
+        with self._lock:
+            self._carts.pop(user_id, None)
+            for key in [key for key in self._dirty if key[0] == user_id]:
+                del self._dirty[key]
+
+    def drop_book(self, book_id):
+        """حذف کتاب پاک‌شده از همه سبدهای حافظه"""
+        with self._lock:
+            for entry in self._carts.values():
+                entry["items"].pop(book_id, None)
+            for key in [key for key in self._dirty if key[1] == book_id]:
+                del self._dirty[key]
+
+    #  FLUSH
+    def flush(self, user_id=None):
+        """نوشتن تغییرات در دیتابیس (همه یا فقط یک کاربر)؛ False اگر نوشتن ناموفق باشد"""
+        with self._flush_lock:
+            with self._lock:
+                if user_id is None:
+                    batch, self._dirty = self._dirty, {}
+                else:
+                    batch = {key: q for key, q in self._dirty.items() if key[0] == user_id}
+                    for key in batch:
+                        del self._dirty[key]
+                self._flushing = batch
+            if not batch:
+                return True
+
+            try:
+                self._write(batch)
+            except mysql.connector.IntegrityError:
+                # یک کتاب یا کاربر در این فاصله حذف شده؛ ردیف‌ها جدا نوشته می‌شوند
+                self._write_rows(batch)
+            except Exception as e:
+                print(f"❌ خطا در ذخیره سبدهای خرید: {e}")
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                    for key, quantity in batch.items():
+                        # تغییر جدیدتری که در این فاصله آمده مقدم است
+                        self._dirty.setdefault(key, quantity)
+                return False
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+            with self._lock:
+                self._stats["flushes"] += 1
+            return True
+
+    def _write(self, batch):
+        upserts = [(u, b, q) for (u, b), q in batch.items() if q > 0]
+        deletes = [(u, b) for (u, b), q in batch.items() if q <= 0]
+
+        # upsert و delete با هم commit می‌شوند
+        with transaction() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(upserts), self.batch_size):
+                rows = upserts[i:i + self.batch_size]
+                cursor.execute(
+                    "INSERT INTO cart_items (user_id, book_id, quantity) VALUES "
+                    + ", ".join(["(%s, %s, %s)"] * len(rows))
+                    + " ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)",
+                    [value for row in rows for value in row],
+                )
+            for i in range(0, len(deletes), self.batch_size):
+                rows = deletes[i:i + self.batch_size]
+                cursor.execute(
+                    "DELETE FROM cart_items WHERE (user_id, book_id) IN ("
+                    + ", ".join(["(%s, %s)"] * len(rows)) + ")",
+                    [value for row in rows for value in row],
+                )
+            cursor.close()
+
+        with self._lock:
+            self._stats["rows_written"] += len(batch)
+
+    def _write_rows(self, batch):
+        for key, quantity in batch.items():
+            try:
+                self._write({key: quantity})
+            except Exception as e:
+                print(f"❌ خطا در ذخیره سبد کاربر {key[0]} (کتاب {key[1]}): {e}")
+                with self._lock:
+                    self._stats["rows_dropped"] += 1
+                    self._carts.pop(key[0], None)
+
+    def _evict(self):
+        """حذف سبدهای بیکار یا قدیمی‌ترین سبدها؛ سبدی که تغییر ذخیره‌نشده دارد نگه داشته می‌شود"""
+        # سبدی که تغییرش هنوز در دیتابیس نیست نباید دوباره از دیتابیس خوانده شود
+        dirty_users = {user_id for user_id, _ in self._dirty}
+        dirty_users.update(user_id for user_id, _ in self._flushing)
+        now = time.monotonic()
+        over = len(self._carts) - self.max_users
+        for user_id, entry in list(self._carts.items()):
+            if user_id in dirty_users:
+                continue
+            if over > 0 or now - entry["touched"] > self.idle_after:
+                del self._carts[user_id]
+                self._stats["evictions"] += 1
+                over -= 1
+
+    #  BACKGROUND
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cart-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+            with self._lock:
+                self._evict()
+
+    def close(self):
+        """توقف flush دوره‌ای و نوشتن تغییرات باقی‌مانده"""
+        self._stop.set()
+        return self.flush()
+
+    def stats(self):
+        """آمار بافر سبد خرید"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["users"] = len(self._carts)
+            stats["dirty"] = len(self._dirty)
+        return stats
+
+
+cart_buffer = CartBuffer()
+
+
+def use_cart_buffer():
+    """آیا تغییرات سبد باید از بافر write-behind بگذرند"""
+    return CART_WRITE_BEHIND
+
+
+def close_cart_buffer():
+    """توقف بافر سبد و نوشتن تغییرات باقی‌مانده (مسیر خاموشی)"""
+    return cart_buffer.close()
+
+
+def get_cart_buffer_stats():
+    """آمار بافر سبد خرید"""
+    return cart_buffer.stats()
@@ -1,24 +1,35 @@
 from config import DB_CONFIG
 import mysql.connector
+import os
+import queue
+import threading
 import time
 import logging
+from contextlib import contextmanager
 from mysql.connector import errorcode
 
+from .instrumentation import instrument, record_checkout, record_connect
+
 logger = logging.getLogger(__name__)
 
+# تنظیمات pool اتصال‌ها
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_STALE_AFTER = float(os.getenv("DB_POOL_STALE_AFTER", "60"))
+
+
 def get_db_connection(max_retries=3, retry_delay=2):
     """ایجاد اتصال به دیتابیس MySQL با قابلیت تلاش مجدد"""
-    logger.info("=" * 50)
-    logger.info("🔄 تلاش برای اتصال به دیتابیس...")
-    logger.info(f"   Host: {DB_CONFIG.get('host', 'NOT SET')}")
-    logger.info(f"   Database: {DB_CONFIG.get('database', 'NOT SET')}")
-    logger.info(f"   User: {DB_CONFIG.get('user', 'NOT SET')}")
-    logger.info(f"   Port: {DB_CONFIG.get('port', 'NOT SET')}")
-    logger.info("=" * 50)
+    # هر اتصال جدید pool از اینجا می‌گذرد؛ پیام‌های مسیر موفق در سطح DEBUG هستند
+    logger.debug(
+        "🔄 اتصال به دیتابیس %s@%s:%s/%s",
+        DB_CONFIG.get('user', 'NOT SET'), DB_CONFIG.get('host', 'NOT SET'),
+        DB_CONFIG.get('port', 'NOT SET'), DB_CONFIG.get('database', 'NOT SET')
+    )
     
     for attempt in range(max_retries):
         try:
-            logger.info(f"📡 تلاش برای اتصال (تلاش {attempt + 1}/{max_retries})...")
+            logger.debug("📡 تلاش برای اتصال (تلاش %s/%s)...", attempt + 1, max_retries)
             
             # ایجاد اتصال با تنظیمات اضافی
             conn = mysql.connector.connect(
@@ -35,31 +46,198 @@ def get_db_connection(max_retries=3, retry_delay=2):
             cursor.close()
             
             if result and result[0] == 1:
-                logger.info("✅ اتصال به دیتابیس موفقیت‌آمیز بود")
+                logger.debug("✅ اتصال به دیتابیس موفقیت‌آمیز بود")
                 return conn
             else:
                 logger.error("❌ تست اتصال ناموفق بود")
                 conn.close()
                 
         except mysql.connector.Error as e:
-            logger.error(f"❌ خطای MySQL (تلاش {attempt + 1}): {e}")
+            logger.error("❌ خطای MySQL (تلاش %s): %s", attempt + 1, e)
             
             if e.errno == errorcode.ER_ACCESS_DENIED_ERROR:
                 logger.error("   دلیل: نام کاربری یا رمز عبور اشتباه")
             elif e.errno == errorcode.ER_BAD_DB_ERROR:
-                logger.error(f"   دلیل: دیتابیس '{DB_CONFIG.get('database')}' وجود ندارد")
+                logger.error("   دلیل: دیتابیس '%s' وجود ندارد", DB_CONFIG.get('database'))
             elif e.errno == errorcode.CR_CONN_HOST_ERROR:
-                logger.error(f"   دلیل: نمی‌توان به میزبان '{DB_CONFIG.get('host')}' متصل شد")
+                logger.error("   دلیل: نمی‌توان به میزبان '%s' متصل شد", DB_CONFIG.get('host'))
             
             if attempt < max_retries - 1:
-                logger.info(f"⏳ صبر {retry_delay} ثانیه قبل از تلاش مجدد...")
+                logger.warning("⏳ صبر %s ثانیه قبل از تلاش مجدد...", retry_delay)
                 time.sleep(retry_delay)
             else:
                 logger.error("💥 تمام تلاش‌ها ناموفق بود")
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ خطای غیرمنتظره در اتصال دیتابیس: {e}")
+            logger.error("❌ خطای غیرمنتظره در اتصال دیتابیس: %s", e)
             return None
     
-    return None
\ No newline at end of file
+    return None
+
+
+#  CONNECTION POOL
+class PoolExhaustedError(Exception):
+    """هیچ اتصال آزادی در زمان مجاز پیدا نشد"""
+
+
+class ConnectionPool:
+    """pool محدود اتصال‌های MySQL با اعتبارسنجی تنبل"""
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, stale_after=DB_POOL_STALE_AFTER):
+        self.size = size
+        self.timeout = timeout
+        self.stale_after = stale_after
+        # اتصال‌های آزاد به صورت (conn, last_used)؛ LIFO تا اتصال‌های گرم اول استفاده شوند
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "in_use": 0,
+            "waiting": 0,
+            "waits": 0,
+            "exhausted": 0,
+            "validations": 0,
+            "wait_time_total": 0.0,
+        }
+
+    def _inc(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._inc("closed")
+
+    def _take_idle(self):
+        """برداشتن یک اتصال آزاد؛ فقط اتصال‌های کهنه اعتبارسنجی می‌شوند"""
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+
+            if time.monotonic() - last_used < self.stale_after:
+                return conn
+
+            self._inc("validations")
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                logger.warning("⚠️ اتصال کهنه در pool معتبر نبود و بسته شد")
+                self._close(conn)
+
+    def acquire(self):
+        """گرفتن اتصال از pool (در صورت نیاز اتصال جدید ساخته می‌شود)"""
+        if not self._slots.acquire(blocking=False):
+            self._inc("waits")
+            self._inc("waiting")
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            self._inc("waiting", -1)
+            self._inc("wait_time_total", time.monotonic() - started)
+            if not acquired:
+                self._inc("exhausted")
+                raise PoolExhaustedError(
+                    f"pool اتصال دیتابیس پر است ({self.size} اتصال در حال استفاده)"
+                )
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = get_db_connection()
+                if conn is None:
+                    raise mysql.connector.Error("اتصال به دیتابیس برقرار نشد")
+                self._inc("created")
+                record_connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def release(self, conn, broken=False):
+        """برگرداندن اتصال به pool"""
+        try:
+            if not broken and getattr(conn, "in_transaction", False):
+                conn.rollback()
+        except Exception:
+            broken = True
+
+        if broken:
+            self._close(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+        self._inc("in_use", -1)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """context manager برای گرفتن و برگرداندن خودکار اتصال"""
+        started = time.monotonic()
+        conn = self.acquire()
+        record_checkout(time.monotonic() - started)
+        # کوئری‌ها از طریق proxy ثبت و به update جاری نسبت داده می‌شوند
+        wrapped = instrument(conn)
+        broken = False
+        try:
+            yield wrapped
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # اتصال قطع شده؛ به pool برنمی‌گردد
+            broken = True
+            raise
+        finally:
+            if wrapped is not conn:
+                wrapped.finish()
+            self.release(conn, broken=broken)
+
+    def stats(self):
+        """آمار pool برای پایش"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        return stats
+
+    def close_all(self):
+        """بستن همه اتصال‌های آزاد"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+
+pool = ConnectionPool()
+
+
+def pooled_connection():
+    """گرفتن اتصال از pool سراسری (برای استفاده با with)"""
+    return pool.connection()
+
+
+def get_pool_stats():
+    """آمار pool سراسری"""
+    return pool.stats()
+
+
+@contextmanager
+def transaction():
+    """اجرای چند دستور در یک تراکنش روی یک اتصال؛ در صورت خطا rollback می‌شود"""
+    with pool.connection() as conn:
+        conn.start_transaction()
+        # در صورت خطا، release اتصال تراکنش باز را rollback می‌کند
+        yield conn
+        conn.commit()
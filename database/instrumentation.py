@@ -0,0 +1,320 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# ثبت زمان و تعداد کوئری‌ها برای هر update؛ با DB_INSTRUMENTATION=0 خاموش می‌شود
+DB_INSTRUMENTATION = os.getenv("DB_INSTRUMENTATION", "1") == "1"
+# کوئری‌های کندتر از این (میلی‌ثانیه) با WARNING لاگ می‌شوند
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# حداکثر تعداد کوئری متمایز در آمار تجمعی
+DB_QUERY_STATS_SIZE = int(os.getenv("DB_QUERY_STATS_SIZE", "500"))
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """متن یکسان برای کوئری‌های هم‌شکل: مقادیر با ? و لیست‌ها با (...) جایگزین می‌شوند"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    sql = sql.replace("%s", "?")
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    sql = _VALUES.sub(r"\1", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class UpdateScope:
+    """آمار دیتابیس یک update (یا هر واحد کار دیگر)"""
+
+    __slots__ = ("label", "queries", "db_time", "rows", "checkouts", "connections_opened",
+                 "acquire_time", "slow_queries", "started")
+
+    def __init__(self, label):
+        self.label = label
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.checkouts = 0
+        self.connections_opened = 0
+        self.acquire_time = 0.0
+        self.slow_queries = 0
+        self.started = time.perf_counter()
+
+    def summary(self):
+        return {
+            "label": self.label,
+            "queries": self.queries,
+            "db_time_ms": self.db_time * 1000,
+            "rows": self.rows,
+            "checkouts": self.checkouts,
+            "connections_opened": self.connections_opened,
+            "acquire_time_ms": self.acquire_time * 1000,
+            "slow_queries": self.slow_queries,
+            "elapsed_ms": (time.perf_counter() - self.started) * 1000,
+        }
+
+
+_current_scope = ContextVar("db_update_scope", default=None)
+
+
+class QueryStats:
+    """آمار تجمعی کوئری‌ها (به تفکیک متن نرمال‌شده) و update ها"""
+
+    def __init__(self, max_statements=DB_QUERY_STATS_SIZE):
+        self.max_statements = max_statements
+        self._statements = {}  # sql -> [تعداد، زمان کل، بیشترین زمان، ردیف‌ها]
+        self._lock = threading.Lock()
+        self._totals = {
+            "queries": 0,
+            "db_time": 0.0,
+            "slow_queries": 0,
+            "checkouts": 0,
+            "connections_opened": 0,
+            "acquire_time": 0.0,
+            "updates": 0,
+            "update_queries": 0,
+            "update_db_time": 0.0,
+            "update_queries_max": 0,
+        }
+
+    def record_query(self, sql, duration, rows):
+        with self._lock:
+            self._totals["queries"] += 1
+            self._totals["db_time"] += duration
+            entry = self._statements.get(sql)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    return
+                entry = self._statements[sql] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+            entry[3] += max(rows, 0)
+
+    def record(self, key, value=1):
+        with self._lock:
+            self._totals[key] += value
+
+    def record_update(self, scope):
+        with self._lock:
+            self._totals["updates"] += 1
+            self._totals["update_queries"] += scope.queries
+            self._totals["update_db_time"] += scope.db_time
+            if scope.queries > self._totals["update_queries_max"]:
+                self._totals["update_queries_max"] = scope.queries
+
+    def top(self, limit=10, key="total_time"):
+        """پرهزینه‌ترین کوئری‌ها"""
+        with self._lock:
+            rows = [
+                {"sql": sql, "count": c, "total_time": t, "max_time": m, "rows": r,
+                 "avg_time": t / c if c else 0.0}
+                for sql, (c, t, m, r) in self._statements.items()
+            ]
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._totals)
+            stats["statements"] = len(self._statements)
+        updates = stats["updates"]
+        stats["queries_per_update"] = stats["update_queries"] / updates if updates else 0.0
+        stats["db_time_per_update"] = stats["update_db_time"] / updates if updates else 0.0
+        stats["slow_query_ms"] = DB_SLOW_QUERY_MS
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            for key in self._totals:
+                self._totals[key] = 0
+
+
+query_stats = QueryStats()
+
+
+#  RECORDING
+def record_query(sql, duration, rows=-1):
+    """ثبت اجرای یک دستور SQL (زمان به ثانیه)"""
+    normalized = normalize_sql(sql)
+    query_stats.record_query(normalized, duration, rows)
+
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.queries += 1
+        scope.db_time += duration
+        scope.rows += max(rows, 0)
+
+    if duration * 1000 >= DB_SLOW_QUERY_MS:
+        query_stats.record("slow_queries")
+        if scope is not None:
+            scope.slow_queries += 1
+        logger.warning(
+            "🐢 کوئری کند (%.0fms، %s ردیف%s): %s",
+            duration * 1000, rows, "، " + scope.label if scope is not None else "", normalized
+        )
+
+
+def record_checkout(wait):
+    """ثبت گرفتن اتصال از pool و زمان انتظار آن"""
+    query_stats.record("checkouts")
+    query_stats.record("acquire_time", wait)
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.checkouts += 1
+        scope.acquire_time += wait
+
+
+def record_connect():
+    """ثبت باز شدن اتصال فیزیکی جدید"""
+    query_stats.record("connections_opened")
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.connections_opened += 1
+
+
+@contextmanager
+def update_scope(label):
+    """نسبت دادن کوئری‌های داخل بلوک به یک update و لاگ خلاصه آن در پایان"""
+    if not DB_INSTRUMENTATION:
+        yield None
+        return
+
+    scope = UpdateScope(label)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        query_stats.record_update(scope)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "📊 %s: %s کوئری، %.1fms دیتابیس، %s ردیف، %s اتصال (%s جدید، انتظار %.1fms)",
+                label, scope.queries, scope.db_time * 1000, scope.rows, scope.checkouts,
+                scope.connections_opened, scope.acquire_time * 1000
+            )
+
+
+def current_scope():
+    """آمار update در حال اجرا (یا None)"""
+    return _current_scope.get()
+
+
+#  PROXIES
+class InstrumentedCursor:
+    """cursor با ثبت زمان هر دستور؛ زمان fetch هم جزو همان دستور حساب می‌شود"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._sql = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._sql is not None:
+            rowcount = self._rows if self._rows else getattr(self._cursor, "rowcount", -1)
+            record_query(self._sql, self._elapsed, rowcount)
+            self._sql = None
+
+    def _timed(self, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._finish()
+        self._sql, self._elapsed, self._rows = operation, 0.0, 0
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._finish()
+        self._sql, self._elapsed, self._rows = operation, 0.0, 0
+        return self._timed(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._cursor.fetchmany, *args, **kwargs)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """اتصال با cursor های ثبت‌کننده؛ commit و rollback هم یک دستور حساب می‌شوند"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+        self._cursors.append(cursor)
+        return cursor
+
+    def finish(self):
+        """ثبت دستور آخر cursor هایی که بسته نشده‌اند (هنگام برگشت اتصال به pool)"""
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors = []
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            record_query("COMMIT", time.perf_counter() - started)
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            return self._conn.rollback()
+        finally:
+            record_query("ROLLBACK", time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument(conn):
+    """پوشاندن اتصال با proxy ثبت‌کننده (اگر instrumentation فعال باشد)"""
+    return InstrumentedConnection(conn) if DB_INSTRUMENTATION else conn
+
+
+def get_query_stats(top=10):
+    """آمار تجمعی کوئری‌ها و پرهزینه‌ترین دستورها"""
+    stats = query_stats.stats()
+    stats["top"] = query_stats.top(top)
+    return stats
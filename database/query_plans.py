@@ -0,0 +1,123 @@
+# بررسی پلن اجرای کوئری‌های پرتکرار با EXPLAIN:
+#   python -m database.query_plans [--min-rows N]
+# اگر کوئری‌ای روی جدولی full scan (type=ALL) انجام دهد کد خروج 1 است.
+# روی دیتابیس خالی یا خیلی کوچک، MySQL ممکن است با وجود ایندکس full scan را
+# انتخاب کند؛ با --min-rows جدول‌هایی که تخمین ردیفشان کمتر است نادیده گرفته می‌شوند.
+import argparse
+import sys
+
+import mysql.connector
+
+from .connection import pooled_connection
+from . import DQL
+from .admin_cache import ADMIN_IDS_SQL
+
+# کوئری‌های پرتکرار database/DQL.py با پارامتر نمونه: (نام تابع، SQL، پارامترها)
+# متن SQL از همان ثابت‌های DQL می‌آید تا با کد واقعی یکی بماند.
+# get_all_categories و get_all_admins عمداً کل جدول (کوچک) را می‌خوانند و جستجوی LIKE
+# (fallback وقتی FULLTEXT نیست) با % اول همیشه full scan است؛ این‌ها اینجا نیستند.
+ANCHOR = ("2030-01-01 00:00:00", "2030-01-01 00:00:00", 1000000)
+
+HOT_QUERIES = [
+    ("get_book", DQL.BOOK_BY_ID_SQL, (1,)),
+    ("get_books_by_category", DQL.BOOKS_BY_CATEGORY_SQL, (1, 10)),
+    ("get_all_books", DQL.ALL_BOOKS_SQL, (20,)),
+    ("count_active_books", DQL.COUNT_ACTIVE_BOOKS_SQL, ()),
+    ("get_books_page (offset)", DQL.BOOKS_PAGE_OFFSET_SQL, (5, 0)),
+    ("get_books_page (after)", DQL.BOOKS_PAGE_AFTER_SQL, ANCHOR + (5,)),
+    ("get_books_page (before)", DQL.BOOKS_PAGE_BEFORE_SQL, ANCHOR + (5,)),
+    ("search_books (fulltext)", DQL.SEARCH_FULLTEXT_SQL, ("کتاب", '+"کتاب"', 10)),
+    ("get_user_cart", DQL.CART_ITEMS_SQL, (1,)),
+    ("get_pending_orders_with_items", DQL.PENDING_ORDERS_PAGE_SQL, (5, 0)),
+    ("count_pending_orders", DQL.COUNT_PENDING_ORDERS_SQL, ()),
+    (
+        "get_order_items",
+        DQL.ORDER_ITEMS_FOR_ORDERS_SQL.format(placeholders="%s, %s"),
+        (1, 2),
+    ),
+    ("get_user_orders", DQL.USER_ORDERS_SQL, (1,)),
+    ("is_admin (admin cache)", ADMIN_IDS_SQL, ()),
+]
+
+# کوئری‌هایی که به ایندکس FULLTEXT نیاز دارند؛ اگر ایندکس نباشد بررسی نمی‌شوند
+FULLTEXT_QUERIES = {"search_books (fulltext)"}
+
+# جدول‌هایی که خواندن کاملشان مورد انتظار است
+FULL_SCAN_OK = {
+    "is_admin (admin cache)": {"admins"},
+}
+
+
+def explain(cursor, sql, params=()):
+    """خروجی EXPLAIN یک کوئری به صورت لیست دیکشنری"""
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def check_query_plans(min_rows=0, queries=HOT_QUERIES):
+    """اجرای EXPLAIN روی کوئری‌ها؛ خروجی (گزارش، لیست full scan ها، کوئری‌های ردشده)
+
+    کوئری FULLTEXT وقتی ایندکس در دسترس نیست (مثل مسیر جستجو) رد می‌شود.
+    """
+    report = []
+    full_scans = []
+    skipped = []
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        for name, sql, params in queries:
+            if name in FULLTEXT_QUERIES and not DQL._fulltext_state["available"]:
+                skipped.append((name, "ایندکس FULLTEXT در دسترس نیست"))
+                continue
+            try:
+                rows = explain(cursor, sql, params)
+            except mysql.connector.Error as e:
+                if name not in FULLTEXT_QUERIES or e.errno not in DQL.FULLTEXT_MISSING_ERRORS:
+                    raise
+                # جستجو در این حالت از LIKE استفاده می‌کند
+                skipped.append((name, f"ایندکس FULLTEXT وجود ندارد ({e.errno})"))
+                continue
+
+            for row in rows:
+                report.append((name, row))
+                if row.get("type") != "ALL":
+                    continue
+                if row.get("table") in FULL_SCAN_OK.get(name, ()):
+                    continue
+                if (row.get("rows") or 0) < min_rows:
+                    continue
+                full_scans.append((name, row))
+        cursor.close()
+
+    return report, full_scans, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="بررسی پلن کوئری‌های پرتکرار با EXPLAIN")
+    parser.add_argument(
+        "--min-rows", type=int, default=0,
+        help="full scan روی جدول‌هایی با تخمین ردیف کمتر از این نادیده گرفته می‌شود"
+    )
+    args = parser.parse_args(argv)
+
+    report, full_scans, skipped = check_query_plans(args.min_rows)
+    for name, row in report:
+        print(
+            f"{name:32} {row.get('table') or '-':12} {row.get('type') or '-':8} "
+            f"key={row.get('key') or '-':32} rows={row.get('rows')}  {row.get('Extra') or ''}"
+        )
+    for name, reason in skipped:
+        print(f"{name:32} ⚠️ بررسی نشد: {reason}")
+
+    if full_scans:
+        print(f"\n❌ {len(full_scans)} full scan پیدا شد:")
+        for name, row in full_scans:
+            print(f"  - {name}: جدول {row.get('table')} ({row.get('rows')} ردیف)")
+        return 1
+
+    print("\n✅ هیچ کوئری پرتکراری full scan ندارد")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import bisect
+import os
+import re
+import threading
+
+from .connection import pooled_connection
+
+# موتور جستجو: "fulltext" (MySQL) یا "memory" (ایندکس داخل حافظه)
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "fulltext")
+
+# وزن هر فیلد در رتبه‌بندی
+FIELD_WEIGHTS = {"title": 3, "author": 2, "description": 1}
+
+# یکسان‌سازی حروف عربی/فارسی و ارقام
+_CHAR_MAP = str.maketrans({
+    "ي": "ی",
+    "ى": "ی",
+    "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه",
+    "ۀ": "ه",
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+
+# اعراب، تنوین و کشیده
+_DIACRITICS = re.compile("[\u064B-\u065F\u0670\u0640]")
+_ZWNJ = "\u200c"
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """یکسان‌سازی متن فارسی برای ایندکس و جستجو"""
+    if not text:
+        return ""
+    text = _DIACRITICS.sub("", str(text).translate(_CHAR_MAP))
+    return text.lower()
+
+
+def tokenize(text):
+    """تبدیل متن به توکن‌ها؛ کلمات با نیم‌فاصله هم جدا و هم چسبیده ایندکس می‌شوند"""
+    tokens = []
+    for chunk in normalize_text(text).split():
+        if _ZWNJ in chunk:
+            tokens.extend(_WORD.findall(chunk.replace(_ZWNJ, "")))
+        tokens.extend(_WORD.findall(chunk.replace(_ZWNJ, " ")))
+    return tokens
+
+
+class BookSearchIndex:
+    """ایندکس معکوس کتاب‌ها با پشتیبانی از جستجوی پیشوندی"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._books = {}  # book_id -> ردیف کتاب
+        self._postings = {}  # token -> {book_id: weight}
+        self._doc_tokens = {}  # book_id -> set(token)
+        self._sorted_tokens = []  # برای جستجوی پیشوندی با bisect
+        self.ready = False
+
+    def _add(self, book):
+        book_id = book["book_id"]
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(book.get(field)):
+                weights[token] = max(weights.get(token, 0), weight)
+
+        self._books[book_id] = dict(book)
+        self._doc_tokens[book_id] = set(weights)
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._sorted_tokens, token)
+            postings[book_id] = weight
+
+    def _remove(self, book_id):
+        self._books.pop(book_id, None)
+        for token in self._doc_tokens.pop(book_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._sorted_tokens, token)
+                if i < len(self._sorted_tokens) and self._sorted_tokens[i] == token:
+                    del self._sorted_tokens[i]
+
+    def build(self, books):
+        """ساخت کامل ایندکس از لیست کتاب‌ها"""
+        with self._lock:
+            self._books.clear()
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._sorted_tokens = []
+            for book in books:
+                self._add(book)
+            self.ready = True
+
+    def upsert(self, book):
+        """اضافه یا به‌روزرسانی یک کتاب"""
+        with self._lock:
+            self._remove(book["book_id"])
+            if book.get("is_active", True):
+                self._add(book)
+
+    def remove(self, book_id):
+        """حذف یک کتاب از ایندکس"""
+        with self._lock:
+            self._remove(book_id)
+
+    def _match(self, token):
+        """امتیاز کتاب‌هایی که توکنی با این پیشوند دارند"""
+        scores = {}
+        i = bisect.bisect_left(self._sorted_tokens, token)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(token):
+            candidate = self._sorted_tokens[i]
+            # تطابق کامل کلمه امتیاز بیشتری از تطابق پیشوندی دارد
+            bonus = 1.0 if candidate == token else 0.5
+            for book_id, weight in self._postings[candidate].items():
+                score = weight * bonus
+                if score > scores.get(book_id, 0):
+                    scores[book_id] = score
+            i += 1
+        return scores
+
+    def search(self, query, limit=10):
+        """جستجوی AND روی همه کلمات؛ هر کلمه به عنوان پیشوند تطبیق داده می‌شود"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            result = None
+            for token in dict.fromkeys(tokens):
+                scores = self._match(token)
+                if result is None:
+                    result = scores
+                else:
+                    result = {
+                        book_id: result[book_id] + score
+                        for book_id, score in scores.items()
+                        if book_id in result
+                    }
+                if not result:
+                    return []
+
+            ranked = sorted(
+                result.items(),
+                key=lambda item: (-item[1], normalize_text(self._books[item[0]].get("title"))),
+            )
+            # کپی ردیف‌ها؛ ردیف‌های ایندکس فقط با upsert عوض می‌شوند
+            return [dict(self._books[book_id]) for book_id, _ in ranked[:limit]]
+
+    def stats(self):
+        """آمار ایندکس"""
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "books": len(self._books),
+                "tokens": len(self._postings),
+            }
+
+
+search_index = BookSearchIndex()
+
+_BOOK_QUERY = """
+    SELECT b.*, c.name as category_name
+    FROM books b
+    LEFT JOIN categories c ON b.category_id = c.category_id
+"""
+
+
+def build_search_index():
+    """ساخت ایندکس از جدول books (هنگام راه‌اندازی)"""
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(_BOOK_QUERY + " WHERE b.is_active = TRUE")
+            books = cursor.fetchall()
+            cursor.close()
+
+        search_index.build(books)
+        print(f"✅ ایندکس جستجو با {len(books)} کتاب ساخته شد")
+        return True
+
+    except Exception as e:
+        print(f"❌ خطا در ساخت ایندکس جستجو: {e}")
+        return False
+
+
+def refresh_indexed_book(book_id):
+    """به‌روزرسانی یک کتاب در ایندکس بعد از تغییر آن در دیتابیس"""
+    refresh_indexed_books([book_id])
+
+
+def refresh_indexed_books(book_ids):
+    """به‌روزرسانی چند کتاب با یک کوئری (مثلاً موجودی بعد از ثبت یا رد سفارش)"""
+    book_ids = list(dict.fromkeys(book_ids))
+    if not search_index.ready or not book_ids:
+        return
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(book_ids))
+            cursor.execute(_BOOK_QUERY + f" WHERE b.book_id IN ({placeholders})", book_ids)
+            books = {book["book_id"]: book for book in cursor.fetchall()}
+            cursor.close()
+
+        for book_id in book_ids:
+            if book_id in books:
+                search_index.upsert(books[book_id])
+            else:
+                search_index.remove(book_id)
+
+    except Exception as e:
+        print(f"❌ خطا در به‌روزرسانی ایندکس جستجو: {e}")
+
+
+def remove_indexed_book(book_id):
+    """حذف کتاب از ایندکس"""
+    if search_index.ready:
+        search_index.remove(book_id)
+
+
+def use_memory_search():
+    """آیا جستجو باید از ایندکس داخل حافظه پاسخ داده شود"""
+    return SEARCH_ENGINE == "memory" and search_index.ready
@@ -0,0 +1,118 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+# تنظیمات لاگ؛ پیام‌های هر update در سطح DEBUG هستند و با LOG_LEVEL=DEBUG دیده می‌شوند
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+# سقف صف لاگ؛ اگر خروجی عقب بماند رکوردهای جدید دور ریخته می‌شوند (نه اینکه handler منتظر بماند)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# از هر N رخداد پرتکرار (sampled) یکی لاگ می‌شود؛ 1 یعنی همه
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+_sampled_extras = {}
+
+
+def sampled(key, every=None):
+    """extra برای لاگ نمونه‌برداری‌شده: logger.info("...", x, extra=sampled("callback"))"""
+    extra = _sampled_extras.get((key, every))
+    if extra is None:
+        extra = _sampled_extras[(key, every)] = {"sample_key": key, "sample_every": every}
+    return extra
+
+
+class SamplingFilter(logging.Filter):
+    """از رکوردهای دارای sample_key فقط اولی و بعد هر N-امی عبور می‌کند
+
+    رکوردهای WARNING و بالاتر همیشه عبور می‌کنند. به پیام نمونه‌ها (به جز اولی)
+    نرخ نمونه‌برداری اضافه می‌شود تا تعداد واقعی از روی لاگ قابل تخمین باشد.
+    """
+
+    def __init__(self, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+
+        every = record.sample_every or self.every
+        if every <= 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % every:
+            return False
+        if count:
+            record.msg = f"{record.msg} [نمونه 1 از {every}]"
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler با صف محدود که در صورت پر بودن صف رکورد را دور می‌ریزد"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None, queue_size=LOG_QUEUE_SIZE,
+                  sample_every=LOG_SAMPLE_EVERY):
+    """پیکربندی لاگ ریشه: handler ها از طریق صف در thread جدا می‌نویسند
+
+    thread های handler فقط رکورد را در صف می‌گذارند؛ نوشتن روی stdout در
+    QueueListener انجام می‌شود. فراخوانی دوباره فقط سطح لاگ را عوض می‌کند.
+    """
+    global _listener, _handler
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(fmt))
+
+    _handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    _handler.addFilter(SamplingFilter(sample_every))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """نوشتن رکوردهای باقی‌مانده صف و توقف thread لاگ"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats():
+    """آمار صف لاگ"""
+    if _handler is None:
+        return {}
+    return {"queue_size": _handler.queue.qsize(), "dropped": _handler.dropped}
@@ -3,30 +3,36 @@ from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeybo
 import os
 import sys
 import logging
-import time
 from telebot import apihelper
 from database import (
-    create_tables, save_user, add_category, add_book_full,
+    ensure_schema, save_user, add_category, add_book_full,
     get_all_categories, get_books_by_category, get_book,
-    add_to_cart, update_cart_quantity, clear_user_cart,
-    create_order, add_order_item, update_order_status,
-    is_admin, add_admin, get_all_books, search_books,
-    get_user_cart, get_cart_total, get_pending_orders,
-    get_order_items, get_user_orders, update_book, delete_book,
-    delete_category, get_category_by_id
+    add_to_cart, change_cart_quantity, clear_user_cart,
+    checkout_order, OutOfStockError, update_order_status,
+    is_admin, add_admin, search_books,
+    get_cart_snapshot, count_pending_orders, get_pending_orders_with_items,
+    get_user_orders, update_book, delete_book,
+    delete_category, get_category_by_id, count_active_books, get_books_page,
+    SEARCH_ENGINE, build_search_index, load_admins,
+    CART_WRITE_BEHIND, get_pool_stats, get_cache_stats, get_admin_cache_stats,
+    close_cart_buffer, get_cart_buffer_stats, get_query_stats
 )
 from config import BOT_TOKEN, ADMIN_ID, PAYMENT_CARD
+from router import CallbackRouter
+from state_store import create_state_store
+from webhook import run_webhook
+from worker_pool import HandlerPool
+from sender import install_sender
+from logging_setup import setup_logging, sampled, get_logging_stats
+from startup import (
+    STOPPING, ConflictHandler, readiness, run_startup, check_telegram, handle_sigterm
+)
+import metrics
 
 #  CONFIGURATION 
 
-# فعال کردن لاگینگ پیشرفته
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# لاگ از طریق صف در thread جدا نوشته می‌شود (LOG_LEVEL، LOG_SAMPLE_EVERY)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 🔴 **تنظیمات مهم برای جلوگیری از خطای 409**
@@ -35,60 +41,161 @@ apihelper.RETRY_ON_ERROR = True
 apihelper.READ_TIMEOUT = 30
 apihelper.CONNECT_TIMEOUT = 30
 
-# تاخیر قبل از شروع (مهم برای جلوگیری از خطای 409)
 logger.info("=" * 60)
 logger.info("🤖 راه‌اندازی ربات کتابفروشی")
 logger.info("=" * 60)
-time.sleep(3)
+
+# حالت اجرا: "polling" (پیش‌فرض) یا "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
 
 #  تنظیمات ضد خطای 409
 bot = telebot.TeleBot(
     BOT_TOKEN,
     threaded=True,
     skip_pending=True,  
-    parse_mode='Markdown',
-    num_threads=2
+    parse_mode='Markdown'
 )
 
 # تأیید skip_pending
 bot.skip_pending = True
 
+# worker های handler با صف محدود (HANDLER_THREADS، HANDLER_QUEUE_SIZE، HANDLER_OVERLOAD)؛
+# update های هر چت به ترتیب و پشت سر هم اجرا می‌شوند، چت‌های مختلف موازی
+bot.worker_pool.close()
+bot.worker_pool = HandlerPool(bot)
+
+# همه درخواست‌های خروجی از زمان‌بندی ارسال (محدودیت کلی/هر چت و مدیریت 429) عبور می‌کنند
+sender_scheduler = install_sender()
+
+# مسیریاب callback ها (جدول dispatch به جای زنجیره if/elif)
+router = CallbackRouter()
+
 # 🔴 **لیست ادمین‌های ثابت برای مواقعی که دیتابیس در دسترس نیست**
 FALLBACK_ADMINS = [int(ADMIN_ID)] if ADMIN_ID else []
 
 def check_admin_with_fallback(user_id):
     """بررسی ادمین با fallback به لیست ثابت"""
-    logger.info(f"🔍 بررسی دسترسی ادمین برای کاربر {user_id}")
-    
     # ابتدا از لیست ثابت بررسی کن
     if user_id in FALLBACK_ADMINS:
-        logger.info(f"✅ کاربر {user_id} در لیست ادمین‌های ثابت است")
         return True
     
-    # سپس از دیتابیس بررسی کن
+    # سپس از کش ادمین‌ها (جدول admins با TTL)
     try:
         is_admin_result = is_admin(user_id)
-        logger.info(f"📊 نتیجه بررسی دیتابیس برای کاربر {user_id}: {is_admin_result}")
+        logger.debug("📊 نتیجه بررسی ادمین برای کاربر %s: %s", user_id, is_admin_result)
         return is_admin_result
     except Exception as e:
-        logger.warning(f"⚠️ خطا در بررسی ادمین از دیتابیس: {e}")
+        logger.warning("⚠️ خطا در بررسی ادمین از دیتابیس: %s", e)
         return False
 
-#  DATABASE INITIALIZATION 
+#  STARTUP 
 
-logger.info("🔄 ایجاد/بررسی جداول دیتابیس...")
-try:
-    if create_tables():
-        logger.info("✅ جداول دیتابیس با موفقیت بررسی شدند")
-    else:
-        logger.error("❌ خطا در ایجاد جداول دیتابیس")
-except Exception as e:
-    logger.error(f"❌ خطا در ایجاد جداول: {e}")
+def ensure_main_admin():
+    """خواندن لیست ادمین‌ها (کش) و ثبت ADMIN_ID در جدول admins اگر نباشد"""
+    if not load_admins():
+        return False
+    if ADMIN_ID and not is_admin(int(ADMIN_ID)):
+        logger.info("➕ اضافه کردن ادمین اصلی %s...", ADMIN_ID)
+        return add_admin(ADMIN_ID, "مدیر اصلی", True)
+    return True
+
+def startup(mode=BOT_MODE):
+    """بررسی‌های شروع به جای کار در زمان import؛ خروجی True اگر همه موفق باشند
+
+    مرحله اول (هم‌زمان): ساختار دیتابیس (اگر نشانگر نسخه به‌روز باشد فقط یک SELECT)
+    و تلگرام (توکن و تداخل webhook). مرحله دوم به جداول نیاز دارد: کش ادمین‌ها
+    و ایندکس جستجوی داخل حافظه.
+    """
+    second = [("admins", ensure_main_admin)]
+    if SEARCH_ENGINE == "memory":
+        second.append(("search_index", build_search_index))
+    return run_startup([
+        [("schema", ensure_schema), ("telegram", lambda: check_telegram(bot, mode))],
+        second,
+    ])
+
+def shutdown():
+    """مسیر خاموشی: وضعیت stopping و نوشتن تغییرات باقی‌مانده سبدها"""
+    readiness.set(STOPPING)
+    close_cart_buffer()
+
+# state گفتگوها (TTL دار؛ با STATE_BACKEND می‌تواند ماندگار باشد)
+user_states = create_state_store()
+
+#  METRICS
+
+# آمار موجود اجزا فقط موقع scrape خوانده می‌شود (METRICS_PORT، پیش‌فرض 127.0.0.1:9108/metrics)
+metrics.register_stats(
+    "db_pool", get_pool_stats,
+    counters=("created", "closed", "checkouts", "waits", "exhausted", "validations",
+              ("wait_time_total", "wait_seconds")),
+    gauges=("in_use", "waiting", "idle", "size"),
+)
+metrics.register_stats(
+    "db", get_query_stats,
+    counters=("queries", "slow_queries", "connections_opened", ("db_time", "query_seconds")),
+)
+metrics.register_stats(
+    "catalog_cache", get_cache_stats,
+    counters=("hits", "misses", "expired", "evictions", "invalidations", "discarded_sets"),
+    gauges=("size", "hit_ratio"),
+)
+metrics.register_stats(
+    "admin_cache", get_admin_cache_stats,
+    counters=("checks", "loads", "load_errors", "discarded_loads", "invalidations"),
+    gauges=("admins",),
+)
+if CART_WRITE_BEHIND:
+    metrics.register_stats(
+        "cart_buffer", get_cart_buffer_stats,
+        counters=("hits", "loads", "changes", "coalesced", "flushes", "rows_written", "flush_errors",
+                  "evictions"),
+        gauges=("users", "dirty"),
+    )
+metrics.register_stats(
+    "bot_handler", bot.worker_pool.stats,
+    counters=("completed", "failed", "blocked"),
+    gauges=("pending", "busy", "queue_depth", "active_chats"),
+)
+metrics.register_stats(
+    "telegram_sender", sender_scheduler.stats,
+    counters=(
+        "sent", "retries_429", "retries_error", "failed", ("wait_time_total", "wait_seconds")
+    ),
+    gauges=("waiting", "chats"),
+)
+metrics.register_stats("bot_user_states", user_states.stats, gauges=("size",))
+metrics.register_stats(
+    "bot_startup", readiness.stats,
+    gauges=("ready", "degraded", ("startup_seconds", "duration_seconds")),
+)
+metrics.register_stats("log", get_logging_stats, counters=("dropped",), gauges=("queue_size",))
 
-user_states = {}
+# تعداد کتاب در هر صفحه از لیست‌ها
+BOOKS_PER_PAGE = 5
+ADMIN_DELETE_BOOKS_PER_PAGE = 4
+ADMIN_PENDING_ORDERS_PER_PAGE = 5
 
 #  HELPER FUNCTIONS 
 
+def page_count(total, per_page):
+    """تعداد صفحات برای صفحه‌بندی"""
+    return max(1, (total + per_page - 1) // per_page)
+
+def load_books_page(page=1, cursor=None, per_page=BOOKS_PER_PAGE):
+    """دریافت کتاب‌های یک صفحه؛ cursor از callback_data دکمه‌های قبلی/بعدی می‌آید"""
+    after_id = before_id = None
+    if cursor and cursor[0] == "n":
+        after_id = int(cursor[1:])
+    elif cursor and cursor[0] == "p":
+        before_id = int(cursor[1:])
+    return get_books_page(
+        per_page,
+        after_id=after_id,
+        before_id=before_id,
+        offset=(page - 1) * per_page
+    )
+
 def safe_edit_or_send(bot, call, text, reply_markup=None):
     """ویرایش امن پیام یا ارسال جدید"""
     try:
@@ -109,7 +216,7 @@ def safe_edit_or_send(bot, call, text, reply_markup=None):
                 parse_mode='Markdown'
             )
     except Exception as e:
-        logger.warning(f"Could not edit message, sending new: {e}")
+        logger.warning("Could not edit message, sending new: %s", e)
         bot.send_message(
             call.message.chat.id,
             text,
@@ -136,7 +243,7 @@ def send_or_edit_message(bot, user_id, message_id, content_type, text, reply_mar
                 parse_mode='Markdown'
             )
     except Exception as e:
-        logger.warning(f"خطا در ویرایش پیام: {e}")
+        logger.warning("خطا در ویرایش پیام: %s", e)
         bot.send_message(
             user_id,
             text,
@@ -183,15 +290,14 @@ def save_edited_book(bot, user_id, state):
                 reply_markup=admin_menu_markup()
             )
     except Exception as e:
-        logger.error(f"خطا در ذخیره کتاب ویرایش شده: {e}")
+        logger.error("خطا در ذخیره کتاب ویرایش شده: %s", e)
         bot.send_message(
             user_id,
             f"❌ خطا در ویرایش کتاب: {e}",
             reply_markup=admin_menu_markup()
         )
     
-    if user_id in user_states:
-        del user_states[user_id]
+    user_states.discard(user_id)
 
 #  KEYBOARD BUILDERS 
 
@@ -214,9 +320,10 @@ def support_markup():
     mk.add(InlineKeyboardButton("🔙 بازگشت", callback_data="home"))
     return mk
 
-def categories_markup():
+def categories_markup(categories=None):
     """کیبورد دسته‌بندی‌ها"""
-    categories = get_all_categories()
+    if categories is None:
+        categories = get_all_categories()
     mk = InlineKeyboardMarkup(row_width=2)
     
     if not categories:
@@ -258,20 +365,17 @@ def books_markup(books, category_id=None):
     mk.row(InlineKeyboardButton("🏠 منوی اصلی", callback_data="home"))
     return mk
 
-def books_list_markup(books, page=1):
+def books_list_markup(books, page=1, total=0):
     """کیبورد لیست کتاب‌ها برای کاربران"""
-    books_per_page = 5
-    start_idx = (page - 1) * books_per_page
-    end_idx = start_idx + books_per_page
-    paginated_books = books[start_idx:end_idx]
+    books_per_page = BOOKS_PER_PAGE
     
     mk = InlineKeyboardMarkup(row_width=1)
     
-    if not paginated_books:
+    if not books:
         mk.add(InlineKeyboardButton("🔙 بازگشت", callback_data="home"))
         return mk
     
-    for book in paginated_books:
+    for book in books:
         mk.add(InlineKeyboardButton(
             f"📖 {book['title']} - {book['price']:,} تومان",
             callback_data=f"book_{book['book_id']}"
@@ -280,9 +384,9 @@ def books_list_markup(books, page=1):
    
     pagination_buttons = []
     if page > 1:
-        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"books_page_{page-1}"))
-    if end_idx < len(books):
-        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"books_page_{page+1}"))
+        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"books_page_{page-1}_p{books[0]['book_id']}"))
+    if page * books_per_page < total:
+        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"books_page_{page+1}_n{books[-1]['book_id']}"))
     
     if pagination_buttons:
         mk.row(*pagination_buttons)
@@ -332,6 +436,26 @@ def cart_markup(cart_items):
     )
     return mk
 
+def cart_view(snapshot):
+    """متن و کیبورد صفحه سبد خرید از خروجی get_cart_snapshot"""
+    cart_items = snapshot["items"]
+    if not cart_items:
+        return "🛒 سبد خرید شما خالی است.", InlineKeyboardMarkup().add(
+            InlineKeyboardButton("🔙 بازگشت", callback_data="home"),
+            InlineKeyboardButton("🔍 جستجوی کتاب", callback_data="search")
+        )
+
+    text = "🛒 سبد خرید شما:\n\n"
+
+    for item in cart_items:
+        text += f"📖 {item['title']}\n"
+        text += f"   ✍️ {item['author']}\n"
+        text += f"   💰 {item['price']:,} × {item['count']} = {item['price'] * item['count']:,} تومان\n\n"
+
+    text += f"💵 مجموع کل: {snapshot['total']:,} تومان"
+
+    return text, cart_markup(cart_items)
+
 def admin_menu_markup():
     """منوی ادمین"""
     mk = InlineKeyboardMarkup(row_width=2)
@@ -349,20 +473,17 @@ def admin_menu_markup():
     )
     return mk
 
-def admin_edit_books_markup(books, page=1):
+def admin_edit_books_markup(books, page=1, total=0):
     """کیبورد لیست کتاب‌ها برای ویرایش ادمین"""
-    books_per_page = 5
-    start_idx = (page - 1) * books_per_page
-    end_idx = start_idx + books_per_page
-    paginated_books = books[start_idx:end_idx]
+    books_per_page = BOOKS_PER_PAGE
     
     mk = InlineKeyboardMarkup(row_width=1)
     
-    if not paginated_books:
+    if not books:
         mk.add(InlineKeyboardButton("🔙 بازگشت", callback_data="home"))
         return mk
     
-    for book in paginated_books:
+    for book in books:
         mk.add(InlineKeyboardButton(
             f"#️⃣ {book['book_id']}: {book['title']}",
             callback_data=f"admin_edit_select_{book['book_id']}"
@@ -371,9 +492,9 @@ def admin_edit_books_markup(books, page=1):
    
     pagination_buttons = []
     if page > 1:
-        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"admin_edit_page_{page-1}"))
-    if end_idx < len(books):
-        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"admin_edit_page_{page+1}"))
+        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"admin_edit_page_{page-1}_p{books[0]['book_id']}"))
+    if page * books_per_page < total:
+        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"admin_edit_page_{page+1}_n{books[-1]['book_id']}"))
     
     if pagination_buttons:
         mk.row(*pagination_buttons)
@@ -382,20 +503,17 @@ def admin_edit_books_markup(books, page=1):
     
     return mk
 
-def admin_delete_books_markup(books, page=1):
+def admin_delete_books_markup(books, page=1, total=0):
     """کیبورد لیست کتاب‌ها برای حذف ادمین"""
-    books_per_page = 4 
-    start_idx = (page - 1) * books_per_page
-    end_idx = start_idx + books_per_page
-    paginated_books = books[start_idx:end_idx]
+    books_per_page = ADMIN_DELETE_BOOKS_PER_PAGE
     
     mk = InlineKeyboardMarkup(row_width=2)
     
-    if not paginated_books:
+    if not books:
         mk.add(InlineKeyboardButton("🔙 بازگشت", callback_data="home"))
         return mk
     
-    for book in paginated_books:
+    for book in books:
         mk.row(
             InlineKeyboardButton(f"👁️ {book['book_id']}: {book['title'][:15]}...", 
                                callback_data=f"admin_view_{book['book_id']}"),
@@ -406,9 +524,9 @@ def admin_delete_books_markup(books, page=1):
     # دکمه‌های صفحه‌بندی
     pagination_buttons = []
     if page > 1:
-        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"admin_delete_page_{page-1}"))
-    if end_idx < len(books):
-        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"admin_delete_page_{page+1}"))
+        pagination_buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"admin_delete_page_{page-1}_p{books[0]['book_id']}"))
+    if page * books_per_page < total:
+        pagination_buttons.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"admin_delete_page_{page+1}_n{books[-1]['book_id']}"))
     
     if pagination_buttons:
         mk.row(*pagination_buttons)
@@ -533,16 +651,16 @@ def handle_start_admin(message):
     user_id = message.chat.id
     command = message.text.split()[0] if message.text else ''
     
-    logger.info(f"📩 دستور دریافت شده: {command} از کاربر {user_id}")
+    logger.info("📩 دستور دریافت شده: %s از کاربر %s", command, user_id, extra=sampled("command"))
     
     try:
         save_user(user_id)
     except Exception as e:
-        logger.error(f"خطا در ذخیره کاربر: {e}")
+        logger.error("خطا در ذخیره کاربر: %s", e)
     
     # بررسی وضعیت ادمین
     is_user_admin = check_admin_with_fallback(user_id)
-    logger.info(f"کاربر {user_id} وضعیت ادمین: {is_user_admin}")
+    logger.debug("کاربر %s وضعیت ادمین: %s", user_id, is_user_admin)
     
     if command == '/admin' or (command == '/start' and is_user_admin):
         if is_user_admin:
@@ -552,10 +670,10 @@ def handle_start_admin(message):
                 "از منوی زیر استفاده کنید:",
                 reply_markup=admin_menu_markup()
             )
-            logger.info(f"پنل ادمین برای کاربر {user_id} نمایش داده شد")
+            logger.debug("پنل ادمین برای کاربر %s نمایش داده شد", user_id)
         else:
             bot.send_message(user_id, "⛔ شما دسترسی ادمین ندارید!")
-            logger.warning(f"کاربر {user_id} تلاش برای دسترسی به پنل ادمین بدون دسترسی")
+            logger.warning("کاربر %s تلاش برای دسترسی به پنل ادمین بدون دسترسی", user_id)
     else:
         bot.send_message(
             user_id,
@@ -572,988 +690,1031 @@ def callback_handler(call):
     user_id = call.message.chat.id
     data = call.data
     
-    logger.info(f"🖱️ Callback دریافت شده - کاربر: {user_id}, دیتا: {data}")
+    logger.info("🖱️ Callback دریافت شده - کاربر: %s, دیتا: %s", user_id, data, extra=sampled("callback"))
     
     try:
         # اگر کاربر ادمین نیست و دیتای ادمین دارد، دسترسی رد کن
         if data.startswith('admin_') and not check_admin_with_fallback(user_id):
             bot.answer_callback_query(call.id, "⛔ دسترسی رد شد!")
             return
-        
-        # بازگشت به خانه
-        if data == "home":
-            if check_admin_with_fallback(user_id):
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "🏠 منوی اصلی\n\nاز گزینه‌های زیر استفاده کنید:",
-                    admin_menu_markup()
-                )
-            else:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "🏠 منوی اصلی\n\nاز گزینه‌های زیر استفاده کنید:",
-                    main_menu_markup()
-                )
-        
-        # پشتیبانی
-        elif data == "support":
-            support_text = (
-                "📞 **پشتیبانی**\n\n"
-                "برای ارتباط با پشتیبانی، لطفاً به آیدی زیر پیام دهید:\n"
-                "@GISHNIZ2007\n\n"
-                "🕐 ساعات پاسخگویی: ۹ صبح تا ۱۲ شب"
-            )
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                support_text,
-                support_markup()
-            )
-        
-        # نمایش دسته‌بندی‌ها
-        elif data == "categories":
-            try:
-                categories = get_all_categories()
-            except Exception as e:
-                logger.error(f"خطا در دریافت دسته‌بندی‌ها: {e}")
-                categories = []
-            
-            if not categories:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 در حال حاضر هیچ دسته‌بندی موجود نیست.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="home")
-                    )
-                )
-                return
-            
-            text = "📚 دسته‌بندی‌های موجود:\n\n"
-            for cat in categories:
-                text += f"• {cat['name']}\n"
-            
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                categories_markup()
+
+        router.dispatch(call, user_id)
+
+    except Exception as e:
+        logger.error("Error in callback handler: %s", e, exc_info=True)
+        try:
+            bot.answer_callback_query(call.id, "❌ خطایی رخ داد")
+        except:
+            pass
+
+#  CALLBACK ROUTES 
+
+# بازگشت به خانه
+@router.route("home")
+def cb_home(call, user_id):
+    if check_admin_with_fallback(user_id):
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "🏠 منوی اصلی\n\nاز گزینه‌های زیر استفاده کنید:",
+            admin_menu_markup()
+        )
+    else:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "🏠 منوی اصلی\n\nاز گزینه‌های زیر استفاده کنید:",
+            main_menu_markup()
+        )
+
+
+# پشتیبانی
+@router.route("support")
+def cb_support(call, user_id):
+    support_text = (
+        "📞 **پشتیبانی**\n\n"
+        "برای ارتباط با پشتیبانی، لطفاً به آیدی زیر پیام دهید:\n"
+        "@GISHNIZ2007\n\n"
+        "🕐 ساعات پاسخگویی: ۹ صبح تا ۱۲ شب"
+    )
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        support_text,
+        support_markup()
+    )
+
+
+# نمایش دسته‌بندی‌ها
+@router.route("categories")
+def cb_categories(call, user_id):
+    try:
+        categories = get_all_categories()
+    except Exception as e:
+        logger.error("خطا در دریافت دسته‌بندی‌ها: %s", e)
+        categories = []
+
+    if not categories:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 در حال حاضر هیچ دسته‌بندی موجود نیست.",
+            InlineKeyboardMarkup().add(
+                InlineKeyboardButton("🔙 بازگشت", callback_data="home")
             )
-        
-        # لیست کتاب‌ها برای کاربران
-        elif data == "list_books":
-            try:
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 در حال حاضر هیچ کتابی موجود نیست.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="home")
-                    )
-                )
-                return
-            
-            text = f"📚 لیست کتاب‌ها (صفحه 1 از {(len(books) // 5) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                books_list_markup(books, 1)
+        )
+        return
+
+    text = "📚 دسته‌بندی‌های موجود:\n\n"
+    for cat in categories:
+        text += f"• {cat['name']}\n"
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        categories_markup(categories)
+    )
+
+
+# لیست کتاب‌ها برای کاربران
+@router.route("list_books")
+def cb_list_books(call, user_id):
+    try:
+        books = load_books_page(1)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 در حال حاضر هیچ کتابی موجود نیست.",
+            InlineKeyboardMarkup().add(
+                InlineKeyboardButton("🔙 بازگشت", callback_data="home")
             )
-        
-        # صفحه‌بندی لیست کتاب‌ها برای کاربران
-        elif data.startswith("books_page_"):
-            try:
-                page = int(data.split("_")[2])
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 در حال حاضر هیچ کتابی موجود نیست.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="home")
-                    )
-                )
-                return
-            
-            text = f"📚 لیست کتاب‌ها (صفحه {page} از {(len(books) // 5) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                books_list_markup(books, page)
+        )
+        return
+
+    text = f"📚 لیست کتاب‌ها (صفحه 1 از {page_count(total, BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        books_list_markup(books, 1, total)
+    )
+
+
+# صفحه‌بندی لیست کتاب‌ها برای کاربران
+@router.route("books_page_", prefix=True)
+def cb_books_page(call, user_id, page, cursor=None):
+    try:
+        books = load_books_page(page, cursor)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 در حال حاضر هیچ کتابی موجود نیست.",
+            InlineKeyboardMarkup().add(
+                InlineKeyboardButton("🔙 بازگشت", callback_data="home")
             )
-        
-        # انتخاب دسته‌بندی
-        elif data.startswith("category_"):
-            category_id = int(data.split("_")[1])
-            try:
-                books = get_books_by_category(category_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت کتاب‌های دسته‌بندی: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 در این دسته‌بندی کتابی موجود نیست.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="categories"),
-                        InlineKeyboardButton("🏠 خانه", callback_data="home")
-                    )
-                )
-                return
-            
-            text = f"📚 کتاب‌های این دسته‌بندی:\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                books_markup(books, category_id)
+        )
+        return
+
+    text = f"📚 لیست کتاب‌ها (صفحه {page} از {page_count(total, BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        books_list_markup(books, page, total)
+    )
+
+
+# انتخاب دسته‌بندی
+@router.route("category_", prefix=True)
+def cb_category(call, user_id, category_id):
+    try:
+        books = get_books_by_category(category_id)
+    except Exception as e:
+        logger.error("خطا در دریافت کتاب‌های دسته‌بندی: %s", e)
+        books = []
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 در این دسته‌بندی کتابی موجود نیست.",
+            InlineKeyboardMarkup().add(
+                InlineKeyboardButton("🔙 بازگشت", callback_data="categories"),
+                InlineKeyboardButton("🏠 خانه", callback_data="home")
             )
-        
-        # نمایش کتاب
-        elif data.startswith("book_"):
-            book_id = int(data.split("_")[1])
-            try:
-                book = get_book(book_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت کتاب: {e}")
-                book = None
-            
-            if not book:
-                bot.answer_callback_query(call.id, "کتاب یافت نشد!")
-                return
-            
-            text = (
-                f"📖 **{book['title']}**\n\n"
-                f"✍️ نویسنده: {book['author']}\n"
-                f"🏷️ دسته: {book.get('category_name', 'بدون دسته')}\n"
-                f"💰 قیمت: {book['price']:,} تومان\n"
-                f"📝 موجودی: {book.get('stock', 1)} عدد\n\n"
-                f"📄 توضیحات:\n{book.get('description', 'بدون توضیحات')}"
+        )
+        return
+
+    text = f"📚 کتاب‌های این دسته‌بندی:\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        books_markup(books, category_id)
+    )
+
+
+# نمایش کتاب
+@router.route("book_", prefix=True)
+def cb_book(call, user_id, book_id):
+    try:
+        book = get_book(book_id)
+    except Exception as e:
+        logger.error("خطا در دریافت کتاب: %s", e)
+        book = None
+
+    if not book:
+        bot.answer_callback_query(call.id, "کتاب یافت نشد!")
+        return
+
+    text = (
+        f"📖 **{book['title']}**\n\n"
+        f"✍️ نویسنده: {book['author']}\n"
+        f"🏷️ دسته: {book.get('category_name', 'بدون دسته')}\n"
+        f"💰 قیمت: {book['price']:,} تومان\n"
+        f"📝 موجودی: {book.get('stock', 1)} عدد\n\n"
+        f"📄 توضیحات:\n{book.get('description', 'بدون توضیحات')}"
+    )
+
+    # اگر عکس دارد
+    if book.get('file_id'):
+        try:
+            bot.delete_message(user_id, call.message.message_id)
+            bot.send_photo(
+                user_id,
+                book['file_id'],
+                caption=text,
+                reply_markup=book_detail_markup(book_id, book.get('category_id')),
+                parse_mode='Markdown'
             )
-            
-            # اگر عکس دارد
-            if book.get('file_id'):
-                try:
-                    bot.delete_message(user_id, call.message.message_id)
-                    bot.send_photo(
-                        user_id,
-                        book['file_id'],
-                        caption=text,
-                        reply_markup=book_detail_markup(book_id, book.get('category_id')),
-                        parse_mode='Markdown'
-                    )
-                except:
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        text,
-                        book_detail_markup(book_id, book.get('category_id'))
-                    )
-            else:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    text,
-                    book_detail_markup(book_id, book.get('category_id'))
-                )
-        
-        # اضافه به سبد خرید
-        elif data.startswith("add_"):
-            book_id = int(data.split("_")[1])
-            try:
-                if add_to_cart(user_id, book_id):
-                    bot.answer_callback_query(call.id, "✅ به سبد خرید اضافه شد")
-                else:
-                    bot.answer_callback_query(call.id, "❌ خطا در اضافه کردن به سبد")
-            except Exception as e:
-                logger.error(f"خطا در افزودن به سبد: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا در عملیات")
-        
-        # سبد خرید
-        elif data == "cart":
-            try:
-                cart_items = get_user_cart(user_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت سبد خرید: {e}")
-                cart_items = []
-            
-            if not cart_items:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "🛒 سبد خرید شما خالی است.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="home"),
-                        InlineKeyboardButton("🔍 جستجوی کتاب", callback_data="search")
-                    )
-                )
-                return
-            
-            try:
-                total = get_cart_total(user_id)
-            except Exception as e:
-                logger.error(f"خطا در محاسبه مجموع: {e}")
-                total = 0
-            
-            text = "🛒 سبد خرید شما:\n\n"
-            
-            for item in cart_items:
-                text += f"📖 {item['title']}\n"
-                text += f"   ✍️ {item['author']}\n"
-                text += f"   💰 {item['price']:,} × {item['count']} = {item['price'] * item['count']:,} تومان\n\n"
-            
-            text += f"💵 مجموع کل: {total:,} تومان"
-            
+        except:
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
                 text,
-                cart_markup(cart_items)
+                book_detail_markup(book_id, book.get('category_id'))
             )
-        
-        # کنترل‌های سبد خرید
-        elif data.startswith("inc_"):
-            book_id = int(data.split("_")[1])
-            try:
-                update_cart_quantity(user_id, book_id, 1)
-                bot.answer_callback_query(call.id, "✅ افزایش یافت")
-            except Exception as e:
-                logger.error(f"خطا در افزایش سبد: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا")
-            # سبد خرید رو دوباره نمایش بده
-            callback_handler(type('obj', (object,), {
-                'message': call.message,
-                'data': 'cart',
-                'id': call.id
-            }))
-        
-        elif data.startswith("dec_"):
-            book_id = int(data.split("_")[1])
-            try:
-                update_cart_quantity(user_id, book_id, -1)
-                bot.answer_callback_query(call.id, "✅ کاهش یافت")
-            except Exception as e:
-                logger.error(f"خطا در کاهش سبد: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا")
-            # سبد خرید رو دوباره نمایش بده
-            callback_handler(type('obj', (object,), {
-                'message': call.message,
-                'data': 'cart',
-                'id': call.id
-            }))
-        
-        elif data.startswith("remove_"):
-            book_id = int(data.split("_")[1])
-            try:
-                update_cart_quantity(user_id, book_id, 0)
-                bot.answer_callback_query(call.id, "✅ حذف شد")
-            except Exception as e:
-                logger.error(f"خطا در حذف از سبد: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا")
-            # سبد خرید رو دوباره نمایش بده
-            callback_handler(type('obj', (object,), {
-                'message': call.message,
-                'data': 'cart',
-                'id': call.id
-            }))
-        
-        elif data == "clear_cart":
-            try:
-                clear_user_cart(user_id)
-                bot.answer_callback_query(call.id, "✅ سبد خرید خالی شد")
-            except Exception as e:
-                logger.error(f"خطا در پاک کردن سبد: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا")
-            # سبد خرید رو دوباره نمایش بده
-            callback_handler(type('obj', (object,), {
-                'message': call.message,
-                'data': 'cart',
-                'id': call.id
-            }))
-        
-        # ثبت سفارش
-        elif data == "checkout":
-            try:
-                cart_items = get_user_cart(user_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت سبد برای checkout: {e}")
-                cart_items = []
-                
-            if not cart_items:
-                bot.answer_callback_query(call.id, "سبد خرید شما خالی است")
-                return
-            
-            user_states[user_id] = {"step": "checkout_phone", "data": {}}
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                "🧾 ثبت سفارش\n\n📞 لطفاً شماره تلفن خود را ارسال کنید:",
-                None
+    else:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            text,
+            book_detail_markup(book_id, book.get('category_id'))
+        )
+
+
+# اضافه به سبد خرید
+@router.route("add_", prefix=True)
+def cb_add(call, user_id, book_id):
+    try:
+        if add_to_cart(user_id, book_id):
+            bot.answer_callback_query(call.id, "✅ به سبد خرید اضافه شد")
+        else:
+            bot.answer_callback_query(call.id, "❌ موجودی کافی نیست یا خطا در اضافه کردن به سبد")
+    except Exception as e:
+        logger.error("خطا در افزودن به سبد: %s", e)
+        bot.answer_callback_query(call.id, "❌ خطا در عملیات")
+
+
+# سبد خرید
+@router.route("cart")
+def cb_cart(call, user_id, snapshot=None):
+    """نمایش سبد؛ کنترل‌های سبد snapshot به‌روز شده را مستقیم می‌دهند"""
+    if snapshot is None:
+        try:
+            snapshot = get_cart_snapshot(user_id)
+        except Exception as e:
+            logger.error("خطا در دریافت سبد خرید: %s", e)
+            snapshot = {"items": [], "total": 0, "count": 0}
+
+    text, markup = cart_view(snapshot)
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        markup
+    )
+
+
+# کنترل‌های سبد خرید
+@router.route("inc_", prefix=True)
+def cb_inc(call, user_id, book_id):
+    updated, snapshot = change_cart_quantity(user_id, book_id, 1)
+    if snapshot is None:
+        bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    if updated:
+        bot.answer_callback_query(call.id, "✅ افزایش یافت")
+    else:
+        bot.answer_callback_query(call.id, "⚠️ موجودی کافی نیست")
+    cb_cart(call, user_id, snapshot)
+
+
+@router.route("dec_", prefix=True)
+def cb_dec(call, user_id, book_id):
+    updated, snapshot = change_cart_quantity(user_id, book_id, -1)
+    if snapshot is None:
+        bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    bot.answer_callback_query(call.id, "✅ کاهش یافت")
+    cb_cart(call, user_id, snapshot)
+
+
+@router.route("remove_", prefix=True)
+def cb_remove(call, user_id, book_id):
+    updated, snapshot = change_cart_quantity(user_id, book_id, 0)
+    if snapshot is None:
+        bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    bot.answer_callback_query(call.id, "✅ حذف شد")
+    cb_cart(call, user_id, snapshot)
+
+
+@router.route("clear_cart")
+def cb_clear_cart(call, user_id):
+    if not clear_user_cart(user_id):
+        bot.answer_callback_query(call.id, "❌ خطا")
+        return
+    bot.answer_callback_query(call.id, "✅ سبد خرید خالی شد")
+    # سبد خالی است؛ نیازی به کوئری دوباره نیست
+    cb_cart(call, user_id, {"items": [], "total": 0, "count": 0})
+
+
+# ثبت سفارش
+@router.route("checkout")
+def cb_checkout(call, user_id):
+    try:
+        snapshot = get_cart_snapshot(user_id)
+    except Exception as e:
+        logger.error("خطا در دریافت سبد برای checkout: %s", e)
+        snapshot = {"items": [], "total": 0, "count": 0}
+
+    if not snapshot["count"]:
+        bot.answer_callback_query(call.id, "سبد خرید شما خالی است")
+        return
+
+    user_states[user_id] = {"step": "checkout_phone", "data": {}}
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        "🧾 ثبت سفارش\n\n📞 لطفاً شماره تلفن خود را ارسال کنید:",
+        None
+    )
+
+
+# جستجو
+@router.route("search")
+def cb_search(call, user_id):
+    user_states[user_id] = {"step": "search_query"}
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        "🔍 لطفاً عنوان کتاب یا نام نویسنده را وارد کنید:",
+        None
+    )
+
+
+# سفارشات من
+@router.route("my_orders")
+def cb_my_orders(call, user_id):
+    try:
+        orders = get_user_orders(user_id)
+    except Exception as e:
+        logger.error("خطا در دریافت سفارشات کاربر: %s", e)
+        orders = []
+
+    if not orders:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 شما هنوز سفارشی ثبت نکرده‌اید.",
+            InlineKeyboardMarkup().add(
+                InlineKeyboardButton("🔙 بازگشت", callback_data="home")
             )
-        
-        # جستجو
-        elif data == "search":
-            user_states[user_id] = {"step": "search_query"}
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                "🔍 لطفاً عنوان کتاب یا نام نویسنده را وارد کنید:",
-                None
-            )
-        
-        # سفارشات من
-        elif data == "my_orders":
-            try:
-                orders = get_user_orders(user_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت سفارشات کاربر: {e}")
-                orders = []
-            
-            if not orders:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 شما هنوز سفارشی ثبت نکرده‌اید.",
-                    InlineKeyboardMarkup().add(
-                        InlineKeyboardButton("🔙 بازگشت", callback_data="home")
-                    )
-                )
-                return
-            
-            text = "📦 سفارشات شما:\n\n"
-            for order in orders:
-                status_text = {
-                    'pending': '⏳ در انتظار',
-                    'approved': '✅ تایید شده',
-                    'rejected': '❌ رد شده'
-                }.get(order['status'], order['status'])
-                
-                text += f"🆔 کد سفارش: {order['order_id']}\n"
-                text += f"💰 مبلغ: {order['total_price']:,} تومان\n"
-                text += f"📊 وضعیت: {status_text}\n"
-                text += f"📅 تاریخ: {order['created_at'].strftime('%Y/%m/%d')}\n"
-                text += "─" * 20 + "\n"
-            
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                InlineKeyboardMarkup().add(
-                    InlineKeyboardButton("🔙 بازگشت", callback_data="home")
-                )
-            )
-        
-        #  ADMIN HANDLERS 
-        
-        # اضافه کردن کتاب
-        elif data == "admin_add_book":
-            user_states[user_id] = {"step": "admin_add_book_title", "data": {}}
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                "📝 اضافه کردن کتاب جدید\n\nلطفاً عنوان کتاب را وارد کنید:",
-                None
-            )
-        
-        # ویرایش کتاب - نمایش لیست کتاب‌ها
-        elif data == "admin_edit_book":
-            try:
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ کتابی برای ویرایش وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"📝 ویرایش کتاب\n\n📚 لیست کتاب‌ها (صفحه 1 از {(len(books) // 5) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_edit_books_markup(books, 1)
-            )
-        
-        # صفحه‌بندی ویرایش کتاب برای ادمین
-        elif data.startswith("admin_edit_page_"):
-            try:
-                page = int(data.split("_")[3])
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ کتابی برای ویرایش وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"📝 ویرایش کتاب\n\n📚 لیست کتاب‌ها (صفحه {page} از {(len(books) // 5) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_edit_books_markup(books, page)
-            )
-        
-        # انتخاب کتاب برای ویرایش
-        elif data.startswith("admin_edit_select_"):
-            book_id = int(data.split("_")[3])
-            try:
-                book = get_book(book_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت کتاب برای ویرایش: {e}")
-                book = None
-            
-            if not book:
-                bot.answer_callback_query(call.id, "کتاب یافت نشد!")
-                return
-            
-            # ذخیره اطلاعات فعلی در user_state
-            user_states[user_id] = {
-                "step": "admin_edit_book_title",
-                "data": {
-                    "book_id": book_id,
-                    "current_title": book.get('title', ''),
-                    "current_author": book.get('author', ''),
-                    "current_description": book.get('description', ''),
-                    "current_price": book.get('price', 0),
-                    "current_category_id": book.get('category_id')
-                }
-            }
-            
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                f"📖 ویرایش کتاب: {book['title']}\n\n"
-                f"آیدی کتاب: #{book_id}\n"
-                f"عنوان فعلی: {book['title']}\n"
-                f"نویسنده فعلی: {book['author']}\n"
-                f"قیمت فعلی: {book['price']:,} تومان\n\n"
-                f"عنوان جدید را وارد کنید (یا برای عدم تغییر Enter بزنید):",
-                None
-            )
-        
-        # حذف کتاب - نمایش لیست کتاب‌ها
-        elif data == "admin_delete_book":
-            try:
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ کتابی برای حذف وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"🗑️ حذف کتاب\n\n📚 لیست کتاب‌ها (صفحه 1 از {(len(books) // 4) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_delete_books_markup(books, 1)
-            )
-        
-        # صفحه‌بندی حذف کتاب برای ادمین
-        elif data.startswith("admin_delete_page_"):
-            try:
-                page = int(data.split("_")[3])
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ کتابی برای حذف وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"🗑️ حذف کتاب\n\n📚 لیست کتاب‌ها (صفحه {page} از {(len(books) // 4) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_delete_books_markup(books, page)
-            )
-        
-        # مشاهده جزئیات کتاب برای حذف
-        elif data.startswith("admin_view_"):
-            book_id = int(data.split("_")[2])
-            try:
-                book = get_book(book_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت کتاب برای نمایش: {e}")
-                book = None
-            
-            if not book:
-                bot.answer_callback_query(call.id, "کتاب یافت نشد!")
-                return
-            
-            text = (
-                f"👁️ نمایش کتاب برای حذف\n\n"
-                f"📖 **{book['title']}**\n\n"
-                f"✍️ نویسنده: {book['author']}\n"
-                f"🏷️ دسته: {book.get('category_name', 'بدون دسته')}\n"
-                f"💰 قیمت: {book['price']:,} تومان\n"
-                f"📝 موجودی: {book.get('stock', 1)} عدد\n\n"
-                f"📄 توضیحات:\n{book.get('description', 'بدون توضیحات')[:200]}..."
-            )
-            
-            mk = InlineKeyboardMarkup(row_width=2)
-            mk.add(
-                InlineKeyboardButton("❌ حذف این کتاب", callback_data=f"admin_delete_confirm_{book_id}"),
-                InlineKeyboardButton("🔙 بازگشت", callback_data="admin_delete_book")
-            )
-            
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                mk
-            )
-        
-        # تأیید حذف کتاب
-        elif data.startswith("admin_delete_confirm_"):
-            book_id = int(data.split("_")[3])
-            try:
-                book = get_book(book_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت کتاب برای تأیید حذف: {e}")
-                book = None
-            
-            if not book:
-                bot.answer_callback_query(call.id, "کتاب یافت نشد!")
-                return
-            
-            text = f"⚠️ **تأیید حذف کتاب**\n\n"
-            text += f"📖 عنوان: {book['title']}\n"
-            text += f"✍️ نویسنده: {book['author']}\n"
-            text += f"💰 قیمت: {book['price']:,} تومان\n\n"
-            text += "آیا مطمئن هستید که می‌خواهید این کتاب را حذف کنید؟\n"
-            text += "این عمل غیرقابل بازگشت است!"
-            
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                confirm_delete_markup(book_id)
-            )
-        
-        # حذف نهایی کتاب
-        elif data.startswith("admin_delete_final_"):
-            book_id = int(data.split("_")[3])
-            
-            try:
-                if delete_book(book_id):
-                    bot.answer_callback_query(call.id, "✅ کتاب با موفقیت حذف شد")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        "✅ کتاب با موفقیت حذف شد.",
-                        admin_menu_markup()
-                    )
-                else:
-                    bot.answer_callback_query(call.id, "❌ خطا در حذف کتاب")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        "❌ خطا در حذف کتاب!",
-                        admin_menu_markup()
-                    )
-            except Exception as e:
-                logger.error(f"خطا در حذف کتاب: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا در عملیات")
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    f"❌ خطا در حذف کتاب: {e}",
-                    admin_menu_markup()
-                )
-        
-        # ویرایش دسته‌بندی‌ها - نمایش لیست
-        elif data == "admin_edit_category":
-            try:
-                categories = get_all_categories()
-            except Exception as e:
-                logger.error(f"خطا در دریافت دسته‌بندی‌ها: {e}")
-                categories = []
-            
-            if not categories:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ دسته‌بندی برای ویرایش وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"📝 ویرایش دسته‌بندی‌ها\n\n📁 لیست دسته‌بندی‌ها (صفحه 1 از {(len(categories) // 4) + 1}):\n\n"
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_edit_categories_markup(categories, 1)
-            )
-        
-        # صفحه‌بندی ویرایش دسته‌بندی‌ها
-        elif data.startswith("admin_edit_cat_page_"):
-            try:
-                page = int(data.split("_")[4])
-                categories = get_all_categories()
-            except Exception as e:
-                logger.error(f"خطا در دریافت دسته‌بندی‌ها: {e}")
-                categories = []
-            
-            if not categories:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ دسته‌بندی برای ویرایش وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = f"📝 ویرایش دسته‌بندی‌ها\n\n📁 لیست دسته‌بندی‌ها (صفحه {page} از {(len(categories) // 4) + 1}):\n\n"
+        )
+        return
+
+    text = "📦 سفارشات شما:\n\n"
+    for order in orders:
+        status_text = {
+            'pending': '⏳ در انتظار',
+            'approved': '✅ تایید شده',
+            'rejected': '❌ رد شده'
+        }.get(order['status'], order['status'])
+
+        text += f"🆔 کد سفارش: {order['order_id']}\n"
+        text += f"💰 مبلغ: {order['total_price']:,} تومان\n"
+        text += f"📊 وضعیت: {status_text}\n"
+        text += f"📅 تاریخ: {order['created_at'].strftime('%Y/%m/%d')}\n"
+        text += "─" * 20 + "\n"
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        InlineKeyboardMarkup().add(
+            InlineKeyboardButton("🔙 بازگشت", callback_data="home")
+        )
+    )
+
+
+#  ADMIN HANDLERS
+# اضافه کردن کتاب
+@router.route("admin_add_book")
+def cb_admin_add_book(call, user_id):
+    user_states[user_id] = {"step": "admin_add_book_title", "data": {}}
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        "📝 اضافه کردن کتاب جدید\n\nلطفاً عنوان کتاب را وارد کنید:",
+        None
+    )
+
+
+# ویرایش کتاب - نمایش لیست کتاب‌ها
+@router.route("admin_edit_book")
+def cb_admin_edit_book(call, user_id):
+    try:
+        books = load_books_page(1)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ کتابی برای ویرایش وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"📝 ویرایش کتاب\n\n📚 لیست کتاب‌ها (صفحه 1 از {page_count(total, BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_edit_books_markup(books, 1, total)
+    )
+
+
+# صفحه‌بندی ویرایش کتاب برای ادمین
+@router.route("admin_edit_page_", prefix=True)
+def cb_admin_edit_page(call, user_id, page, cursor=None):
+    try:
+        books = load_books_page(page, cursor)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ کتابی برای ویرایش وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"📝 ویرایش کتاب\n\n📚 لیست کتاب‌ها (صفحه {page} از {page_count(total, BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_edit_books_markup(books, page, total)
+    )
+
+
+# انتخاب کتاب برای ویرایش
+@router.route("admin_edit_select_", prefix=True)
+def cb_admin_edit_select(call, user_id, book_id):
+    try:
+        book = get_book(book_id)
+    except Exception as e:
+        logger.error("خطا در دریافت کتاب برای ویرایش: %s", e)
+        book = None
+
+    if not book:
+        bot.answer_callback_query(call.id, "کتاب یافت نشد!")
+        return
+
+    # ذخیره اطلاعات فعلی در user_state
+    user_states[user_id] = {
+        "step": "admin_edit_book_title",
+        "data": {
+            "book_id": book_id,
+            "current_title": book.get('title', ''),
+            "current_author": book.get('author', ''),
+            "current_description": book.get('description', ''),
+            "current_price": book.get('price', 0),
+            "current_category_id": book.get('category_id')
+        }
+    }
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        f"📖 ویرایش کتاب: {book['title']}\n\n"
+        f"آیدی کتاب: #{book_id}\n"
+        f"عنوان فعلی: {book['title']}\n"
+        f"نویسنده فعلی: {book['author']}\n"
+        f"قیمت فعلی: {book['price']:,} تومان\n\n"
+        f"عنوان جدید را وارد کنید (یا برای عدم تغییر Enter بزنید):",
+        None
+    )
+
+
+# حذف کتاب - نمایش لیست کتاب‌ها
+@router.route("admin_delete_book")
+def cb_admin_delete_book(call, user_id):
+    try:
+        books = load_books_page(1, per_page=ADMIN_DELETE_BOOKS_PER_PAGE)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ کتابی برای حذف وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"🗑️ حذف کتاب\n\n📚 لیست کتاب‌ها (صفحه 1 از {page_count(total, ADMIN_DELETE_BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_delete_books_markup(books, 1, total)
+    )
+
+
+# صفحه‌بندی حذف کتاب برای ادمین
+@router.route("admin_delete_page_", prefix=True)
+def cb_admin_delete_page(call, user_id, page, cursor=None):
+    try:
+        books = load_books_page(page, cursor, per_page=ADMIN_DELETE_BOOKS_PER_PAGE)
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ کتابی برای حذف وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"🗑️ حذف کتاب\n\n📚 لیست کتاب‌ها (صفحه {page} از {page_count(total, ADMIN_DELETE_BOOKS_PER_PAGE)}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_delete_books_markup(books, page, total)
+    )
+
+
+# مشاهده جزئیات کتاب برای حذف
+@router.route("admin_view_", prefix=True)
+def cb_admin_view(call, user_id, book_id):
+    try:
+        book = get_book(book_id)
+    except Exception as e:
+        logger.error("خطا در دریافت کتاب برای نمایش: %s", e)
+        book = None
+
+    if not book:
+        bot.answer_callback_query(call.id, "کتاب یافت نشد!")
+        return
+
+    text = (
+        f"👁️ نمایش کتاب برای حذف\n\n"
+        f"📖 **{book['title']}**\n\n"
+        f"✍️ نویسنده: {book['author']}\n"
+        f"🏷️ دسته: {book.get('category_name', 'بدون دسته')}\n"
+        f"💰 قیمت: {book['price']:,} تومان\n"
+        f"📝 موجودی: {book.get('stock', 1)} عدد\n\n"
+        f"📄 توضیحات:\n{book.get('description', 'بدون توضیحات')[:200]}..."
+    )
+
+    mk = InlineKeyboardMarkup(row_width=2)
+    mk.add(
+        InlineKeyboardButton("❌ حذف این کتاب", callback_data=f"admin_delete_confirm_{book_id}"),
+        InlineKeyboardButton("🔙 بازگشت", callback_data="admin_delete_book")
+    )
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        mk
+    )
+
+
+# تأیید حذف کتاب
+@router.route("admin_delete_confirm_", prefix=True)
+def cb_admin_delete_confirm(call, user_id, book_id):
+    try:
+        book = get_book(book_id)
+    except Exception as e:
+        logger.error("خطا در دریافت کتاب برای تأیید حذف: %s", e)
+        book = None
+
+    if not book:
+        bot.answer_callback_query(call.id, "کتاب یافت نشد!")
+        return
+
+    text = f"⚠️ **تأیید حذف کتاب**\n\n"
+    text += f"📖 عنوان: {book['title']}\n"
+    text += f"✍️ نویسنده: {book['author']}\n"
+    text += f"💰 قیمت: {book['price']:,} تومان\n\n"
+    text += "آیا مطمئن هستید که می‌خواهید این کتاب را حذف کنید؟\n"
+    text += "این عمل غیرقابل بازگشت است!"
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        confirm_delete_markup(book_id)
+    )
+
+
+# حذف نهایی کتاب
+@router.route("admin_delete_final_", prefix=True)
+def cb_admin_delete_final(call, user_id, book_id):
+
+    try:
+        if delete_book(book_id):
+            bot.answer_callback_query(call.id, "✅ کتاب با موفقیت حذف شد")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                admin_edit_categories_markup(categories, page)
+                "✅ کتاب با موفقیت حذف شد.",
+                admin_menu_markup()
             )
-        
-        # ویرایش نام دسته‌بندی
-        elif data.startswith("admin_edit_cat_"):
-            # این فقط برای ویرایش نام است، نه حذف
-            if "confirm" in data or "final" in data:
-                pass
-            else:
-                category_id = int(data.split("_")[3])
-                user_states[user_id] = {
-                    "step": "admin_edit_category_name",
-                    "data": {"category_id": category_id}
-                }
-                
-                try:
-                    category = get_category_by_id(category_id)
-                    if category:
-                        send_or_edit_message(
-                            bot, user_id, call.message.message_id, call.message.content_type,
-                            f"✏️ ویرایش نام دسته‌بندی\n\n"
-                            f"نام فعلی: {category['name']}\n\n"
-                            f"لطفاً نام جدید را وارد کنید:",
-                            None
-                        )
-                    else:
-                        bot.answer_callback_query(call.id, "دسته‌بندی یافت نشد!")
-                except Exception as e:
-                    logger.error(f"خطا در دریافت دسته‌بندی: {e}")
-                    bot.answer_callback_query(call.id, "❌ خطا در دریافت اطلاعات")
-        
-        # تأیید حذف دسته‌بندی
-        elif data.startswith("admin_delete_cat_confirm_"):
-            category_id = int(data.split("_")[4])
-            try:
-                category = get_category_by_id(category_id)
-            except Exception as e:
-                logger.error(f"خطا در دریافت دسته‌بندی برای تأیید حذف: {e}")
-                category = None
-            
-            if not category:
-                bot.answer_callback_query(call.id, "دسته‌بندی یافت نشد!")
-                return
-            
-            # بررسی اینکه آیا کتابی در این دسته‌بندی وجود دارد
-            try:
-                books_in_category = get_books_by_category(category_id)
-            except Exception as e:
-                logger.error(f"خطا در بررسی کتاب‌های دسته‌بندی: {e}")
-                books_in_category = []
-            
-            text = f"⚠️ **تأیید حذف دسته‌بندی**\n\n"
-            text += f"📁 نام: {category['name']}\n"
-            text += f"📚 تعداد کتاب در این دسته: {len(books_in_category)}\n\n"
-            text += "با حذف این دسته‌بندی:\n"
-            text += "• تمام کتاب‌های این دسته بدون دسته‌بندی خواهند شد\n"
-            text += "• این عمل غیرقابل بازگشت است!\n\n"
-            text += "آیا مطمئن هستید؟"
-            
+        else:
+            bot.answer_callback_query(call.id, "❌ خطا در حذف کتاب")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                text,
-                confirm_delete_category_markup(category_id)
+                "❌ خطا در حذف کتاب!",
+                admin_menu_markup()
             )
-        
-        # حذف نهایی دسته‌بندی
-        elif data.startswith("admin_delete_cat_final_"):
-            category_id = int(data.split("_")[4])
-            
-            try:
-                # ابتدا کتاب‌های این دسته را بدون دسته‌بندی کنیم
-                books_in_category = get_books_by_category(category_id)
-                for book in books_in_category:
-                    update_book(book['book_id'], category_id=None)
-                
-                # سپس دسته‌بندی را حذف کنیم
-                if delete_category(category_id):
-                    bot.answer_callback_query(call.id, "✅ دسته‌بندی با موفقیت حذف شد")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        f"✅ دسته‌بندی با موفقیت حذف شد.\n"
-                        f"📚 {len(books_in_category)} کتاب به حالت بدون دسته‌بندی تغییر کردند.",
-                        admin_menu_markup()
-                    )
-                else:
-                    bot.answer_callback_query(call.id, "❌ خطا در حذف دسته‌بندی")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        "❌ خطا در حذف دسته‌بندی!",
-                        admin_menu_markup()
-                    )
-            except Exception as e:
-                logger.error(f"خطا در حذف دسته‌بندی: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا در عملیات")
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    f"❌ خطا در حذف دسته‌بندی: {e}",
-                    admin_menu_markup()
-                )
-        
-        # اضافه کردن دسته‌بندی
-        elif data == "admin_add_category":
-            user_states[user_id] = {"step": "admin_add_category_name"}
+    except Exception as e:
+        logger.error("خطا در حذف کتاب: %s", e)
+        bot.answer_callback_query(call.id, "❌ خطا در عملیات")
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            f"❌ خطا در حذف کتاب: {e}",
+            admin_menu_markup()
+        )
+
+
+# ویرایش دسته‌بندی‌ها - نمایش لیست
+@router.route("admin_edit_category")
+def cb_admin_edit_category(call, user_id):
+    try:
+        categories = get_all_categories()
+    except Exception as e:
+        logger.error("خطا در دریافت دسته‌بندی‌ها: %s", e)
+        categories = []
+
+    if not categories:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ دسته‌بندی برای ویرایش وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"📝 ویرایش دسته‌بندی‌ها\n\n📁 لیست دسته‌بندی‌ها (صفحه 1 از {(len(categories) // 4) + 1}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_edit_categories_markup(categories, 1)
+    )
+
+
+# صفحه‌بندی ویرایش دسته‌بندی‌ها
+@router.route("admin_edit_cat_page_", prefix=True)
+def cb_admin_edit_cat_page(call, user_id, page):
+    try:
+        categories = get_all_categories()
+    except Exception as e:
+        logger.error("خطا در دریافت دسته‌بندی‌ها: %s", e)
+        categories = []
+
+    if not categories:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ دسته‌بندی برای ویرایش وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    text = f"📝 ویرایش دسته‌بندی‌ها\n\n📁 لیست دسته‌بندی‌ها (صفحه {page} از {(len(categories) // 4) + 1}):\n\n"
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_edit_categories_markup(categories, page)
+    )
+
+
+# ویرایش نام دسته‌بندی
+@router.route("admin_edit_cat_", prefix=True)
+def cb_admin_edit_cat(call, user_id, category_id):
+    user_states[user_id] = {
+        "step": "admin_edit_category_name",
+        "data": {"category_id": category_id}
+    }
+
+    try:
+        category = get_category_by_id(category_id)
+        if category:
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                "🗂️ اضافه کردن دسته‌بندی جدید\n\nلطفاً نام دسته‌بندی را وارد کنید:",
+                f"✏️ ویرایش نام دسته‌بندی\n\n"
+                f"نام فعلی: {category['name']}\n\n"
+                f"لطفاً نام جدید را وارد کنید:",
                 None
             )
-        
-        # لیست کتاب‌ها برای ادمین
-        elif data == "admin_list_books":
-            try:
-                books = get_all_books()
-            except Exception as e:
-                logger.error(f"خطا در دریافت لیست کتاب‌ها: {e}")
-                books = []
-            
-            if not books:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📭 هیچ کتابی ثبت نشده است.",
-                    admin_menu_markup()
-                )
-                return
-            
-            text = "📚 لیست کتاب‌ها:\n\n"
-            for book in books[:10]:  # فقط 10 کتاب اول
-                text += f"#️⃣ {book['book_id']}: {book['title']}\n"
-                text += f"   ✍️ {book['author']}\n"
-                text += f"   💰 {book['price']:,} تومان\n"
-                text += f"   🏷️ {book.get('category_name', 'بدون دسته')}\n"
-                text += "─" * 20 + "\n"
-            
-            if len(books) > 10:
-                text += f"\n📊 و {len(books) - 10} کتاب دیگر..."
-            
+        else:
+            bot.answer_callback_query(call.id, "دسته‌بندی یافت نشد!")
+    except Exception as e:
+        logger.error("خطا در دریافت دسته‌بندی: %s", e)
+        bot.answer_callback_query(call.id, "❌ خطا در دریافت اطلاعات")
+
+
+# تأیید حذف دسته‌بندی
+@router.route("admin_delete_cat_confirm_", prefix=True)
+def cb_admin_delete_cat_confirm(call, user_id, category_id):
+    try:
+        category = get_category_by_id(category_id)
+    except Exception as e:
+        logger.error("خطا در دریافت دسته‌بندی برای تأیید حذف: %s", e)
+        category = None
+
+    if not category:
+        bot.answer_callback_query(call.id, "دسته‌بندی یافت نشد!")
+        return
+
+    # بررسی اینکه آیا کتابی در این دسته‌بندی وجود دارد
+    try:
+        books_in_category = get_books_by_category(category_id)
+    except Exception as e:
+        logger.error("خطا در بررسی کتاب‌های دسته‌بندی: %s", e)
+        books_in_category = []
+
+    text = f"⚠️ **تأیید حذف دسته‌بندی**\n\n"
+    text += f"📁 نام: {category['name']}\n"
+    text += f"📚 تعداد کتاب در این دسته: {len(books_in_category)}\n\n"
+    text += "با حذف این دسته‌بندی:\n"
+    text += "• تمام کتاب‌های این دسته بدون دسته‌بندی خواهند شد\n"
+    text += "• این عمل غیرقابل بازگشت است!\n\n"
+    text += "آیا مطمئن هستید؟"
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        confirm_delete_category_markup(category_id)
+    )
+
+
+# حذف نهایی دسته‌بندی
+@router.route("admin_delete_cat_final_", prefix=True)
+def cb_admin_delete_cat_final(call, user_id, category_id):
+
+    try:
+        # ابتدا کتاب‌های این دسته را بدون دسته‌بندی کنیم
+        books_in_category = get_books_by_category(category_id)
+        for book in books_in_category:
+            update_book(book['book_id'], category_id=None)
+
+        # سپس دسته‌بندی را حذف کنیم
+        if delete_category(category_id):
+            bot.answer_callback_query(call.id, "✅ دسته‌بندی با موفقیت حذف شد")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                text,
+                f"✅ دسته‌بندی با موفقیت حذف شد.\n"
+                f"📚 {len(books_in_category)} کتاب به حالت بدون دسته‌بندی تغییر کردند.",
                 admin_menu_markup()
             )
-        
-        # سفارشات در انتظار
-        elif data == "admin_pending_orders":
-            try:
-                orders = get_pending_orders()
-            except Exception as e:
-                logger.error(f"خطا در دریافت سفارشات در انتظار: {e}")
-                orders = []
-            
-            if not orders:
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "✅ هیچ سفارش در انتظاری وجود ندارد.",
-                    admin_menu_markup()
-                )
-                return
-            
-            for order in orders:
-                try:
-                    items = get_order_items(order['order_id'])
-                except Exception as e:
-                    logger.error(f"خطا در دریافت آیتم‌های سفارش: {e}")
-                    items = []
-                
-                text = (
-                    f"📦 سفارش جدید\n\n"
-                    f"🆔 کد سفارش: {order['order_id']}\n"
-                    f"👤 کاربر: {order['user_id']}\n"
-                    f"📞 تلفن: {order['phone']}\n"
-                    f"🏠 آدرس: {order['address']}\n"
-                    f"📮 کد پستی: {order['postal_code']}\n"
-                    f"💰 مبلغ کل: {order['total_price']:,} تومان\n\n"
-                    f"📚 کتاب‌ها:\n"
-                )
-                
-                for item in items:
-                    text += f"• {item['title']} - {item['count']} عدد\n"
-                
-                mk = InlineKeyboardMarkup(row_width=2)
-                mk.add(
-                    InlineKeyboardButton("✅ تایید", callback_data=f"approve_{order['order_id']}"),
-                    InlineKeyboardButton("❌ رد", callback_data=f"reject_{order['order_id']}")
-                )
-                
-                bot.send_message(user_id, text, reply_markup=mk)
-            
+        else:
+            bot.answer_callback_query(call.id, "❌ خطا در حذف دسته‌بندی")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                f"📊 {len(orders)} سفارش در انتظار تایید ارسال شد.",
+                "❌ خطا در حذف دسته‌بندی!",
                 admin_menu_markup()
             )
-        
-        # تایید/رد سفارش
-        elif data.startswith("approve_") or data.startswith("reject_"):
-            action, order_id = data.split("_")
-            order_id = int(order_id)
-            
-            try:
-                if action == "approve":
-                    update_order_status(order_id, "approved")
-                    bot.answer_callback_query(call.id, "✅ سفارش تایید شد")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        "✅ سفارش تایید شد.",
-                        None
-                    )
-                else:
-                    update_order_status(order_id, "rejected")
-                    bot.answer_callback_query(call.id, "❌ سفارش رد شد")
-                    send_or_edit_message(
-                        bot, user_id, call.message.message_id, call.message.content_type,
-                        "❌ سفارش رد شد.",
-                        None
-                    )
-            except Exception as e:
-                logger.error(f"خطا در آپدیت وضعیت سفارش: {e}")
-                bot.answer_callback_query(call.id, "❌ خطا در عملیات")
-        
-        # اضافه کردن ادمین
-        elif data == "admin_add_admin":
-            user_states[user_id] = {"step": "admin_add_admin_id"}
+    except Exception as e:
+        logger.error("خطا در حذف دسته‌بندی: %s", e)
+        bot.answer_callback_query(call.id, "❌ خطا در عملیات")
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            f"❌ خطا در حذف دسته‌بندی: {e}",
+            admin_menu_markup()
+        )
+
+
+# اضافه کردن دسته‌بندی
+@router.route("admin_add_category")
+def cb_admin_add_category(call, user_id):
+    user_states[user_id] = {"step": "admin_add_category_name"}
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        "🗂️ اضافه کردن دسته‌بندی جدید\n\nلطفاً نام دسته‌بندی را وارد کنید:",
+        None
+    )
+
+
+# لیست کتاب‌ها برای ادمین
+@router.route("admin_list_books")
+def cb_admin_list_books(call, user_id):
+    try:
+        books = get_books_page(10)  # فقط 10 کتاب اول
+        total = count_active_books()
+    except Exception as e:
+        logger.error("خطا در دریافت لیست کتاب‌ها: %s", e)
+        books = []
+        total = 0
+
+    if not books:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📭 هیچ کتابی ثبت نشده است.",
+            admin_menu_markup()
+        )
+        return
+
+    text = "📚 لیست کتاب‌ها:\n\n"
+    for book in books:
+        text += f"#️⃣ {book['book_id']}: {book['title']}\n"
+        text += f"   ✍️ {book['author']}\n"
+        text += f"   💰 {book['price']:,} تومان\n"
+        text += f"   🏷️ {book.get('category_name', 'بدون دسته')}\n"
+        text += "─" * 20 + "\n"
+
+    if total > len(books):
+        text += f"\n📊 و {total - len(books)} کتاب دیگر..."
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        text,
+        admin_menu_markup()
+    )
+
+
+# سفارشات در انتظار
+@router.route("admin_pending_orders")
+@router.route("admin_pending_page_", prefix=True)
+def cb_admin_pending_orders(call, user_id, page=1):
+    try:
+        total = count_pending_orders()
+        orders = get_pending_orders_with_items(
+            ADMIN_PENDING_ORDERS_PER_PAGE,
+            offset=(page - 1) * ADMIN_PENDING_ORDERS_PER_PAGE
+        )
+    except Exception as e:
+        logger.error("خطا در دریافت سفارشات در انتظار: %s", e)
+        total = 0
+        orders = []
+
+    if not orders:
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "✅ هیچ سفارش در انتظاری وجود ندارد.",
+            admin_menu_markup()
+        )
+        return
+
+    for order in orders:
+        text = (
+            f"📦 سفارش جدید\n\n"
+            f"🆔 کد سفارش: {order['order_id']}\n"
+            f"👤 کاربر: {order['user_id']}\n"
+            f"📞 تلفن: {order['phone']}\n"
+            f"🏠 آدرس: {order['address']}\n"
+            f"📮 کد پستی: {order['postal_code']}\n"
+            f"💰 مبلغ کل: {order['total_price']:,} تومان\n\n"
+            f"📚 کتاب‌ها:\n"
+        )
+
+        for item in order['items']:
+            text += f"• {item['title']} - {item['count']} عدد\n"
+
+        mk = InlineKeyboardMarkup(row_width=2)
+        mk.add(
+            InlineKeyboardButton("✅ تایید", callback_data=f"approve_{order['order_id']}"),
+            InlineKeyboardButton("❌ رد", callback_data=f"reject_{order['order_id']}")
+        )
+
+        bot.send_message(user_id, text, reply_markup=mk)
+
+    pages = page_count(total, ADMIN_PENDING_ORDERS_PER_PAGE)
+    mk = InlineKeyboardMarkup(row_width=1)
+    if page < pages:
+        mk.add(InlineKeyboardButton("بعدی ➡️", callback_data=f"admin_pending_page_{page + 1}"))
+    mk.add(InlineKeyboardButton("🔙 بازگشت", callback_data="home"))
+
+    # لیست صفحه جدید زیر سفارش‌ها ارسال می‌شود، پس پیام خلاصه هم پیام جدید است
+    bot.send_message(
+        user_id,
+        f"📊 {len(orders)} سفارش از {total} سفارش در انتظار تایید ارسال شد "
+        f"(صفحه {page} از {pages}).",
+        reply_markup=mk
+    )
+
+
+# تایید/رد سفارش
+@router.route("approve_", "reject_", prefix=True)
+def cb_order_status(call, user_id, order_id):
+    if not check_admin_with_fallback(user_id):
+        bot.answer_callback_query(call.id, "⛔ دسترسی رد شد!")
+        return
+
+    action = call.data.split("_")[0]
+
+    try:
+        new_status = "approved" if action == "approve" else "rejected"
+        if not update_order_status(order_id, new_status):
+            # سفارش رد شده (موجودی آزاد شده) دوباره قابل تغییر نیست
+            bot.answer_callback_query(call.id, "⚠️ وضعیت این سفارش قابل تغییر نیست")
+        elif action == "approve":
+            bot.answer_callback_query(call.id, "✅ سفارش تایید شد")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                "➕ اضافه کردن ادمین جدید\n\nلطفاً آیدی عددی کاربر را وارد کنید:",
+                "✅ سفارش تایید شد.",
                 None
             )
-        
-        # آپلود عکس جدید برای کتاب (بعد از ویرایش)
-        elif data.startswith("admin_update_photo_"):
-            book_id = int(data.split("_")[3])
-            user_states[user_id] = {
-                "step": "admin_update_book_photo",
-                "data": {"book_id": book_id}
-            }
-            
+        else:
+            bot.answer_callback_query(call.id, "❌ سفارش رد شد")
             send_or_edit_message(
                 bot, user_id, call.message.message_id, call.message.content_type,
-                f"📸 آپلود عکس جدید برای کتاب #{book_id}\n\n"
-                f"لطفاً عکس جدید جلد کتاب را ارسال کنید:",
+                "❌ سفارش رد شد.",
                 None
             )
-        
-        # رد کردن آپلود عکس جدید
-        elif data.startswith("admin_skip_photo_"):
-            book_id = int(data.split("_")[3])
-            bot.answer_callback_query(call.id, "⏭️ آپلود عکس رد شد")
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                f"✅ ویرایش کتاب #{book_id} کامل شد (بدون تغییر عکس).",
-                admin_menu_markup()
-            )
-        
-        #  HANDLE CATEGORY SELECTION 
-        elif data.startswith('admin_select_category_') or data == 'admin_no_category':
-            logger.info(f"Category selection callback - Data: {data}")
-            bot.answer_callback_query(call.id, "در حال پردازش...")
-            
-            if user_id not in user_states:
-                bot.answer_callback_query(call.id, "❌ session منقضی شده")
-                return
-            
-            state = user_states[user_id]
-            
-            if state.get("step") != "admin_add_book_category":
-                logger.warning(f"Wrong step for category selection. Step: {state.get('step')}")
-                bot.answer_callback_query(call.id, "❌ مرحله اشتباه")
-                return
-            
-            if data.startswith('admin_select_category_'):
-                category_id = int(data.split('_')[-1])
-                state["data"]["category_id"] = category_id
-                
-                # دریافت نام دسته‌بندی
-                try:
-                    category = get_category_by_id(category_id)
-                    category_name = category['name'] if category else "نامشخص"
-                except Exception as e:
-                    logger.error(f"خطا در دریافت دسته‌بندی: {e}")
-                    category_name = "نامشخص"
-                
-                logger.info(f"Category selected: {category_name} (ID: {category_id})")
-                
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    f"✅ دسته‌بندی انتخاب شد: {category_name}\n\n📸 لطفاً عکس جلد کتاب را ارسال کنید:",
-                    None
-                )
-                
-            elif data == "admin_no_category":
-                logger.info("No category selected")
-                send_or_edit_message(
-                    bot, user_id, call.message.message_id, call.message.content_type,
-                    "📸 لطفاً عکس جلد کتاب را ارسال کنید:\n\n⚠️ توجه: کتاب بدون دسته‌بندی ذخیره می‌شود",
-                    None
-                )
-            
-            # رفتن به مرحله بعد 
-            state["step"] = "admin_add_book_photo"
-            bot.answer_callback_query(call.id, "✅ دسته‌بندی ثبت شد")
-        
-        # مدیریت انتخاب دسته‌بندی در ویرایش
-        elif data.startswith('admin_edit_select_category_') or data == 'admin_edit_no_category':
-            logger.info(f"Edit category selection callback - Data: {data}")
-            bot.answer_callback_query(call.id, "در حال پردازش...")
-            
-            if user_id not in user_states:
-                bot.answer_callback_query(call.id, "❌ session منقضی شده")
-                return
-            
-            state = user_states[user_id]
-            
-            if state.get("step") != "admin_edit_book_category":
-                logger.warning(f"Wrong step for edit category selection. Step: {state.get('step')}")
-                bot.answer_callback_query(call.id, "❌ مرحله اشتباه")
-                return
-            
-            if data.startswith('admin_edit_select_category_'):
-                category_id = int(data.split('_')[-1])
-                state["data"]["category_id"] = category_id
-            elif data == "admin_edit_no_category":
-                state["data"]["category_id"] = None
-            
-            # درخواست آپلود عکس جدید
-            book_id = state["data"]["book_id"]
-            send_or_edit_message(
-                bot, user_id, call.message.message_id, call.message.content_type,
-                f"✅ اطلاعات کتاب ویرایش شد!\n\n"
-                f"آیا می‌خواهید عکس جلد کتاب را نیز تغییر دهید؟",
-                update_photo_markup(book_id)
-            )
-    
     except Exception as e:
-        logger.error(f"Error in callback handler: {e}", exc_info=True)
+        logger.error("خطا در آپدیت وضعیت سفارش: %s", e)
+        bot.answer_callback_query(call.id, "❌ خطا در عملیات")
+
+
+# اضافه کردن ادمین
+@router.route("admin_add_admin")
+def cb_admin_add_admin(call, user_id):
+    user_states[user_id] = {"step": "admin_add_admin_id"}
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        "➕ اضافه کردن ادمین جدید\n\nلطفاً آیدی عددی کاربر را وارد کنید:",
+        None
+    )
+
+
+# آپلود عکس جدید برای کتاب (بعد از ویرایش)
+@router.route("admin_update_photo_", prefix=True)
+def cb_admin_update_photo(call, user_id, book_id):
+    user_states[user_id] = {
+        "step": "admin_update_book_photo",
+        "data": {"book_id": book_id}
+    }
+
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        f"📸 آپلود عکس جدید برای کتاب #{book_id}\n\n"
+        f"لطفاً عکس جدید جلد کتاب را ارسال کنید:",
+        None
+    )
+
+
+# رد کردن آپلود عکس جدید
+@router.route("admin_skip_photo_", prefix=True)
+def cb_admin_skip_photo(call, user_id, book_id):
+    bot.answer_callback_query(call.id, "⏭️ آپلود عکس رد شد")
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        f"✅ ویرایش کتاب #{book_id} کامل شد (بدون تغییر عکس).",
+        admin_menu_markup()
+    )
+
+
+#  HANDLE CATEGORY SELECTION
+@router.route("admin_no_category")
+@router.route("admin_select_category_", prefix=True)
+def cb_admin_select_category(call, user_id, category_id=None):
+    data = call.data
+    logger.debug("Category selection callback - Data: %s", data)
+    bot.answer_callback_query(call.id, "در حال پردازش...")
+
+    state = user_states.get(user_id)
+    if state is None:
+        bot.answer_callback_query(call.id, "❌ session منقضی شده")
+        return
+
+    if state.get("step") != "admin_add_book_category":
+        logger.warning("Wrong step for category selection. Step: %s", state.get('step'))
+        bot.answer_callback_query(call.id, "❌ مرحله اشتباه")
+        return
+
+    if data.startswith('admin_select_category_'):
+        state["data"]["category_id"] = category_id
+
+        # دریافت نام دسته‌بندی
         try:
-            bot.answer_callback_query(call.id, "❌ خطایی رخ داد")
-        except:
-            pass
+            category = get_category_by_id(category_id)
+            category_name = category['name'] if category else "نامشخص"
+        except Exception as e:
+            logger.error("خطا در دریافت دسته‌بندی: %s", e)
+            category_name = "نامشخص"
+
+        logger.debug("Category selected: %s (ID: %s)", category_name, category_id)
+
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            f"✅ دسته‌بندی انتخاب شد: {category_name}\n\n📸 لطفاً عکس جلد کتاب را ارسال کنید:",
+            None
+        )
+
+    elif data == "admin_no_category":
+        logger.debug("No category selected")
+        send_or_edit_message(
+            bot, user_id, call.message.message_id, call.message.content_type,
+            "📸 لطفاً عکس جلد کتاب را ارسال کنید:\n\n⚠️ توجه: کتاب بدون دسته‌بندی ذخیره می‌شود",
+            None
+        )
+
+    # رفتن به مرحله بعد 
+    state["step"] = "admin_add_book_photo"
+    user_states.commit(user_id, state)
+    bot.answer_callback_query(call.id, "✅ دسته‌بندی ثبت شد")
+
+
+# مدیریت انتخاب دسته‌بندی در ویرایش
+@router.route("admin_edit_no_category")
+@router.route("admin_edit_select_category_", prefix=True)
+def cb_admin_edit_select_category(call, user_id, category_id=None):
+    data = call.data
+    logger.debug("Edit category selection callback - Data: %s", data)
+    bot.answer_callback_query(call.id, "در حال پردازش...")
+
+    state = user_states.get(user_id)
+    if state is None:
+        bot.answer_callback_query(call.id, "❌ session منقضی شده")
+        return
+
+    if state.get("step") != "admin_edit_book_category":
+        logger.warning("Wrong step for edit category selection. Step: %s", state.get('step'))
+        bot.answer_callback_query(call.id, "❌ مرحله اشتباه")
+        return
+
+    if data.startswith('admin_edit_select_category_'):
+        state["data"]["category_id"] = category_id
+    elif data == "admin_edit_no_category":
+        state["data"]["category_id"] = None
+    user_states.commit(user_id, state)
+
+    # درخواست آپلود عکس جدید
+    book_id = state["data"]["book_id"]
+    send_or_edit_message(
+        bot, user_id, call.message.message_id, call.message.content_type,
+        f"✅ اطلاعات کتاب ویرایش شد!\n\n"
+        f"آیا می‌خواهید عکس جلد کتاب را نیز تغییر دهید؟",
+        update_photo_markup(book_id)
+    )
+
 
 #  MESSAGE HANDLER 
 
@@ -1563,12 +1724,12 @@ def handle_message(message):
     user_id = message.chat.id
     text = message.text if message.text else ""
     
-    logger.info(f"📨 پیام از {user_id}: {text[:50]}...")
+    logger.info("📨 پیام از %s: %.50s...", user_id, text, extra=sampled("message"))
     
     # اگر کاربر در حال ثبت سفارش است
-    if user_id in user_states:
-        state = user_states[user_id]
-        logger.info(f"User state: {state}")
+    state = user_states.get(user_id)
+    if state is not None:
+        logger.debug("User state: %s", state)
         
         # دریافت شماره تلفن
         if state["step"] == "checkout_phone":
@@ -1602,11 +1763,9 @@ def handle_message(message):
             state["step"] = "checkout_receipt"
             
             try:
-                cart_items = get_user_cart(user_id)
-                total = get_cart_total(user_id)
+                total = get_cart_snapshot(user_id)["total"]
             except Exception as e:
-                logger.error(f"خطا در دریافت سبد خرید: {e}")
-                cart_items = []
+                logger.error("خطا در دریافت سبد خرید: %s", e)
                 total = 0
             
             bot.send_message(
@@ -1624,13 +1783,9 @@ def handle_message(message):
             file_id = message.photo[-1].file_id
             
             try:
-                # ایجاد سفارش
-                cart_items = get_user_cart(user_id)
-                total = get_cart_total(user_id)
-                
-                order_id = create_order(
+                # ثبت سفارش، آیتم‌ها، اطلاعات کاربر و خالی کردن سبد در یک تراکنش
+                order_id, total = checkout_order(
                     user_id,
-                    total,
                     file_id,
                     state.get("data", {}).get("phone"),
                     state.get("data", {}).get("address"),
@@ -1638,28 +1793,6 @@ def handle_message(message):
                 )
                 
                 if order_id:
-                    # اضافه کردن آیتم‌های سفارش
-                    for item in cart_items:
-                        add_order_item(
-                            order_id,
-                            item['book_id'],
-                            item['title'],
-                            item['author'],
-                            item['price'],
-                            item['count']
-                        )
-                    
-                    # ✅ ذخیره اطلاعات کاربر در دیتابیس
-                    save_user(
-                        user_id,
-                        phone=state.get("data", {}).get("phone"),
-                        address=state.get("data", {}).get("address"),
-                        postal_code=state.get("data", {}).get("postal")
-                    )
-                    
-                    # پاک کردن سبد خرید
-                    clear_user_cart(user_id)
-                    
                     # ارسال به ادمین
                     admin_text = (
                         f"📦 سفارش جدید\n\n"
@@ -1692,8 +1825,16 @@ def handle_message(message):
                         reply_markup=main_menu_markup()
                     )
                 
+            except OutOfStockError as e:
+                bot.send_message(
+                    user_id,
+                    "❌ موجودی این کتاب‌ها برای ثبت سفارش کافی نیست:\n"
+                    + "\n".join(f"• {title}" for title in e.titles)
+                    + "\n\nلطفاً سبد خرید خود را اصلاح کنید.",
+                    reply_markup=main_menu_markup()
+                )
             except Exception as e:
-                logger.error(f"خطا در ثبت سفارش: {e}")
+                logger.error("خطا در ثبت سفارش: %s", e)
                 bot.send_message(
                     user_id,
                     "❌ خطا در پردازش سفارش! لطفاً بعداً تلاش کنید.",
@@ -1701,15 +1842,14 @@ def handle_message(message):
                 )
             
             # پاک کردن حالت کاربر
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         # جستجوی کتاب
         elif state["step"] == "search_query":
             try:
                 books = search_books(text)
             except Exception as e:
-                logger.error(f"خطا در جستجوی کتاب: {e}")
+                logger.error("خطا در جستجوی کتاب: %s", e)
                 books = []
             
             if not books:
@@ -1732,8 +1872,7 @@ def handle_message(message):
                     reply_markup=books_markup(books[:5])
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         #  ADMIN 
         
@@ -1760,22 +1899,33 @@ def handle_message(message):
             try:
                 price = int(text.replace(",", ""))
                 state["data"]["price"] = price
+                state["step"] = "admin_add_book_stock"
+                bot.send_message(user_id, "📦 لطفاً تعداد موجودی کتاب را وارد کنید:")
+            except ValueError:
+                bot.send_message(user_id, "❌ قیمت باید عددی باشد. لطفاً مجدداً وارد کنید:")
+        
+        # اضافه کردن کتاب - مرحله موجودی
+        elif state["step"] == "admin_add_book_stock":
+            try:
+                stock = int(text.replace(",", ""))
+                if stock < 0:
+                    raise ValueError
+                state["data"]["stock"] = stock
                 
-                logger.info(f"Price received: {price}, moving to category selection")
+                logger.debug("Stock received: %s, moving to category selection", stock)
                 
                 # نمایش دسته‌بندی‌ها برای انتخاب
                 try:
                     categories = get_all_categories()
                 except Exception as e:
-                    logger.error(f"خطا در دریافت دسته‌بندی‌ها: {e}")
+                    logger.error("خطا در دریافت دسته‌بندی‌ها: %s", e)
                     categories = []
                     
-                logger.info(f"Categories found: {len(categories)}")
+                logger.debug("Categories found: %s", len(categories))
                 
                 if not categories:
                     bot.send_message(user_id, "⚠️ هیچ دسته‌بندی وجود ندارد. اول یک دسته‌بندی اضافه کنید.")
-                    if user_id in user_states:
-                        del user_states[user_id]
+                    user_states.discard(user_id)
                     return
                 
                 #  کیبورد دسته‌بندی‌ها
@@ -1786,10 +1936,10 @@ def handle_message(message):
                 )
                 
                 state["step"] = "admin_add_book_category"
-                logger.info(f"State updated: {state}")
+                logger.debug("State updated: %s", state)
                 
             except ValueError:
-                bot.send_message(user_id, "❌ قیمت باید عددی باشد. لطفاً مجدداً وارد کنید:")
+                bot.send_message(user_id, "❌ موجودی باید عددی و نامنفی باشد. لطفاً مجدداً وارد کنید:")
         
         # اضافه کردن کتاب - مرحله عکس
         elif state["step"] == "admin_add_book_photo" and message.content_type == 'photo':
@@ -1804,7 +1954,8 @@ def handle_message(message):
                     description=state["data"]["description"],
                     price=state["data"]["price"],
                     category_id=state["data"].get("category_id"),
-                    file_id=file_id
+                    file_id=file_id,
+                    stock=state["data"].get("stock", 1)
                 )
                 
                 if book_id:
@@ -1816,7 +1967,7 @@ def handle_message(message):
                             if category:
                                 category_text = f"\n🏷️ دسته‌بندی: {category['name']}"
                         except Exception as e:
-                            logger.error(f"خطا در دریافت اطلاعات دسته‌بندی: {e}")
+                            logger.error("خطا در دریافت اطلاعات دسته‌بندی: %s", e)
                     
                     bot.send_message(
                         user_id,
@@ -1827,7 +1978,7 @@ def handle_message(message):
                         f"{category_text}",
                         reply_markup=admin_menu_markup()
                     )
-                    logger.info(f"Book added successfully: {state['data']['title']}")
+                    logger.info("Book added successfully: %s", state['data']['title'])
                 else:
                     bot.send_message(
                         user_id,
@@ -1837,15 +1988,14 @@ def handle_message(message):
                     logger.error("Failed to add book")
                 
             except Exception as e:
-                logger.error(f"خطا در اضافه کردن کتاب: {e}")
+                logger.error("خطا در اضافه کردن کتاب: %s", e)
                 bot.send_message(
                     user_id,
                     f"❌ خطا در اضافه کردن کتاب: {e}",
                     reply_markup=admin_menu_markup()
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         # ویرایش کتاب - مرحله عنوان
         elif state["step"] == "admin_edit_book_title":
@@ -1875,7 +2025,7 @@ def handle_message(message):
             try:
                 categories = get_all_categories()
             except Exception as e:
-                logger.error(f"خطا در دریافت دسته‌بندی‌ها: {e}")
+                logger.error("خطا در دریافت دسته‌بندی‌ها: %s", e)
                 categories = []
             
             if categories:
@@ -1907,7 +2057,7 @@ def handle_message(message):
                         f"✅ عکس جدید برای کتاب #{book_id} با موفقیت آپلود شد!",
                         reply_markup=admin_menu_markup()
                     )
-                    logger.info(f"Book photo updated for book #{book_id}")
+                    logger.info("Book photo updated for book #%s", book_id)
                 else:
                     bot.send_message(
                         user_id,
@@ -1915,15 +2065,14 @@ def handle_message(message):
                         reply_markup=admin_menu_markup()
                     )
             except Exception as e:
-                logger.error(f"خطا در آپلود عکس جدید: {e}")
+                logger.error("خطا در آپلود عکس جدید: %s", e)
                 bot.send_message(
                     user_id,
                     f"❌ خطا در آپلود عکس: {e}",
                     reply_markup=admin_menu_markup()
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         # ویرایش نام دسته‌بندی
         elif state["step"] == "admin_edit_category_name":
@@ -1954,15 +2103,14 @@ def handle_message(message):
                         reply_markup=admin_menu_markup()
                     )
             except Exception as e:
-                logger.error(f"خطا در ویرایش نام دسته‌بندی: {e}")
+                logger.error("خطا در ویرایش نام دسته‌بندی: %s", e)
                 bot.send_message(
                     user_id,
                     f"❌ خطا در ویرایش نام دسته‌بندی: {e}",
                     reply_markup=admin_menu_markup()
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         # اضافه کردن دسته‌بندی
         elif state["step"] == "admin_add_category_name":
@@ -1982,15 +2130,14 @@ def handle_message(message):
                         reply_markup=admin_menu_markup()
                     )
             except Exception as e:
-                logger.error(f"خطا در اضافه کردن دسته‌بندی: {e}")
+                logger.error("خطا در اضافه کردن دسته‌بندی: %s", e)
                 bot.send_message(
                     user_id,
                     f"❌ خطا در اضافه کردن دسته‌بندی: {e}",
                     reply_markup=admin_menu_markup()
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
         
         # اضافه کردن ادمین
         elif state["step"] == "admin_add_admin_id":
@@ -2015,15 +2162,17 @@ def handle_message(message):
                     reply_markup=admin_menu_markup()
                 )
             except Exception as e:
-                logger.error(f"خطا در اضافه کردن ادمین: {e}")
+                logger.error("خطا در اضافه کردن ادمین: %s", e)
                 bot.send_message(
                     user_id,
                     f"❌ خطا در عملیات: {e}",
                     reply_markup=admin_menu_markup()
                 )
             
-            if user_id in user_states:
-                del user_states[user_id]
+            user_states.discard(user_id)
+
+        # ذخیره تغییرات مرحله (در backend ماندگار state یک کپی است)
+        user_states.commit(user_id, state)
     
     else:
         # اگر کاربر سلام کرده
@@ -2061,35 +2210,21 @@ if __name__ == "__main__":
         print("❌ BOT_TOKEN پیدا نشد!")
         sys.exit(1)
     
+    # docker stop / systemd مثل Ctrl+C از مسیر خاموشی می‌گذرند
+    handle_sigterm()
+    
     print(f"🤖 شناسه ربات: {BOT_TOKEN[:15]}...")
     print(f"👨‍💼 ادمین اصلی: {ADMIN_ID}")
     
-    # چک اتصال دیتابیس
-    print("🔄 تست اتصال دیتابیس...")
-    try:
-        from database import get_db_connection
-        conn = get_db_connection()
-        if conn:
-            print("✅ اتصال دیتابیس موفق!")
-            conn.close()
-        else:
-            print("⚠️ اتصال دیتابیس ناموفق - استفاده از حالت fallback")
-    except Exception as e:
-        print(f"⚠️ خطا در تست دیتابیس: {e}")
-    
+    # endpoint متریک‌ها قبل از بررسی‌ها بالا می‌آید تا وضعیت checking هم دیده شود
+    metrics.start_metrics_server()
     
-    print("🔍 بررسی/اضافه کردن ادمین اصلی...")
-    try:
-        if ADMIN_ID and not is_admin(ADMIN_ID):
-            print(f"➕ اضافه کردن ادمین {ADMIN_ID}...")
-            if add_admin(ADMIN_ID, "مدیر اصلی", True):
-                print("✅ ادمین اضافه شد")
-            else:
-                print("⚠️ خطا در اضافه کردن ادمین")
-        else:
-            print("✅ ادمین از قبل وجود دارد")
-    except Exception as e:
-        print(f"⚠️ خطا در بررسی/اضافه کردن ادمین: {e}")
+    # دیتابیس، تلگرام و ادمین‌ها به صورت هم‌زمان بررسی می‌شوند (بدون sleep)
+    print("🔄 بررسی‌های شروع...")
+    if startup(BOT_MODE):
+        print(f"✅ ربات آماده است ({readiness.ready_after * 1000:.0f}ms)")
+    else:
+        print("⚠️ بعضی بررسی‌ها ناموفق بودند؛ ربات در حالت degraded شروع می‌شود")
         print(f"✅ استفاده از fallback admin: {FALLBACK_ADMINS}")
     
     
@@ -2097,51 +2232,32 @@ if __name__ == "__main__":
     print("🚀 شروع ربات تلگرام...")
     print("=" * 60)
     
-    max_retries = 5
-    retry_delay = 10
-    
-    for attempt in range(max_retries):
+    # حالت webhook: update ها از تلگرام به سرور HTTP خود ربات ارسال می‌شوند
+    if BOT_MODE == "webhook":
         try:
-            print(f"🔄 تلاش برای شروع polling (تلاش {attempt + 1}/{max_retries})...")
-            
-            
-            time.sleep(3)
-            
-            # شروع polling
-            bot.infinity_polling(
-                timeout=60,
-                long_polling_timeout=60,
-                skip_pending=True,
-                allowed_updates=["message", "callback_query"]
-            )
-            
-        except telebot.apihelper.ApiTelegramException as e:
-            if "409" in str(e):
-                print(f"⚠️ خطای 409: {e}")
-                print("⏳ انتظار برای رفع تداخل...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  
-                
-                
-                try:
-                    bot.stop_polling()
-                except:
-                    pass
-                    
-                if attempt == max_retries - 1:
-                    print("💥 تمام تلاش‌ها ناموفق بود - خطای 409 حل نشد")
-                    print("📌 راه‌حل: مطمئن شوید فقط یک نمونه از ربات در حال اجراست")
-                    break
-            else:
-                print(f"❌ خطای تلگرام: {e}")
-                break
-                
+            run_webhook(bot)
+        except ValueError as e:
+            # تنظیمات ناامن (مثلاً webhook بدون توکن مخفی)
+            print(f"❌ {e}")
+            sys.exit(1)
         except KeyboardInterrupt:
             print("\n🛑 ربات توسط کاربر متوقف شد")
-            break
-            
-        except Exception as e:
-            print(f"❌ خطای غیرمنتظره: {e}")
-            time.sleep(5)
-            
+        shutdown()
+        print("👋 ربات خاموش شد")
+        sys.exit(0)
+    
+    # تداخل webhook قبل از شروع در بررسی telegram حل شده؛ 409 های حین اجرا
+    # به ConflictHandler می‌رسند و بقیه خطاها با backoff خود infinity_polling تکرار می‌شوند
+    bot.exception_handler = ConflictHandler(bot)
+    try:
+        bot.infinity_polling(
+            timeout=60,
+            long_polling_timeout=60,
+            skip_pending=True,
+            allowed_updates=["message", "callback_query"]
+        )
+    except KeyboardInterrupt:
+        print("\n🛑 ربات توسط کاربر متوقف شد")
+    
+    shutdown()
     print("👋 ربات خاموش شد")
\ No newline at end of file
@@ -0,0 +1,311 @@
+import bisect
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# endpoint متریک‌ها (فرمت متنی Prometheus)؛ با METRICS_PORT=0 خاموش می‌شود
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# bucket های پیش‌فرض histogram (ثانیه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    """عدد در فرمت Prometheus (+Inf، NaN، عدد صحیح بدون اعشار)"""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _escape_help(text):
+    return text.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+#  METRICS
+class _Metric:
+    """پایه متریک‌ها؛ مقدار هر ترکیب برچسب جدا نگه داشته می‌شود"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"برچسب‌های {self.name} باید {self.labelnames} باشند: {tuple(labels)}")
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            raise ValueError(f"برچسب‌های {self.name} باید {self.labelnames} باشند: {tuple(labels)}")
+
+    def samples(self):
+        """خروجی (پسوند نام، برچسب‌ها، مقدار) برای هر سری"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", tuple(zip(self.labelnames, key)), value
+
+
+class Counter(_Metric):
+    """شمارنده فقط‌افزایشی"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """مقداری که بالا و پایین می‌رود"""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """توزیع مقادیر (معمولاً زمان به ثانیه) در bucket های ثابت"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [تعداد هر bucket (غیرتجمعی، آخری +Inf)، مجموع، تعداد]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield "_bucket", labels + (("le", format_value(float(bound))),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+#  REGISTRY
+class Registry:
+    """مجموعه متریک‌ها و collector ها و خروجی متنی آن‌ها
+
+    collector ها تابع‌هایی هستند که موقع هر scrape صدا زده می‌شوند و آمار
+    موجود (stats() ها) را به صورت (نام، نوع، توضیح، [(برچسب‌ها، مقدار)]) برمی‌گردانند؛
+    پس برای اعداد تجمعی که جای دیگری نگه داشته می‌شوند هزینه‌ای در مسیر update نیست.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"متریک تکراری: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self):
+        """همه خانواده‌های متریک: (نام، نوع، توضیح، [(پسوند، برچسب‌ها، مقدار)])"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            yield metric.name, metric.type, metric.documentation, list(metric.samples())
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning("⚠️ خطا در جمع‌آوری متریک (%s): %s", getattr(collector, '__name__', collector), e)
+                continue
+            for name, metric_type, documentation, samples in families:
+                yield name, metric_type, documentation, [("", tuple(labels), value) for labels, value in samples]
+
+    def render(self):
+        """خروجی در فرمت متنی Prometheus (text exposition 0.0.4)"""
+        lines = []
+        for name, metric_type, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape_help(documentation)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    """ساخت و ثبت Counter در registry پیش‌فرض"""
+    return registry.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    """ساخت و ثبت Gauge در registry پیش‌فرض"""
+    return registry.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """ساخت و ثبت Histogram در registry پیش‌فرض"""
+    return registry.histogram(name, documentation, labelnames, buckets)
+
+
+def register_stats(prefix, stats_func, counters=(), gauges=(), labels=()):
+    """تبدیل خروجی یک تابع stats() به متریک در زمان scrape
+
+    counters و gauges کلیدهای dict آمار (یا (کلید، نام)) هستند؛ نام متریک prefix_نام است
+    (با پسوند _total برای counter ها). اگر stats_func None برگرداند چیزی ثبت نمی‌شود.
+    """
+    labels = tuple(labels)
+    counters = [key if isinstance(key, tuple) else (key, key) for key in counters]
+    gauges = [key if isinstance(key, tuple) else (key, key) for key in gauges]
+
+    def collect():
+        stats = stats_func()
+        if not stats:
+            return
+        for key, name in counters:
+            if stats.get(key) is not None:
+                yield f"{prefix}_{name}_total", "counter", f"{prefix} {key}", [(labels, stats[key])]
+        for key, name in gauges:
+            if stats.get(key) is not None:
+                yield f"{prefix}_{name}", "gauge", f"{prefix} {key}", [(labels, stats[key])]
+
+    collect.__name__ = f"{prefix}_stats"
+    return registry.register_collector(collect)
+
+
+#  HTTP ENDPOINT
+class MetricsServer:
+    """سرور HTTP محلی که خروجی registry را روی /metrics برمی‌گرداند"""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, path=METRICS_PATH, registry=registry):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.registry = registry
+        self._httpd = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != server.path:
+                    self._reply(404, b"not found\n")
+                    return
+                try:
+                    body = server.registry.render().encode("utf-8")
+                except Exception as e:
+                    logger.error("❌ خطا در ساخت خروجی متریک‌ها: %s", e, exc_info=True)
+                    self._reply(500, b"error\n")
+                    return
+                self._reply(200, body)
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format, *args)
+
+        return Handler
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("📈 متریک‌ها روی http://%s:%s%s", self.host, self.port, self.path)
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """راه‌اندازی endpoint متریک‌ها (اگر METRICS_PORT صفر نباشد)؛ خطای bind ربات را متوقف نمی‌کند"""
+    if not port:
+        return None
+    try:
+        return MetricsServer(host, port).start()
+    except OSError as e:
+        logger.warning("⚠️ endpoint متریک‌ها راه‌اندازی نشد (%s:%s): %s", host, port, e)
+        return None
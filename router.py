@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ROUTE_SECONDS = metrics.histogram(
+    "bot_callback_route_duration_seconds", "زمان اجرای handler هر مسیر callback", ("route",)
+)
+ROUTE_ERRORS = metrics.counter(
+    "bot_callback_route_errors_total", "خطاهای handler هر مسیر callback", ("route",)
+)
+UNROUTED = metrics.counter("bot_callback_unrouted_total", "callback های بدون مسیر")
+
+
+class RouteStats:
+    """آمار زمان اجرای یک مسیر"""
+
+    __slots__ = ("count", "errors", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "total_ms": self.total * 1000,
+        }
+
+
+class CallbackRouter:
+    """مسیریاب callback_data
+
+    مسیرهای ثابت با یک dict (O(1)) پیدا می‌شوند و مسیرهای پارامتردار
+    با طولانی‌ترین پیشوند در یک trie؛ پس ترتیب ثبت مسیرها مهم نیست.
+    بقیه callback_data بعد از پیشوند با "_" جدا شده و بخش‌های عددی int می‌شوند.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._trie = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def route(self, *patterns, prefix=False):
+        """ثبت handler با decorator؛ handler(call, user_id, *args)"""
+
+        def decorator(func):
+            for pattern in patterns:
+                self.add(pattern, func, prefix=prefix)
+            return func
+
+        return decorator
+
+    def add(self, pattern, func, prefix=False):
+        """ثبت یک مسیر ثابت یا پیشوندی"""
+        if not prefix:
+            if pattern in self._exact:
+                raise ValueError(f"مسیر تکراری: {pattern}")
+            self._exact[pattern] = (pattern, func)
+            return
+
+        node = self._trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        if None in node:
+            raise ValueError(f"پیشوند تکراری: {pattern}")
+        # کلید None در هر گره handler پیشوندی است که همان‌جا تمام می‌شود
+        node[None] = (pattern + "*", func, len(pattern))
+
+    def resolve(self, data):
+        """پیدا کردن handler؛ خروجی (نام مسیر، handler، آرگومان‌ها) یا None"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route[0], route[1], ()
+
+        node = self._trie
+        match = None
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                match = node[None]
+        if match is None:
+            return None
+
+        name, func, length = match
+        rest = data[length:]
+        args = tuple(int(part) if part.isdigit() else part for part in rest.split("_")) if rest else ()
+        return name, func, args
+
+    def _record(self, name, elapsed, failed):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = RouteStats()
+            stats.count += 1
+            stats.total += elapsed
+            stats.errors += failed
+            if elapsed > stats.max:
+                stats.max = elapsed
+        ROUTE_SECONDS.observe(elapsed, route=name)
+        if failed:
+            ROUTE_ERRORS.inc(route=name)
+
+    def _resolve_call(self, call):
+        resolved = self.resolve(call.data or "")
+        if resolved is None:
+            UNROUTED.inc()
+            logger.warning("⚠️ مسیری برای callback پیدا نشد: %s", call.data)
+        return resolved
+
+    def dispatch(self, call, user_id):
+        """اجرای handler مربوط به call.data و ثبت زمان آن؛ False اگر مسیری پیدا نشود"""
+        resolved = self._resolve_call(call)
+        if resolved is None:
+            return False
+
+        name, func, args = resolved
+        started = time.perf_counter()
+        failed = False
+        try:
+            func(call, user_id, *args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - started, failed)
+        return True
+
+    async def dispatch_async(self, call, user_id):
+        """مثل dispatch برای handler های async (coroutine)"""
+        resolved = self._resolve_call(call)
+        if resolved is None:
+            return False
+
+        name, func, args = resolved
+        started = time.perf_counter()
+        failed = False
+        try:
+            await func(call, user_id, *args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - started, failed)
+        return True
+
+    def stats(self):
+        """آمار همه مسیرها، کندترین (بر اساس میانگین) اول"""
+        with self._lock:
+            snapshot = {name: stats.as_dict() for name, stats in self._stats.items()}
+        return dict(sorted(snapshot.items(), key=lambda item: -item[1]["avg_ms"]))
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import requests
+from telebot import apihelper
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# محدودیت‌های ارسال تلگرام: حدود ۳۰ پیام در ثانیه کلی و ۱ پیام در ثانیه برای هر چت
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_GLOBAL_BURST = float(os.getenv("SEND_GLOBAL_BURST", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# متدهایی که در محدودیت ارسال حساب می‌شوند؛ بقیه (getUpdates، answerCallbackQuery، ...) مستقیم می‌روند
+LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+# تعداد bucket چت قبل از پاک کردن bucket های بیکار
+MAX_CHAT_BUCKETS = 10000
+
+# getUpdates با long polling تا timeout (۶۰ ثانیه) باز می‌ماند
+API_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 90.0)
+
+API_SECONDS = metrics.histogram(
+    "telegram_api_request_duration_seconds",
+    "زمان درخواست‌های Bot API (با انتظار پشت محدودیت و retry)", ("method",), API_BUCKETS
+)
+API_RESPONSES = metrics.counter(
+    "telegram_api_responses_total", "پاسخ‌های Bot API به تفکیک متد و کد HTTP", ("method", "code")
+)
+API_429 = metrics.counter("telegram_api_429_total", "پاسخ‌های 429 (Too Many Requests) تلگرام", ("method",))
+
+
+class TokenBucket:
+    """token bucket با رزرو نوبت؛ reserve مدت انتظار لازم را برمی‌گرداند"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """گرفتن یک token؛ اگر token نباشد، نوبت رزرو و زمان انتظار برگردانده می‌شود"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds):
+        """توقف ارسال (بعد از 429 با retry_after)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def idle(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._tokens >= self.capacity and self._paused_until <= now
+
+
+class OutboundScheduler:
+    """محدودیت ارسال درخواست‌های خروجی تلگرام (به عنوان apihelper.CUSTOM_REQUEST_SENDER)
+
+    این یک throttle مسدودکننده است، نه صف ارسال: caller (thread handler) تا
+    رسیدن نوبتش صبر می‌کند چون پاسخ تلگرام (مثلاً message_id) را لازم دارد.
+    - محدودیت کلی و محدودیت هر چت با token bucket
+    - پاسخ 429 با صبر به اندازه retry_after دوباره ارسال می‌شود
+    - خطای اتصال و timeout مثل apihelper (RETRY_ON_ERROR) دوباره امتحان می‌شود؛
+      با CUSTOM_REQUEST_SENDER حلقه retry خود apihelper اجرا نمی‌شود
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, global_burst=SEND_GLOBAL_BURST,
+                 chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST, max_retries=SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "sent": 0,
+            "retries_429": 0,
+            "retries_error": 0,
+            "failed": 0,
+            "waiting": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                if len(self._chats) >= MAX_CHAT_BUCKETS:
+                    self._chats = {k: b for k, b in self._chats.items() if not b.idle()}
+                bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            return bucket
+
+    def _record(self, key, value):
+        with self._lock:
+            self._stats[key + "_total"] += value
+            if value > self._stats[key + "_max"]:
+                self._stats[key + "_max"] = value
+
+    def _inc(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def reserve(self, chat_id=None):
+        """گرفتن نوبت ارسال؛ مدت انتظار لازم (ثانیه) برمی‌گردد"""
+        wait = self._global.reserve()
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        return wait
+
+    def pause(self, chat_id, seconds):
+        """توقف ارسال بعد از 429 (برای چت، یا کلی اگر چت معلوم نباشد)"""
+        if chat_id is not None:
+            self._chat_bucket(chat_id).pause(seconds)
+        else:
+            self._global.pause(seconds)
+
+    def send(self, method, url, **kwargs):
+        """جایگزین requests.request در apihelper"""
+        api_method = url.rsplit("/", 1)[-1]
+        if not api_method.startswith(LIMITED_PREFIXES):
+            return self._direct(api_method, method, url, **kwargs)
+
+        started = time.monotonic()
+        self._inc("requests")
+        params = kwargs.get("params") or {}
+        chat_id = params.get("chat_id")
+        if chat_id is not None:
+            # chat_id گاهی عدد و گاهی رشته است؛ هر چت یک bucket
+            chat_id = str(chat_id)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                wait = self.reserve(chat_id)
+                if wait > 0:
+                    # thread handler (و lane چت) تا رسیدن نوبت مسدود می‌ماند
+                    self._inc("waiting")
+                    time.sleep(wait)
+                    self._inc("waiting", -1)
+                    self._record("wait_time", wait)
+
+                response = self._request(api_method, method, url, **kwargs)
+                API_RESPONSES.inc(method=api_method, code=response.status_code)
+                if response.status_code == 429:
+                    API_429.inc(method=api_method)
+                if response.status_code != 429 or attempt == self.max_retries:
+                    break
+
+                retry_after = self._retry_after(response)
+                self._inc("retries_429")
+                logger.warning(
+                    "⚠️ 429 از تلگرام برای %s (چت %s)؛ صبر %s ثانیه", api_method, chat_id, retry_after
+                )
+                self.pause(chat_id, retry_after)
+
+            if response.status_code == 200:
+                self._inc("sent")
+            else:
+                self._inc("failed")
+            return response
+
+        finally:
+            elapsed = time.monotonic() - started
+            self._record("latency", elapsed)
+            API_SECONDS.observe(elapsed, method=api_method)
+
+    def _direct(self, api_method, method, url, **kwargs):
+        """درخواست بدون محدودیت ارسال (فقط ثبت متریک)"""
+        started = time.monotonic()
+        try:
+            response = self._request(api_method, method, url, **kwargs)
+        finally:
+            API_SECONDS.observe(time.monotonic() - started, method=api_method)
+        API_RESPONSES.inc(method=api_method, code=response.status_code)
+        if response.status_code == 429:
+            API_429.inc(method=api_method)
+        return response
+
+    def _request(self, api_method, method, url, **kwargs):
+        """یک درخواست HTTP؛ با RETRY_ON_ERROR تا MAX_RETRIES بار با فاصله RETRY_TIMEOUT تکرار می‌شود"""
+        attempts = apihelper.MAX_RETRIES if apihelper.RETRY_ON_ERROR else 1
+        for attempt in range(1, attempts):
+            try:
+                return self._session().request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._inc("retries_error")
+                logger.warning("⚠️ خطای شبکه در %s (تلاش %s): %s", api_method, attempt, e)
+                time.sleep(apihelper.RETRY_TIMEOUT)
+        # آخرین تلاش؛ خطا به apihelper برگردانده می‌شود
+        return self._session().request(method, url, **kwargs)
+
+    @classmethod
+    def _retry_after(cls, response):
+        try:
+            return cls._retry_after_json(response.json())
+        except Exception:
+            return 1.0
+
+    @staticmethod
+    def _retry_after_json(result):
+        try:
+            return float((result or {}).get("parameters", {}).get("retry_after", 1))
+        except Exception:
+            return 1.0
+
+    def stats(self):
+        """آمار ارسال: تاخیر و انتظار پشت محدودیت (waiting: درخواست‌هایی که الان منتظر نوبت‌اند)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["chats"] = len(self._chats)
+        requests_count = stats["requests"]
+        stats["latency_avg"] = stats["latency_total"] / requests_count if requests_count else 0.0
+        return stats
+
+
+scheduler = OutboundScheduler()
+
+
+def install_sender():
+    """فعال کردن زمان‌بندی برای همه درخواست‌های TeleBot"""
+    apihelper.CUSTOM_REQUEST_SENDER = scheduler.send
+    return scheduler
+
+
+def install_async_sender(scheduler=scheduler):
+    """همان محدودیت‌ها برای AsyncTeleBot
+
+    AsyncTeleBot با aiohttp ارسال می‌کند و از CUSTOM_REQUEST_SENDER عبور
+    نمی‌کند؛ اینجا asyncio_helper._process_request پوشانده می‌شود. انتظار با
+    asyncio.sleep است و bucket ها با نسخه sync مشترک‌اند (handler های sync
+    هم در همین پروسس ارسال می‌کنند).
+    """
+    from telebot import asyncio_helper
+    from telebot.asyncio_helper import ApiTelegramException
+
+    process_request = asyncio_helper._process_request
+    if getattr(process_request, "scheduler", None) is not None:
+        return scheduler
+
+    async def limited_request(token, url, method="get", params=None, files=None, **kwargs):
+        if not url.startswith(LIMITED_PREFIXES):
+            return await process_request(token, url, method, params, files, **kwargs)
+
+        started = time.monotonic()
+        scheduler._inc("requests")
+        chat_id = (params or {}).get("chat_id")
+        chat_id = str(chat_id) if chat_id is not None else None
+        try:
+            for attempt in range(scheduler.max_retries + 1):
+                wait = scheduler.reserve(chat_id)
+                if wait > 0:
+                    scheduler._inc("waiting")
+                    await asyncio.sleep(wait)
+                    scheduler._inc("waiting", -1)
+                    scheduler._record("wait_time", wait)
+                try:
+                    # params در _process_request تغییر می‌کند؛ هر تلاش کپی خودش را می‌گیرد
+                    result = await process_request(
+                        token, url, method, dict(params) if params else params, files, **kwargs
+                    )
+                except ApiTelegramException as e:
+                    API_RESPONSES.inc(method=url, code=e.error_code)
+                    if e.error_code != 429 or attempt == scheduler.max_retries:
+                        scheduler._inc("failed")
+                        raise
+                    API_429.inc(method=url)
+                    retry_after = scheduler._retry_after_json(e.result_json)
+                    scheduler._inc("retries_429")
+                    logger.warning("⚠️ 429 از تلگرام برای %s (چت %s)؛ صبر %s ثانیه", url, chat_id, retry_after)
+                    scheduler.pause(chat_id, retry_after)
+                    continue
+                API_RESPONSES.inc(method=url, code=200)
+                scheduler._inc("sent")
+                return result
+        finally:
+            elapsed = time.monotonic() - started
+            scheduler._record("latency", elapsed)
+            API_SECONDS.observe(elapsed, method=url)
+
+    limited_request.scheduler = scheduler
+    asyncio_helper._process_request = limited_request
+    return scheduler
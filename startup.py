@@ -0,0 +1,173 @@
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# حداکثر زمان هر مرحله از بررسی‌های شروع (ثانیه)؛ بعد از آن ربات در حالت degraded شروع می‌شود
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", "30"))
+
+# وضعیت‌های آمادگی
+STARTING = "starting"
+CHECKING = "checking"
+READY = "ready"
+DEGRADED = "degraded"  # بعضی بررسی‌ها ناموفق بودند؛ ربات با fallback ها کار می‌کند
+STOPPING = "stopping"
+
+
+class Readiness:
+    """وضعیت آمادگی پروسس و نتیجه و زمان هر بررسی شروع"""
+
+    def __init__(self):
+        self.state = STARTING
+        self.started = time.perf_counter()
+        self.ready_after = None  # ثانیه از ساخته شدن تا ready یا degraded
+        self._checks = {}
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+
+    def set(self, state):
+        with self._lock:
+            self.state = state
+            if state in (READY, DEGRADED) and self.ready_after is None:
+                self.ready_after = time.perf_counter() - self.started
+        if state in (READY, DEGRADED):
+            self._event.set()
+        logger.info("🚦 وضعیت ربات: %s", state)
+
+    def record(self, name, ok, duration, error=None):
+        with self._lock:
+            self._checks[name] = {"ok": ok, "duration_ms": duration * 1000, "error": error}
+
+    def is_ready(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """انتظار تا پایان بررسی‌های شروع"""
+        return self._event.wait(timeout)
+
+    def stats(self):
+        """وضعیت و نتیجه بررسی‌ها برای پایش"""
+        with self._lock:
+            stats = {
+                "state": self.state,
+                "ready": int(self.state in (READY, DEGRADED)),
+                "degraded": int(self.state == DEGRADED),
+                "startup_seconds": self.ready_after,
+                "checks": {name: dict(check) for name, check in self._checks.items()},
+            }
+        return stats
+
+
+readiness = Readiness()
+
+
+def _run_check(name, func):
+    started = time.perf_counter()
+    try:
+        ok = func() is not False
+        error = None if ok else "returned False"
+    except Exception as e:
+        ok, error = False, str(e)
+    duration = time.perf_counter() - started
+    readiness.record(name, ok, duration, error)
+    if ok:
+        logger.info("✅ %s (%.0fms)", name, duration * 1000)
+    else:
+        logger.warning("⚠️ %s ناموفق بود (%.0fms): %s", name, duration * 1000, error)
+    return ok
+
+
+def run_startup(phases, timeout=STARTUP_TIMEOUT):
+    """اجرای بررسی‌های شروع؛ phases لیست مراحل و هر مرحله لیست (نام، تابع) است
+
+    بررسی‌های یک مرحله هم‌زمان اجرا می‌شوند و مرحله بعد بعد از تمام شدن
+    مرحله قبل شروع می‌شود. تابعی که False برگرداند یا خطا بدهد ناموفق است.
+    خروجی True اگر همه بررسی‌ها موفق باشند (وضعیت ready، در غیر این صورت degraded).
+    """
+    readiness.set(CHECKING)
+    all_ok = True
+    workers = max([len(phase) for phase in phases] + [1])
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="startup")
+    try:
+        for phase in phases:
+            futures = {executor.submit(_run_check, name, func): name for name, func in phase}
+            done, pending = wait(futures, timeout=timeout)
+            for future in pending:
+                name = futures[future]
+                readiness.record(name, False, timeout, "timeout")
+                logger.warning("⚠️ %s در %s ثانیه تمام نشد", name, timeout)
+                all_ok = False
+            all_ok = all(future.result() for future in done) and all_ok
+    finally:
+        # بررسی‌ای که از timeout گذشته در پس‌زمینه تمام می‌شود و شروع را نگه نمی‌دارد
+        executor.shutdown(wait=False)
+
+    readiness.set(READY if all_ok else DEGRADED)
+    logger.info("⏱️ زمان آماده شدن: %.0fms", readiness.ready_after * 1000)
+    return all_ok
+
+
+#  TELEGRAM
+def is_webhook_conflict(error):
+    """خطای 409 به خاطر فعال بودن webhook (در مقابل اجرای هم‌زمان نمونه دیگر)"""
+    return error.error_code == 409 and "webhook" in (error.description or "").lower()
+
+
+def check_telegram(bot, mode="polling"):
+    """بررسی توکن (getMe) و تداخل با webhook؛ در حالت polling webhook فعال حذف می‌شود
+
+    تداخل 409 به جای صبر کردن از روی getWebhookInfo تشخیص داده می‌شود.
+    """
+    me = bot.get_me()
+    logger.info("🤖 ربات: @%s", me.username)
+
+    if mode != "polling":
+        return True
+
+    info = bot.get_webhook_info()
+    if info.url:
+        logger.warning("⚠️ webhook فعال است (%s)؛ برای polling حذف می‌شود", info.url)
+        bot.remove_webhook()
+    return True
+
+
+def describe_conflict(error):
+    """راهنمای خطای 409 هنگام polling"""
+    if is_webhook_conflict(error):
+        return "webhook فعال است؛ حذف و ادامه polling"
+    return "نمونه دیگری از ربات با همین توکن polling می‌کند؛ فقط یک نمونه باید اجرا شود"
+
+
+class ConflictHandler:
+    """exception_handler برای TeleBot: خطای 409 در حین polling
+
+    infinity_polling خطاها را خودش می‌گیرد و به کد ما نمی‌رساند؛ این handler
+    webhook فعال‌شده در حین اجرا را حذف می‌کند و برای تداخل با نمونه دیگر
+    راهنما لاگ می‌کند (تکرار با backoff خود polling). بقیه خطاها مدیریت نمی‌شوند.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    def handle(self, exception):
+        if getattr(exception, "error_code", None) != 409:
+            return False
+        logger.error("⚠️ خطای 409: %s", describe_conflict(exception))
+        if is_webhook_conflict(exception):
+            self.bot.remove_webhook()
+            return True
+        return False
+
+
+#  SHUTDOWN
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def handle_sigterm():
+    """SIGTERM (مثلاً docker stop) مثل Ctrl+C مسیر خاموشی را اجرا می‌کند؛ فقط از thread اصلی"""
+    signal.signal(signal.SIGTERM, _interrupt)
@@ -0,0 +1,330 @@
+import abc
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import date, datetime
+from decimal import Decimal
+
+from database import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+# تنظیمات store وضعیت گفتگو
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")  # memory | sqlite | mysql
+STATE_TTL = float(os.getenv("STATE_TTL", "3600"))
+STATE_MAX_ENTRIES = int(os.getenv("STATE_MAX_ENTRIES", "10000"))
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "states.db")
+
+# فاصله پاک‌سازی state های منقضی در backend های ماندگار (ثانیه)
+PURGE_INTERVAL = 60
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"مقدار {type(value).__name__} قابل ذخیره در state نیست")
+
+
+def dump_state(state):
+    """تبدیل state به JSON برای ذخیره"""
+    return json.dumps(state, ensure_ascii=False, default=_json_default)
+
+
+def load_state(raw):
+    """خواندن state از JSON؛ کلیدهای عددی JSON رشته هستند و همان‌طور می‌مانند"""
+    return json.loads(raw)
+
+
+class StateStore(MutableMapping):
+    """رابط مشترک store ها؛ مثل dict با user_id به عنوان کلید
+
+    در backend های ماندگار خروجی store[user_id] یک کپی است، پس بعد از
+    تغییر state باید commit(user_id, state) صدا زده شود. MutableMapping از
+    ABCMeta است، پس backend ناقص هنگام ساخته شدن خطا می‌دهد.
+    """
+
+    @abc.abstractmethod
+    def commit(self, user_id, state):
+        """ذخیره تغییرات state؛ اگر state در این فاصله حذف شده باشد دوباره ساخته نمی‌شود"""
+
+    def discard(self, user_id):
+        """حذف state کاربر (اگر وجود داشته باشد)"""
+        self.pop(user_id, None)
+
+    @abc.abstractmethod
+    def purge_expired(self):
+        """حذف state های منقضی؛ تعداد حذف‌شده‌ها را برمی‌گرداند"""
+
+    @abc.abstractmethod
+    def stats(self):
+        """آمار store برای پایش"""
+
+
+#  MEMORY
+class MemoryStateStore(StateStore):
+    """store داخل حافظه با TTL لغزنده و سقف تعداد (LRU)"""
+
+    def __init__(self, ttl=STATE_TTL, max_entries=STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # user_id -> (state, expires_at)
+        self._lock = threading.RLock()
+        self._stats = {"expired": 0, "evictions": 0}
+
+    def _touch(self, user_id, state):
+        self._data[user_id] = (state, time.monotonic() + self.ttl)
+        self._data.move_to_end(user_id)
+
+    def __getitem__(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                raise KeyError(user_id)
+            state, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[user_id]
+                self._stats["expired"] += 1
+                raise KeyError(user_id)
+            # هر استفاده عمر state را تمدید می‌کند
+            self._touch(user_id, state)
+            return state
+
+    def __setitem__(self, user_id, state):
+        with self._lock:
+            self._touch(user_id, state)
+            # TTL همه کلیدها یکسان است، پس قدیمی‌ترین‌ها ابتدای OrderedDict هستند
+            self._purge_front()
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            del self._data[user_id]
+
+    def __contains__(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __iter__(self):
+        with self._lock:
+            self._purge_front()
+            return iter(list(self._data))
+
+    def __len__(self):
+        with self._lock:
+            self._purge_front()
+            return len(self._data)
+
+    def _purge_front(self):
+        now = time.monotonic()
+        removed = 0
+        while self._data:
+            user_id, (_, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[user_id]
+            removed += 1
+        self._stats["expired"] += removed
+        return removed
+
+    def commit(self, user_id, state):
+        with self._lock:
+            if user_id in self._data:
+                self._touch(user_id, state)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge_front()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+        stats["backend"] = "memory"
+        stats["max_entries"] = self.max_entries
+        stats["ttl"] = self.ttl
+        return stats
+
+
+#  DURABLE BACKENDS
+class _SQLStateStore(StateStore):
+    """پایه store های ماندگار؛ state به صورت JSON همراه با زمان انقضا ذخیره می‌شود
+
+    زمان انقضا با هر set یا commit تمدید می‌شود (نه با خواندن) تا هر
+    پیام فقط یک نوشتن داشته باشد.
+    """
+
+    backend = None
+    placeholder = "%s"
+    upsert_sql = None
+
+    def __init__(self, ttl=STATE_TTL):
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+    @abc.abstractmethod
+    def _execute(self, sql, params=(), fetch=None):
+        """اجرای یک دستور؛ fetch می‌تواند "one" یا "all" باشد. خروجی (rows, rowcount)"""
+
+    def _sql(self, sql):
+        return sql.replace("%s", self.placeholder)
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge_expired()
+
+    def __getitem__(self, user_id):
+        row, _ = self._execute(
+            "SELECT state FROM conversation_states WHERE user_id = %s AND expires_at > %s",
+            (user_id, time.time()),
+            fetch="one",
+        )
+        if row is None:
+            raise KeyError(user_id)
+        return load_state(row[0])
+
+    def __setitem__(self, user_id, state):
+        self._execute(self.upsert_sql, (user_id, dump_state(state), time.time() + self.ttl))
+        self._maybe_purge()
+
+    def __delitem__(self, user_id):
+        _, rowcount = self._execute("DELETE FROM conversation_states WHERE user_id = %s", (user_id,))
+        if not rowcount:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id):
+        row, _ = self._execute(
+            "SELECT 1 FROM conversation_states WHERE user_id = %s AND expires_at > %s",
+            (user_id, time.time()),
+            fetch="one",
+        )
+        return row is not None
+
+    def __iter__(self):
+        rows, _ = self._execute(
+            "SELECT user_id FROM conversation_states WHERE expires_at > %s",
+            (time.time(),),
+            fetch="all",
+        )
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        row, _ = self._execute(
+            "SELECT COUNT(*) FROM conversation_states WHERE expires_at > %s",
+            (time.time(),),
+            fetch="one",
+        )
+        return row[0]
+
+    def discard(self, user_id):
+        self._execute("DELETE FROM conversation_states WHERE user_id = %s", (user_id,))
+
+    def commit(self, user_id, state):
+        self._execute(
+            "UPDATE conversation_states SET state = %s, expires_at = %s WHERE user_id = %s",
+            (dump_state(state), time.time() + self.ttl, user_id),
+        )
+
+    def purge_expired(self):
+        _, rowcount = self._execute(
+            "DELETE FROM conversation_states WHERE expires_at <= %s", (time.time(),)
+        )
+        return rowcount
+
+    def stats(self):
+        return {"backend": self.backend, "size": len(self), "ttl": self.ttl}
+
+
+class SQLiteStateStore(_SQLStateStore):
+    """store ماندگار روی فایل SQLite (برای یک سرور؛ با WAL چند پروسس هم ممکن است)"""
+
+    backend = "sqlite"
+    placeholder = "?"
+    upsert_sql = """
+        INSERT INTO conversation_states (user_id, state, expires_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            state = excluded.state,
+            expires_at = excluded.expires_at
+    """
+
+    def __init__(self, path=STATE_SQLITE_PATH, ttl=STATE_TTL):
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_states (
+                user_id INTEGER NOT NULL PRIMARY KEY,
+                state TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_expires_at ON conversation_states (expires_at)"
+        )
+
+    def _execute(self, sql, params=(), fetch=None):
+        with self._lock:
+            cursor = self._conn.execute(self._sql(sql), params)
+            try:
+                if fetch == "one":
+                    return cursor.fetchone(), cursor.rowcount
+                if fetch == "all":
+                    return cursor.fetchall(), cursor.rowcount
+                return None, cursor.rowcount
+            finally:
+                cursor.close()
+
+
+class MySQLStateStore(_SQLStateStore):
+    """store ماندگار در جدول conversation_states؛ چند پروسس ربات می‌توانند آن را به اشتراک بگذارند"""
+
+    backend = "mysql"
+    upsert_sql = """
+        INSERT INTO conversation_states (user_id, state, expires_at)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            state = VALUES(state),
+            expires_at = VALUES(expires_at)
+    """
+
+    def _execute(self, sql, params=(), fetch=None):
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                if fetch == "one":
+                    return cursor.fetchone(), cursor.rowcount
+                if fetch == "all":
+                    return cursor.fetchall(), cursor.rowcount
+                return None, cursor.rowcount
+            finally:
+                cursor.close()
+
+
+def create_state_store(backend=STATE_BACKEND):
+    """ساخت store بر اساس STATE_BACKEND"""
+    if backend == "sqlite":
+        logger.info("💾 state گفتگوها در SQLite ذخیره می‌شود: %s", STATE_SQLITE_PATH)
+        return SQLiteStateStore()
+    if backend == "mysql":
+        logger.info("💾 state گفتگوها در جدول conversation_states ذخیره می‌شود")
+        return MySQLStateStore()
+    if backend != "memory":
+        logger.warning("⚠️ STATE_BACKEND نامعتبر است (%s)؛ از حافظه استفاده می‌شود", backend)
+    return MemoryStateStore()
@@ -0,0 +1,18 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# config.py تنظیمات محلی هر نصب است و در مخزن نیست؛ تست‌ها به دیتابیس وصل نمی‌شوند
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.BOT_TOKEN = "123456789:test-token"
+    config.ADMIN_ID = 1
+    config.PAYMENT_CARD = "0000-0000-0000-0000"
+    config.DB_CONFIG = {"host": "127.0.0.1", "user": "test", "password": "", "database": "test"}
+    sys.modules["config"] = config
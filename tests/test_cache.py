@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from database.cache import TTLCache  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_set_and_stats(clock):
+    cache = TTLCache(max_size=10, default_ttl=60)
+    assert cache.get("book:1") is None
+
+    cache.set("book:1", {"title": "a"})
+    assert cache.get("book:1") == {"title": "a"}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_entries_expire(clock):
+    cache = TTLCache(default_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=300)
+
+    clock[0] += 61
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["expired"] == 1
+
+
+def test_lru_eviction(clock):
+    cache = TTLCache(max_size=2, default_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_and_prefix(clock):
+    cache = TTLCache()
+    cache.set("book:1", {"id": 1})
+    cache.set("books:all:20", [])
+    cache.set("books:category:1:10", [])
+    cache.set("categories", [])
+
+    cache.invalidate("book:1")
+    cache.invalidate_prefix("books:")
+
+    assert cache.get("book:1") is None
+    assert cache.get("books:all:20") is None
+    assert cache.get("categories") == []
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_values_are_copied(clock):
+    cache = TTLCache()
+    row = {"book_id": 1, "stock": 5}
+    cache.set("books", [row])
+    row["stock"] = 0
+
+    books = cache.get("books")
+    assert books[0]["stock"] == 5
+    books[0]["stock"] = 1
+    books.append({"book_id": 2})
+
+    assert cache.get("books") == [{"book_id": 1, "stock": 5}]
+
+
+def test_zero_is_cached(clock):
+    cache = TTLCache()
+    cache.set("books:count", 0)
+    assert cache.get("books:count") == 0
+
+
+def test_set_after_invalidate_is_discarded(clock):
+    cache = TTLCache()
+    generation = cache.generation()
+    # ردیف خوانده شده، سپس ادمین کتاب را تغییر می‌دهد
+    cache.invalidate("book:1")
+
+    assert cache.set("book:1", {"stock": 5}, generation=generation) is False
+    assert cache.get("book:1") is None
+    assert cache.set("book:1", {"stock": 4}, generation=cache.generation()) is True
+    assert cache.get("book:1") == {"stock": 4}
+    assert cache.stats()["discarded_sets"] == 1
@@ -0,0 +1,95 @@
+import urllib.request
+
+import pytest
+
+from metrics import MetricsServer, Registry, format_value
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    requests = registry.counter("app_requests_total", "requests", ("method",))
+    inflight = registry.gauge("app_inflight", "in flight")
+
+    requests.inc(method="get")
+    requests.inc(2, method="get")
+    requests.inc(method="post")
+    inflight.set(3)
+    inflight.dec()
+
+    text = registry.render()
+    assert "# HELP app_requests_total requests\n" in text
+    assert "# TYPE app_requests_total counter\n" in text
+    assert 'app_requests_total{method="get"} 3\n' in text
+    assert 'app_requests_total{method="post"} 1\n' in text
+    assert "# TYPE app_inflight gauge\n" in text
+    assert "app_inflight 2\n" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("app_seconds", "latency", buckets=(0.1, 1.0))
+
+    latency.observe(0.05)
+    latency.observe(0.1)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+    assert 'app_seconds_bucket{le="0.1"} 2\n' in text
+    assert 'app_seconds_bucket{le="1"} 3\n' in text
+    assert 'app_seconds_bucket{le="+Inf"} 4\n' in text
+    assert "app_seconds_count 4\n" in text
+    assert "app_seconds_sum 5.65\n" in text
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    errors = registry.counter("app_errors_total", "errors", ("route",))
+    errors.inc(route='a"b\\c\nd')
+
+    assert 'app_errors_total{route="a\\"b\\\\c\\nd"} 1\n' in registry.render()
+
+
+def test_wrong_labels_raise():
+    registry = Registry()
+    errors = registry.counter("app_errors_total", "errors", ("route",))
+    with pytest.raises(ValueError):
+        errors.inc(method="x")
+    with pytest.raises(ValueError):
+        errors.inc()
+
+
+def test_collectors_and_failing_collector():
+    registry = Registry()
+
+    def good():
+        yield "app_size", "gauge", "size", [((("cache", "catalog"),), 7)]
+
+    def bad():
+        raise RuntimeError("down")
+
+    registry.register_collector(bad)
+    registry.register_collector(good)
+
+    assert 'app_size{cache="catalog"} 7\n' in registry.render()
+
+
+def test_format_value():
+    assert format_value(1.0) == "1"
+    assert format_value(float("inf")) == "+Inf"
+    assert format_value(float("nan")) == "NaN"
+    assert format_value(True) == "1"
+    assert format_value(0.25) == "0.25"
+
+
+def test_metrics_server_serves_registry():
+    registry = Registry()
+    registry.counter("app_hits_total", "hits").inc()
+    server = MetricsServer("127.0.0.1", 0, registry=registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "app_hits_total 1\n" in body
+    finally:
+        server.stop()
@@ -0,0 +1,85 @@
+import types
+
+import pytest
+
+from router import CallbackRouter
+
+
+def make_call(data):
+    return types.SimpleNamespace(data=data)
+
+
+def test_exact_route_wins_over_prefix():
+    router = CallbackRouter()
+    router.add("admin_books", lambda call, user_id: "exact")
+    router.add("admin_", lambda call, user_id, *args: "prefix", prefix=True)
+
+    name, func, args = router.resolve("admin_books")
+    assert name == "admin_books"
+    assert args == ()
+
+
+def test_longest_prefix_and_int_args():
+    router = CallbackRouter()
+    router.add("book_", lambda *a: None, prefix=True)
+    router.add("books_page_", lambda *a: None, prefix=True)
+
+    name, _, args = router.resolve("books_page_12_next")
+    assert name == "books_page_*"
+    assert args == (12, "next")
+
+    name, _, args = router.resolve("book_7")
+    assert name == "book_*"
+    assert args == (7,)
+
+
+def test_registration_order_does_not_matter():
+    router = CallbackRouter()
+    router.add("admin_edit_book_", lambda *a: None, prefix=True)
+    router.add("admin_", lambda *a: None, prefix=True)
+
+    assert router.resolve("admin_edit_book_3")[0] == "admin_edit_book_*"
+    assert router.resolve("admin_other")[0] == "admin_*"
+
+
+def test_duplicate_routes_are_rejected():
+    router = CallbackRouter()
+    router.add("cart", lambda *a: None)
+    router.add("add_", lambda *a: None, prefix=True)
+
+    with pytest.raises(ValueError):
+        router.add("cart", lambda *a: None)
+    with pytest.raises(ValueError):
+        router.add("add_", lambda *a: None, prefix=True)
+
+
+def test_dispatch_calls_handler_and_records_stats():
+    router = CallbackRouter()
+    calls = []
+
+    @router.route("inc_", "dec_", prefix=True)
+    def change(call, user_id, book_id):
+        calls.append((call.data, user_id, book_id))
+
+    assert router.dispatch(make_call("inc_5"), 42)
+    assert router.dispatch(make_call("dec_5"), 42)
+    assert calls == [("inc_5", 42, 5), ("dec_5", 42, 5)]
+    assert router.stats()["inc_*"]["count"] == 1
+
+
+def test_dispatch_unknown_data_returns_false():
+    router = CallbackRouter()
+    assert router.dispatch(make_call("nothing"), 1) is False
+    assert router.dispatch(make_call(None), 1) is False
+
+
+def test_dispatch_counts_errors_and_reraises():
+    router = CallbackRouter()
+
+    @router.route("boom")
+    def boom(call, user_id):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        router.dispatch(make_call("boom"), 1)
+    assert router.stats()["boom"]["errors"] == 1
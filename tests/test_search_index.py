@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from database.search_index import BookSearchIndex, normalize_text, tokenize  # noqa: E402
+
+
+def book(book_id, title, author="", description="", **extra):
+    return {"book_id": book_id, "title": title, "author": author, "description": description, **extra}
+
+
+@pytest.fixture
+def index():
+    index = BookSearchIndex()
+    index.build([
+        book(1, "شازده کوچولو", "آنتوان دو سنت اگزوپری", "داستانی برای کودکان", stock=5),
+        book(2, "کیمیاگر", "پائولو کوئیلو", "سفر یک چوپان"),
+        book(3, "بوف کور", "صادق هدایت", "رمان کوتاه"),
+        book(4, "Clean Code", "Robert Martin", "کد تمیز"),
+    ])
+    return index
+
+
+def test_normalize_arabic_letters_and_digits():
+    assert normalize_text("كتاب علي ۱۲٣") == "کتاب علی 123"
+    assert normalize_text("Clean") == "clean"
+    assert normalize_text(None) == ""
+
+
+def test_tokenize_zwnj_words_both_joined_and_split():
+    tokens = tokenize("کتاب‌های خوب")
+    assert "کتابهای" in tokens
+    assert "کتاب" in tokens and "های" in tokens
+    assert "خوب" in tokens
+
+
+def test_prefix_search(index):
+    assert [b["book_id"] for b in index.search("کیمیا")] == [2]
+    assert [b["book_id"] for b in index.search("clea")] == [4]
+
+
+def test_all_words_must_match(index):
+    assert [b["book_id"] for b in index.search("بوف هدایت")] == [3]
+    assert index.search("بوف کوئیلو") == []
+    assert index.search("   ") == []
+
+
+def test_title_ranks_above_description(index):
+    index.upsert(book(5, "کد", "نویسنده"))
+    results = [b["book_id"] for b in index.search("کد")]
+    assert results[0] == 5
+    assert 4 in results
+
+
+def test_arabic_spelling_matches(index):
+    assert [b["book_id"] for b in index.search("كيمياگر")] == [2]
+
+
+def test_upsert_and_remove(index):
+    index.upsert(book(2, "کیمیاگر", "پائولو کوئیلو", is_active=False))
+    assert index.search("کیمیاگر") == []
+
+    index.upsert(book(6, "سمفونی مردگان", "عباس معروفی"))
+    assert [b["book_id"] for b in index.search("سمفونی")] == [6]
+
+    index.remove(6)
+    assert index.search("سمفونی") == []
+    assert index.search("معروفی") == []
+
+
+def test_results_are_copies(index):
+    result = index.search("شازده")[0]
+    result["stock"] = 0
+    assert index.search("شازده")[0]["stock"] == 5
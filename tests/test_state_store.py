@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from state_store import MemoryStateStore, SQLiteStateStore  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """زمان قابل کنترل برای TTL"""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryStateStore(ttl=60, max_entries=100)
+    return SQLiteStateStore(path=str(tmp_path / "states.db"), ttl=60)
+
+
+def test_set_get_and_discard(store):
+    store[1] = {"step": "checkout_phone", "data": {"book_id": 3}}
+
+    assert 1 in store
+    assert store[1] == {"step": "checkout_phone", "data": {"book_id": 3}}
+    assert store.get(2) is None
+
+    store.discard(1)
+    store.discard(1)
+    assert 1 not in store
+    with pytest.raises(KeyError):
+        store[1]
+
+
+def test_commit_saves_changes_but_does_not_recreate(store):
+    store[1] = {"step": "a"}
+    state = store[1]
+    state["step"] = "b"
+    store.commit(1, state)
+    assert store[1]["step"] == "b"
+
+    store.discard(1)
+    store.commit(1, {"step": "c"})
+    assert 1 not in store
+
+
+def test_states_expire_after_ttl(store, clock):
+    store[1] = {"step": "a"}
+    store[2] = {"step": "b"}
+
+    clock[0] += 61
+    assert 1 not in store
+    assert len(store) == 0
+    with pytest.raises(KeyError):
+        store[2]
+
+
+def test_purge_expired(store, clock):
+    store[1] = {"step": "a"}
+    clock[0] += 30
+    store[2] = {"step": "b"}
+    clock[0] += 31
+
+    assert store.purge_expired() == 1
+    assert list(store) == [2]
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = MemoryStateStore(ttl=60, max_entries=2)
+    store[1] = {"step": "a"}
+    store[2] = {"step": "b"}
+    store[1]
+    store[3] = {"step": "c"}
+
+    assert 2 not in store
+    assert 1 in store and 3 in store
+    assert store.stats()["evictions"] == 1
+
+
+def test_memory_store_reads_extend_ttl(clock):
+    store = MemoryStateStore(ttl=60)
+    store[1] = {"step": "a"}
+    clock[0] += 50
+    store[1]
+    clock[0] += 50
+    assert 1 in store
+
+
+def test_sqlite_store_survives_reopen(tmp_path, clock):
+    path = str(tmp_path / "states.db")
+    SQLiteStateStore(path=path, ttl=60)[7] = {"step": "admin_add_book_title", "data": {"price": 1.5}}
+
+    assert SQLiteStateStore(path=path, ttl=60)[7] == {"step": "admin_add_book_title", "data": {"price": 1.5}}
+
+
+def test_incomplete_backend_fails_on_creation():
+    from state_store import StateStore, _SQLStateStore
+
+    class NoCommit(StateStore):
+        def __getitem__(self, key): ...
+        def __setitem__(self, key, value): ...
+        def __delitem__(self, key): ...
+        def __iter__(self): ...
+        def __len__(self): ...
+        def purge_expired(self): ...
+        def stats(self): ...
+
+    class NoExecute(_SQLStateStore):
+        backend = "test"
+
+    with pytest.raises(TypeError):
+        NoCommit()
+    with pytest.raises(TypeError):
+        NoExecute()
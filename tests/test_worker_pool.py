@@ -0,0 +1,87 @@
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip("telebot")
+pytest.importorskip("mysql.connector")
+
+from worker_pool import HandlerPool  # noqa: E402
+
+
+def message(chat_id, text=""):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), text=text, content_type="text")
+
+
+@pytest.fixture
+def bot():
+    return types.SimpleNamespace(exception_handler=None, answer_callback_query=lambda *a, **k: None)
+
+
+def test_updates_of_one_chat_run_in_order_and_one_at_a_time(bot):
+    pool = HandlerPool(bot, num_threads=4, queue_size=100)
+    seen = {1: [], 2: []}
+    active = {1: 0, 2: 0}
+    overlaps = []
+    lock = threading.Lock()
+
+    def handle(update, n):
+        chat_id = update.chat.id
+        with lock:
+            active[chat_id] += 1
+            if active[chat_id] > 1:
+                overlaps.append((chat_id, n))
+        time.sleep(0.001)
+        with lock:
+            seen[chat_id].append(n)
+            active[chat_id] -= 1
+
+    for n in range(30):
+        pool.put(handle, message(1), n)
+        pool.put(handle, message(2), n)
+    pool.close()
+
+    assert seen[1] == list(range(30))
+    assert seen[2] == list(range(30))
+    assert overlaps == []
+    assert pool.stats()["completed"] == 60
+
+
+def test_different_chats_run_in_parallel(bot):
+    pool = HandlerPool(bot, num_threads=2, queue_size=10)
+    started = threading.Event()
+    results = []
+
+    def slow(update):
+        started.set()
+        # اگر چت دیگر پشت این کار منتظر بماند، timeout می‌خورد
+        results.append(release.wait(5))
+
+    def fast(update):
+        started.wait(5)
+        release.set()
+
+    release = threading.Event()
+    pool.put(slow, message(1))
+    pool.put(fast, message(2))
+    pool.close()
+
+    assert results == [True]
+
+
+def test_handler_errors_are_reported(bot):
+    pool = HandlerPool(bot, num_threads=1, queue_size=10)
+
+    def boom(update):
+        raise RuntimeError("boom")
+
+    pool.put(boom, message(1))
+    pool.close()
+
+    assert pool.exception_event.is_set()
+    with pytest.raises(RuntimeError):
+        pool.raise_exceptions()
+    pool.clear_exceptions()
+    assert not pool.exception_event.is_set()
+    assert pool.stats()["failed"] == 1
@@ -0,0 +1,270 @@
+import argparse
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# تنظیمات حالت webhook
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # آدرس عمومی که به تلگرام معرفی می‌شود
+# توکن مخفی هدر X-Telegram-Bot-Api-Secret-Token؛ اگر خالی باشد و WEBHOOK_URL تنظیم شده باشد
+# یک توکن تصادفی ساخته و به تلگرام معرفی می‌شود. بدون توکن سرور webhook شروع نمی‌شود.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# worker ها فقط update را به bot.worker_pool می‌سپارند (ترتیب هر چت آنجا حفظ می‌شود)؛
+# با بیش از یک worker ترتیب دو update پشت سر هم از یک چت تضمین نمی‌شود
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY_SIZE = 1024 * 1024
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+class WebhookServer:
+    """سرور HTTP برای دریافت update های تلگرام و پردازش آن‌ها با صف محدود"""
+
+    def __init__(self, bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret=WEBHOOK_SECRET, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET خالی است؛ سرور webhook بدون توکن مخفی شروع نمی‌شود")
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._httpd = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "unauthorized": 0,
+            "bad_request": 0,
+        }
+
+    def _inc(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+
+                # درخواست بدون هدر یا با توکن اشتباه همیشه رد می‌شود
+                if not hmac.compare_digest(
+                    self.headers.get(SECRET_HEADER, "").encode("utf-8"), server.secret.encode("utf-8")
+                ):
+                    server._inc("unauthorized")
+                    self._reply(403)
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    server._inc("bad_request")
+                    self._reply(413 if length > MAX_BODY_SIZE else 400)
+                    return
+
+                try:
+                    payload = json.loads(self.rfile.read(length).decode("utf-8"))
+                except (ValueError, UnicodeDecodeError):
+                    server._inc("bad_request")
+                    self._reply(400)
+                    return
+
+                # 503 یعنی تلگرام بعداً دوباره همین update را می‌فرستد
+                self._reply(200 if server.submit(payload) else 503)
+
+            def do_GET(self):
+                if self.path == "/healthz":
+                    self._reply(200, json.dumps(server.stats()).encode("utf-8"))
+                else:
+                    self._reply(404)
+
+            def _reply(self, status, body=b""):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("webhook: " + format, *args)
+
+        return Handler
+
+    def submit(self, payload):
+        """اضافه کردن update به صف؛ False اگر صف پر باشد"""
+        self._inc("received")
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            self._inc("rejected")
+            logger.warning("⚠️ صف webhook پر است؛ update با 503 رد شد")
+            return False
+
+    def _worker(self):
+        from telebot.types import Update
+
+        while True:
+            payload = self._queue.get()
+            if payload is None:
+                break
+            try:
+                update = Update.de_json(payload)
+                self.bot.process_new_updates([update])
+                self._inc("processed")
+            except Exception as e:
+                self._inc("failed")
+                logger.error("❌ خطا در پردازش update: %s", e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """راه‌اندازی worker ها و سرور HTTP در پس‌زمینه"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        thread = threading.Thread(target=self._httpd.serve_forever, name="webhook-http", daemon=True)
+        thread.start()
+        logger.info("🌐 سرور webhook روی %s:%s%s آماده است", self.host, self.port, self.path)
+
+    def stop(self):
+        """توقف سرور و تمام کردن update های داخل صف"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stats(self):
+        """آمار سرور webhook"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_size"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        return stats
+
+
+def setup_webhook(bot, url=WEBHOOK_URL, secret=WEBHOOK_SECRET):
+    """معرفی آدرس webhook به تلگرام (همراه با توکن مخفی اجباری)"""
+    if not secret:
+        raise ValueError("بدون توکن مخفی نمی‌توان webhook را ثبت کرد")
+    bot.remove_webhook()
+    return bot.set_webhook(
+        url=url,
+        secret_token=secret,
+        allowed_updates=ALLOWED_UPDATES,
+        drop_pending_updates=True,
+    )
+
+
+def run_webhook(bot):
+    """اجرای ربات در حالت webhook تا زمان توقف"""
+    secret = WEBHOOK_SECRET
+    if WEBHOOK_URL:
+        if not secret:
+            # توکن تصادفی فقط برای همین اجرا؛ با ثبت دوباره webhook در شروع بعدی عوض می‌شود
+            secret = secrets.token_urlsafe(32)
+            logger.warning("⚠️ WEBHOOK_SECRET تنظیم نشده؛ توکن مخفی تصادفی ساخته شد")
+        setup_webhook(bot, secret=secret)
+        logger.info("✅ webhook در تلگرام ثبت شد: %s", WEBHOOK_URL)
+    else:
+        if not secret:
+            raise ValueError("برای تست محلی webhook باید WEBHOOK_SECRET تنظیم شود")
+        logger.warning("⚠️ WEBHOOK_URL تنظیم نشده؛ webhook در تلگرام ثبت نمی‌شود (حالت تست محلی)")
+
+    server = WebhookServer(bot, secret=secret)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    finally:
+        server.stop()
+
+
+#  REPLAY
+def load_updates(path):
+    """خواندن update های ضبط‌شده؛ فایل می‌تواند یک update، لیست یا JSON Lines باشد"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict) and "result" in data:
+        # خروجی getUpdates
+        data = data["result"]
+    return data if isinstance(data, list) else [data]
+
+
+def replay(paths, url, secret="", delay=0.0):
+    """ارسال update های ضبط‌شده به سرور webhook (برای تست محلی)"""
+    results = {}
+    for path in paths:
+        for update in load_updates(path):
+            request = urllib.request.Request(
+                url,
+                data=json.dumps(update, ensure_ascii=False).encode("utf-8"),
+                headers={"Content-Type": "application/json", SECRET_HEADER: secret},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            results[status] = results.get(status, 0) + 1
+            print(f"{update.get('update_id')}: {status}")
+            if delay:
+                time.sleep(delay)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ارسال update های ضبط‌شده به سرور webhook")
+    parser.add_argument("files", nargs="+", help="فایل‌های JSON شامل update")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--delay", type=float, default=0.0, help="فاصله بین ارسال‌ها (ثانیه)")
+    args = parser.parse_args(argv)
+
+    results = replay(args.files, args.url, args.secret, args.delay)
+    print(f"نتیجه: {results}")
+    return 0 if set(results) <= {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
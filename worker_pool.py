@@ -0,0 +1,237 @@
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+
+from telebot.types import CallbackQuery
+
+import metrics
+from database.connection import DB_POOL_SIZE
+from database.instrumentation import update_scope
+
+logger = logging.getLogger(__name__)
+
+# تنظیمات worker های handler؛ پیش‌فرض هم‌اندازه pool دیتابیس
+HANDLER_THREADS = int(os.getenv("HANDLER_THREADS", str(DB_POOL_SIZE)))
+HANDLER_QUEUE_SIZE = int(os.getenv("HANDLER_QUEUE_SIZE", "200"))
+HANDLER_OVERLOAD = os.getenv("HANDLER_OVERLOAD", "drop")  # drop | block
+
+BUSY_TEXT = "⏳ ربات مشغول است، لطفاً چند لحظه دیگر دوباره امتحان کنید"
+
+_STOP = object()
+
+UPDATES = metrics.counter("bot_updates_total", "update های دریافتی به تفکیک نوع", ("type",))
+UPDATES_DROPPED = metrics.counter("bot_updates_dropped_total", "callback های ردشده به خاطر پر بودن صف")
+UPDATE_SECONDS = metrics.histogram(
+    "bot_update_duration_seconds", "زمان اجرای handler هر update", ("type",)
+)
+UPDATE_WAIT_SECONDS = metrics.histogram(
+    "bot_update_queue_wait_seconds", "زمان انتظار update در صف handler ها"
+)
+
+
+def chat_key(update):
+    """شناسه چت یک update برای ترتیب اجرا؛ None یعنی update به چت خاصی تعلق ندارد"""
+    if isinstance(update, CallbackQuery):
+        if update.message is not None:
+            return update.message.chat.id
+        return update.from_user.id
+    chat = getattr(update, "chat", None)
+    return chat.id if chat is not None else None
+
+
+def update_label(update):
+    """برچسب update برای آمار دیتابیس و لاگ‌ها"""
+    if isinstance(update, CallbackQuery):
+        return f"callback {update.data}"
+    text = getattr(update, "text", None)
+    if text:
+        return f"message {text[:30]}"
+    return f"message {getattr(update, 'content_type', None) or type(update).__name__}"
+
+
+def update_type(update):
+    """نوع update برای متریک‌ها"""
+    return "callback_query" if isinstance(update, CallbackQuery) else "message"
+
+
+def count_update(update):
+    """شمارش update دریافتی (برای مسیرهایی که از HandlerPool عبور نمی‌کنند)"""
+    UPDATES.inc(type=update_type(update))
+
+
+class HandlerPool:
+    """جایگزین bot.worker_pool با صف محدود، اجرای ترتیبی برای هر چت و آمار صف
+
+    همان رابط util.ThreadPool تلگرام (put، raise_exceptions، clear_exceptions،
+    close، exception_event) را دارد تا polling بدون تغییر با آن کار کند.
+
+    update های هر چت در یک صف سریال (lane) قرار می‌گیرند: در هر لحظه حداکثر
+    یک worker روی یک چت کار می‌کند و ترتیب کلیک‌ها حفظ می‌شود، ولی چت‌های
+    مختلف موازی اجرا می‌شوند. بعد از هر کار، چت به انتهای صف آماده برمی‌گردد
+    تا یک کاربر پرکار بقیه را معطل نکند.
+
+    در حالت drop فقط callback ها رد می‌شوند (با پاسخ «مشغول است»)؛ پیام‌ها
+    ممکن است بخشی از یک مرحله (مثل آدرس) باشند، پس برای آن‌ها صبر می‌شود.
+    """
+
+    def __init__(self, bot, num_threads=HANDLER_THREADS, queue_size=HANDLER_QUEUE_SIZE,
+                 overload=HANDLER_OVERLOAD, key_func=chat_key):
+        self.bot = bot
+        self.num_threads = num_threads
+        self.queue_size = queue_size
+        self.overload = overload
+        self.key_func = key_func
+        self.exception_event = threading.Event()
+        self.exception_info = None
+        # کلید چت‌هایی که کار آماده اجرا دارند
+        self._ready = queue.Queue()
+        # chat_id -> deque کارها؛ کار در حال اجرا تا پایانش اول deque می‌ماند
+        self._lanes = {}
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "blocked": 0,
+            "busy": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+        self.workers = [
+            threading.Thread(target=self._run, name=f"HandlerWorker{i}", daemon=True)
+            for i in range(num_threads)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def put(self, func, *args, **kwargs):
+        """اضافه کردن handler به صف چت مربوطه"""
+        update = args[0] if args else None
+        key = self.key_func(update)
+        if key is None:
+            # بدون چت: یک lane یک‌بارمصرف، یعنی بدون محدودیت ترتیب
+            key = object()
+        item = (func, args, kwargs, time.monotonic())
+        count_update(update)
+
+        with self._cond:
+            if self._pending >= self.queue_size:
+                if self.overload == "drop" and isinstance(update, CallbackQuery):
+                    self._stats["dropped"] += 1
+                    drop = True
+                else:
+                    self._stats["blocked"] += 1
+                    drop = False
+                    while self._pending >= self.queue_size:
+                        self._cond.wait()
+            else:
+                drop = False
+
+            if not drop:
+                self._pending += 1
+                self._stats["submitted"] += 1
+                lane = self._lanes.get(key)
+                if lane is None:
+                    self._lanes[key] = collections.deque([item])
+                    self._ready.put(key)
+                else:
+                    lane.append(item)
+
+        if drop:
+            UPDATES_DROPPED.inc()
+            logger.warning("⚠️ صف handler ها پر است (%s)؛ callback رد شد", self.queue_size)
+            self._reject(update)
+
+    def _reject(self, call):
+        try:
+            self.bot.answer_callback_query(call.id, BUSY_TEXT)
+        except Exception as e:
+            logger.warning("خطا در پاسخ مشغول بودن: %s", e)
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            if key is _STOP:
+                break
+
+            with self._cond:
+                lane = self._lanes[key]
+                func, args, kwargs, queued_at = lane[0]
+                wait = time.monotonic() - queued_at
+                self._stats["wait_time_total"] += wait
+                if wait > self._stats["wait_time_max"]:
+                    self._stats["wait_time_max"] = wait
+                self._stats["busy"] += 1
+
+            UPDATE_WAIT_SECONDS.observe(wait)
+            update = args[0] if args else None
+            started = time.perf_counter()
+            failed = False
+            try:
+                # کوئری‌های handler به همین update نسبت داده می‌شوند
+                with update_scope(update_label(update)):
+                    func(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                self.on_exception(e)
+            UPDATE_SECONDS.observe(time.perf_counter() - started, type=update_type(update))
+
+            with self._cond:
+                lane.popleft()
+                self._pending -= 1
+                self._stats["busy"] -= 1
+                self._stats["failed" if failed else "completed"] += 1
+                if lane:
+                    self._ready.put(key)
+                else:
+                    del self._lanes[key]
+                self._cond.notify_all()
+
+    def on_exception(self, exception):
+        """مثل ThreadPool تلگرام: اگر exception_handler آن را مدیریت نکند، polling باخبر می‌شود"""
+        handled = False
+        if self.bot.exception_handler is not None:
+            handled = self.bot.exception_handler.handle(exception)
+        if not handled:
+            logger.error("❌ خطای مدیریت نشده در handler: %s", exception, exc_info=exception)
+            self.exception_info = exception
+            self.exception_event.set()
+
+    def raise_exceptions(self):
+        if self.exception_event.is_set():
+            raise self.exception_info
+
+    def clear_exceptions(self):
+        self.exception_info = None
+        self.exception_event.clear()
+
+    def close(self):
+        """توقف worker ها بعد از تمام شدن کارهای داخل صف"""
+        if threading.current_thread() not in self.workers:
+            with self._cond:
+                while self._pending:
+                    self._cond.wait()
+        for _ in self.workers:
+            self._ready.put(_STOP)
+        for worker in self.workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    def stats(self):
+        """آمار صف و worker ها برای تنظیم اندازه"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+            stats["active_chats"] = len(self._lanes)
+        started = stats["completed"] + stats["failed"] + stats["busy"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / started if started else 0.0
+        stats["queue_depth"] = stats["pending"] - stats["busy"]
+        stats["queue_capacity"] = self.queue_size
+        stats["threads"] = self.num_threads
+        stats["overload"] = self.overload
+        return stats